@@ -1,17 +1,21 @@
+import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import text
+from .storage import RoutingSession
 
-# Initialize SQLAlchemy instance
-db = SQLAlchemy()
+# Initialize SQLAlchemy instance; GET requests read from the replica if one is configured
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-def create_app(config_name='development'):
+def create_app(config_name='development', config_overrides=None):
     """
     Factory function to create and configure the Flask application.
 
     Args:
         config_name (str): Configuration name to determine the app's environment. 
                            Defaults to 'development'.
+        config_overrides (dict, optional): Settings applied on top of the configuration
+                                           before any extension is initialized.
 
     Returns:
         Flask app: Configured Flask application instance.
@@ -27,35 +31,54 @@ def create_app(config_name='development'):
 
     # Load configuration based on the provided environment
     app.config.from_object(config_mapping.get(config_name, 'config.Config'))
+    if config_overrides:
+        app.config.update(config_overrides)
 
-    # Initialize the database with the app instance
+    # Storage profile engine options and read replica, then the database with the app instance
+    from .storage import configure_engines, init_storage
+    configure_engines(app)
     db.init_app(app)
+    init_storage(app)
+
+    # Date partitioning of weather_data, set up before the tables are created
+    from .partitioning import init_partitioning
+    init_partitioning(app)
+
+    # Response cache and the data generation that invalidates it
+    from .cache import init_cache
+    init_cache(app)
+
+    # gzip/brotli compression of large responses negotiated from Accept-Encoding
+    from .formats import init_compression
+    init_compression(app)
+
+    # Request, SQL, ingestion and stats instrumentation served on /metrics
+    from .metrics import init_metrics
+    init_metrics(app)
+
+    # Background pool for ingestion and stats jobs submitted through the API
+    from .jobs import init_jobs
+    init_jobs(app)
 
     # Perform actions within the app context
     with app.app_context():
-        # Import models and utility functions
+        # Import models and utility functions; ingestion (and numpy) load on first use
         from .models import WeatherData  # Weather data table definition
-        from .ingestion import ingest_weather_data  # Function to ingest weather data
-        from .analysis import calculate_weather_stats  # Function to calculate weather statistics
-
-        # Create all database tables defined in the models
-        db.create_all()
-
-        # Verify database connection
-        try:
-            # Use `db.engine` to get the SQLAlchemy engine
-            connection = db.engine.connect()
-            
-            # Execute a simple query to test the database connection
-            result = connection.execute(text("SELECT 1")).scalar()  # Should return 1 if successful
-            connection.close()  # Ensure the connection is closed after the test
-
-            if result == 1:
-                print("Database connection successful!")
-            else:
-                print("Database connection failed!")
-        except Exception as e:
-            print(f"Database connection failed: {e}")
+        from .analysis import calculate_weather_stats  # Also marks ORM writes for the stats
+        from .catalog import build_catalog  # Also keeps the station catalog of ORM writes current
+
+        # Create all database tables defined in the models; with SCHEMA_AUTO_CREATE off
+        # the schema is left to `flask init-db` and migrations
+        if app.config.get('SCHEMA_AUTO_CREATE', True):
+            db.create_all()
+            # Indexes and keys added since existing tables were created
+            from .schema import create_stats_key, create_weather_indexes
+            create_weather_indexes()
+            create_stats_key()
+
+        # Connection and layout checks, each a round trip to the database on every start
+        if app.config.get('STARTUP_CHECKS', True):
+            check_database(app)
 
         # Add custom objects to the Flask shell context
         @app.shell_context_processor
@@ -66,6 +89,7 @@ def create_app(config_name='development'):
             Returns:
                 dict: Mappings of names to objects for use in the Flask shell.
             """
+            from .ingestion import ingest_weather_data  # Function to ingest weather data
             return {
                 'db': db,
                 'WeatherData': WeatherData,
@@ -77,5 +101,49 @@ def create_app(config_name='development'):
     from .routes import api_blueprint  # Assuming you have defined API routes in `routes.py`
     app.register_blueprint(api_blueprint)
 
+    # Register CLI commands such as `flask ingest`
+    from .cli import register_commands
+    register_commands(app)
+
     # Return the configured Flask app instance
-    return app
\ No newline at end of file
+    return app
+
+
+def check_database(app):
+    """
+    Verify the database connection and report layouts that need a one-off command.
+
+    Must run within the app context.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    # Verify database connection
+    try:
+        # Use `db.engine` to get the SQLAlchemy engine
+        connection = db.engine.connect()
+
+        # Execute a simple query to test the database connection
+        result = connection.execute(text("SELECT 1")).scalar()  # Should return 1 if successful
+        connection.close()  # Ensure the connection is closed after the test
+
+        if result == 1:
+            print("Database connection successful!")
+        else:
+            print("Database connection failed!")
+    except Exception as e:
+        print(f"Database connection failed: {e}")
+
+    # Databases created before the `stations` table need converting once
+    from .schema import has_legacy_weather_table
+    with db.engine.connect() as connection:
+        if has_legacy_weather_table(connection):
+            logging.warning("weather_data has the legacy layout, run `flask upgrade-schema` to convert it")
+
+    # Rows written before partitioning was enabled are moved once
+    from .partitioning import partition_scheme, has_unpartitioned_rows
+    if partition_scheme(app):
+        with db.engine.connect() as connection:
+            if has_unpartitioned_rows(connection):
+                logging.warning("weather_data has rows outside its partitions, "
+                                "run `flask partition-data` to move them")
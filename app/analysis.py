@@ -1,8 +1,59 @@
+import time
+from datetime import date
+from sqlalchemy import event, select, delete, cast, tuple_, true, Integer
+from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 from app import db
-from app.models import WeatherData, WeatherStats
+from app.models import Station, WeatherData, WeatherStats, StatsDirtyPartition
+from app.sql import dialect_insert
+from app.cache import mark_data_changed
+from app.metrics import record_stats_run
+from app.partitioning import partition_scopes
 
-def calculate_weather_stats():
+# Dirty marks deleted per statement, two bound parameters each, below SQLite's old
+# default limit of 999 parameters
+_DELETE_CHUNK_SIZE = 400
+
+def mark_dirty_partitions(connection, partitions):
+    """
+    Record (station_id, year) partitions whose statistics need recomputing.
+
+    Args:
+        connection (Connection): Where to execute, so the mark joins the caller's transaction.
+        partitions (iterable): (station_id, year) pairs touched by a write.
+    """
+    partitions = [
+        {'station_id': station_id, 'year': year, 'start_date': date(year, 1, 1), 'end_date': date(year + 1, 1, 1)}
+        for station_id, year in set(partitions)
+    ]
+    if not partitions:
+        return
+
+    stmt = dialect_insert(StatsDirtyPartition.__table__, connection.dialect.name)
+    if stmt is None:
+        # Without native upsert, insert only the pairs that are not marked yet
+        existing = set(connection.execute(select(StatsDirtyPartition.station_id, StatsDirtyPartition.year)).all())
+        partitions = [p for p in partitions if (p['station_id'], p['year']) not in existing]
+        if partitions:
+            connection.execute(StatsDirtyPartition.__table__.insert(), partitions)
+        return
+
+    connection.execute(stmt.on_conflict_do_nothing(), partitions)
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_dirty_on_flush(session, flush_context):
+    """Mark partitions touched by ORM writes to `WeatherData` (bulk upserts mark their own)."""
+    partitions = [
+        (obj.station_id, obj.date.year)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, WeatherData) and obj.date is not None
+    ]
+    if partitions:
+        mark_dirty_partitions(session.connection(), partitions)
+
+
+def calculate_weather_stats(full=False):
     """
     Calculate and store weather statistics for each station by year.
 
@@ -10,38 +61,128 @@ def calculate_weather_stats():
     - Average maximum temperature
     - Average minimum temperature
     - Total precipitation
+    - Value sketches of each measure, stored in `WeatherStatsSketch` (see `app.sketches`)
+
+    By default only the (station, year) partitions marked dirty by ingestion are
+    recomputed, and the climatology normals of their stations rebuilt (see
+    `app.climatology.update_normals`). Each run is a set-based `INSERT ... SELECT ... ON CONFLICT` against
+    the `uix_station_year` constraint of the `WeatherStats` table, one per date
+    partition of `weather_data` if it is partitioned, so a year is only aggregated
+    from the partition that stores it.
 
-    The results are stored in the `WeatherStats` table. The function ensures that
-    records with valid data are saved and uses the `merge` operation to prevent duplicates.
+    Args:
+        full (bool, optional): Rebuild statistics for every station and year instead of
+                               only the dirty partitions. Defaults to False.
 
     Steps:
-    1. Query aggregated statistics grouped by station ID and year.
-    2. Iterate over the results to create or update records in the `WeatherStats` table.
-    3. Commit the changes to the database.
+        1. Snapshot the dirty partitions (or clear everything for a full rebuild).
+        2. Delete the dirty partitions' stats, aggregate the affected rows grouped by
+           station ID and year and upsert them.
+        3. Rebuild the sketches of the same partitions, the normals of their stations and
+           their extreme events from the first dirty year on.
+        4. Clear the processed dirty marks and commit.
 
     Raises:
         Exception: Propagates any database errors during the query or commit.
     """
-    # Query to calculate aggregated statistics
-    stats = db.session.query(
-        WeatherData.station_id,  # Group by station ID
-        func.extract('year', WeatherData.date).label('year'),  # Extract year from the date
-        func.avg(WeatherData.max_temp).label('avg_max_temp'),  # Average max temperature
-        func.avg(WeatherData.min_temp).label('avg_min_temp'),  # Average min temperature
-        func.sum(WeatherData.precipitation).label('total_precipitation')  # Total precipitation
-    ).group_by(WeatherData.station_id, func.extract('year', WeatherData.date)).all()
-
-    # Iterate over aggregated results
-    for station_id, year, avg_max, avg_min, total_precip in stats:
-        # Create or update a WeatherStats record
-        stat = WeatherStats(
-            station_id=station_id,
-            year=year,
-            avg_max_temp=avg_max if avg_max is not None else None,  # Handle missing max temp
-            avg_min_temp=avg_min if avg_min is not None else None,  # Handle missing min temp
-            total_precipitation=total_precip if total_precip is not None else None  # Handle missing precipitation
-        )
-        db.session.merge(stat)  # Merge ensures updates for existing records without duplication
-
-    # Commit all changes to the database
-    db.session.commit()
\ No newline at end of file
+    from app.catalog import years_with_data
+
+    start = time.perf_counter()
+
+    def aggregates(table):
+        # Aggregates over the grouped rows; NULL (missing) values are ignored by AVG and SUM.
+        # They run on the integer tenths and are scaled once per group.
+        return [
+            (func.avg(table.c.max_temp_tenths) / 10.0).label('avg_max_temp'),  # Average max temperature
+            (func.avg(table.c.min_temp_tenths) / 10.0).label('avg_min_temp'),  # Average min temperature
+            (func.sum(table.c.precipitation_tenths) / 10.0).label('total_precipitation')  # Total precipitation
+        ]
+
+    def bounds(table, partition):
+        # Constant date bounds let PostgreSQL prune every other partition at plan time
+        if partition is None:
+            return [true()]
+        return [table.c.date >= partition.start, table.c.date < partition.end]
+
+    statements = []
+    if full:
+        db.session.execute(delete(WeatherStats))
+        db.session.execute(delete(StatsDirtyPartition))
+        partitions = None
+
+        # Partitions without any cataloged year hold no rows to aggregate
+        for table, partition in partition_scopes(years_with_data()):
+            year = func.extract('year', table.c.date)  # Extract year from the date
+            statements.append(select(Station.code, cast(year, Integer).label('year'), *aggregates(table))
+                              .join(Station, Station.id == table.c.station_key)
+                              .where(*bounds(table, partition)).group_by(Station.id, year))
+    else:
+        partitions = db.session.execute(select(StatsDirtyPartition.station_id, StatsDirtyPartition.year)).all()
+        if not partitions:
+            record_stats_run('incremental', time.perf_counter() - start, 0)
+            return
+
+        # Grouping by the dirty partition and joining on its date bounds makes each
+        # partition a range seek on the (station_id, date) index instead of a table scan
+        for table, partition in partition_scopes({year for _, year in partitions}):
+            dirty = [] if partition is None else [StatsDirtyPartition.year >= partition.start.year,
+                                                  StatsDirtyPartition.year < partition.end.year]
+            statements.append(select(StatsDirtyPartition.station_id, StatsDirtyPartition.year, *aggregates(table))
+                              .join(Station, Station.code == StatsDirtyPartition.station_id)
+                              .join(table, (table.c.station_key == Station.id)
+                                    & (table.c.date >= StatsDirtyPartition.start_date)
+                                    & (table.c.date < StatsDirtyPartition.end_date))
+                              .where(*bounds(table, partition), *dirty)
+                              .group_by(StatsDirtyPartition.station_id, StatsDirtyPartition.year))
+
+    columns = ['station_id', 'year', 'avg_max_temp', 'avg_min_temp', 'total_precipitation']
+    stmt = dialect_insert(WeatherStats.__table__, db.engine.dialect.name)
+    if partitions is not None:
+        # Replace the dirty partitions' rows: a station-year whose rows were all deleted
+        # aggregates to nothing, so upserting alone would leave its old row behind
+        affected = select(StatsDirtyPartition.station_id, StatsDirtyPartition.year)
+        db.session.execute(delete(WeatherStats).where(tuple_(WeatherStats.station_id, WeatherStats.year).in_(affected)))
+    for stats in statements:
+        if stmt is None:
+            db.session.execute(WeatherStats.__table__.insert().from_select(columns, stats))
+        else:
+            upsert = stmt.from_select(columns, stats)
+            db.session.execute(upsert.on_conflict_do_update(
+                index_elements=['station_id', 'year'],
+                set_={column: upsert.excluded[column] for column in columns[2:]}
+            ))
+
+    # Value sketches of the same station-years, for percentiles and threshold counts;
+    # imported here as they load numpy, which the app does not need to start
+    from app.climatology import normals_enabled, in_base_period, update_normals
+    from app.sketches import update_sketches
+    from app.events import events_enabled, update_events
+    update_sketches(partitions)
+
+    # Extreme events of the stations with new data, from their first dirty year on
+    if events_enabled():
+        update_events(partitions)
+
+    # Climatology normals of the stations with new data in the base period, or of all stations
+    if normals_enabled():
+        if partitions is None:
+            update_normals()
+        else:
+            changed = {station_id for station_id, year in partitions if in_base_period(year)}
+            if changed:
+                update_normals(changed)
+
+    if partitions is not None:
+        # Only the snapshotted marks, as others may have been added since; in chunks, as
+        # one pair per partition could exceed the bound parameter limit
+        for first in range(0, len(partitions), _DELETE_CHUNK_SIZE):
+            chunk = [tuple(p) for p in partitions[first:first + _DELETE_CHUNK_SIZE]]
+            db.session.execute(delete(StatsDirtyPartition).where(
+                tuple_(StatsDirtyPartition.station_id, StatsDirtyPartition.year).in_(chunk)
+            ))
+
+    # Commit all changes to the database; cached API responses become stale
+    mark_data_changed(db.session)
+    db.session.commit()
+    record_stats_run('full' if full else 'incremental', time.perf_counter() - start,
+                     None if partitions is None else len(partitions))
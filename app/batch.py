@@ -0,0 +1,153 @@
+from collections import namedtuple
+from datetime import date
+from sqlalchemy import Date, Integer, column, select
+from app import db
+from app.partitioning import source_scopes
+from app.sql import json_rows
+from app.stations import station_keys
+
+# One lookup of a batch request: a single day (start == end) or an inclusive date range
+BatchItem = namedtuple('BatchItem', ['station_id', 'start', 'end', 'is_range'])
+
+_LOOKUP_COLUMNS = [
+    column('idx', Integer), column('station_key', Integer),
+    column('start_date', Date), column('end_date', Date)
+]
+
+
+def _parse_day(value, index, name):
+    try:
+        # Faster than strptime for thousands of items; the length rules out the
+        # compact YYYYMMDD form fromisoformat also accepts
+        if len(value) == 10:
+            return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        pass
+    raise ValueError(f"items[{index}]: {name} must be a date in the format YYYY-MM-DD")
+
+
+def parse_batch_items(items, max_items, max_rows):
+    """
+    Validate the items of a batch request.
+
+    Each item is either `{"station_id", "date"}` or `{"station_id", "start_date", "end_date"}`.
+
+    Args:
+        items (list): Items from the request body.
+        max_items (int): Maximum number of items.
+        max_rows (int): Maximum number of days requested in total, counting each range's length.
+
+    Returns:
+        list: `BatchItem`s in request order.
+
+    Raises:
+        ValueError: If the items are malformed or over a limit; the message names the item.
+    """
+    if not isinstance(items, list):
+        raise ValueError("items must be a list")
+    if len(items) > max_items:
+        raise ValueError(f"At most {max_items} items are allowed per request, got {len(items)}")
+
+    parsed = []
+    days = 0
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('station_id'), str) or not item['station_id']:
+            raise ValueError(f"items[{index}]: station_id is required")
+        if 'date' in item:
+            start = end = _parse_day(item['date'], index, 'date')
+        elif 'start_date' in item and 'end_date' in item:
+            start = _parse_day(item['start_date'], index, 'start_date')
+            end = _parse_day(item['end_date'], index, 'end_date')
+            if end < start:
+                raise ValueError(f"items[{index}]: end_date is before start_date")
+        else:
+            raise ValueError(f"items[{index}]: either date or start_date and end_date are required")
+
+        parsed.append(BatchItem(item['station_id'], start, end, 'date' not in item))
+        days += (end - start).days + 1
+        if days > max_rows:
+            raise ValueError(f"items[{index}]: at most {max_rows} days may be requested in total")
+    return parsed
+
+
+def lookup_batch(items):
+    """
+    Fetch the weather rows of many lookups with a few set-based queries.
+
+    Station codes are resolved in one query. The lookups are then sent as one JSON
+    parameter joined to `weather_data`, so each is a primary key seek, whether it is a
+    single day or a range, and a single statement answers them all (one per partition
+    they touch with SQLite partition files).
+
+    Args:
+        items (list): `BatchItem`s.
+
+    Returns:
+        list: For each item, its rows as (date, max_temp_tenths, min_temp_tenths,
+              precipitation_tenths) tuples in date order; empty for a miss.
+    """
+    found = [[] for _ in items]
+    keys = station_keys(item.station_id for item in items)
+    wanted = [(index, keys[item.station_id], item) for index, item in enumerate(items) if item.station_id in keys]
+    if not wanted:
+        return found
+
+    first = min(item.start for _, _, item in wanted)
+    last = max(item.end for _, _, item in wanted)
+    for source, scope_start, scope_end in source_scopes(first, last):
+        lookups = [
+            (index, key, max(item.start, scope_start), min(item.end, scope_end))
+            for index, key, item in wanted if item.start <= scope_end and item.end >= scope_start
+        ]
+        lookup = json_rows(lookups, _LOOKUP_COLUMNS, 'lookup', db.engine.dialect.name)
+        query = select(
+            lookup.c.idx, source.date, source.max_temp_tenths,
+            source.min_temp_tenths, source.precipitation_tenths
+        ).join(source, (source.station_key == lookup.c.station_key)
+               & source.date.between(lookup.c.start_date, lookup.c.end_date))
+        for index, *row in db.session.execute(query):
+            found[index].append(tuple(row))
+
+    for index, _, item in wanted:
+        if item.is_range:
+            found[index].sort()
+    return found
+
+
+def _record(day, max_temp, min_temp, precipitation):
+    # Stored tenths back to degrees Celsius and mm
+    return {
+        'date': day.isoformat(),
+        'max_temp': None if max_temp is None else max_temp / 10,
+        'min_temp': None if min_temp is None else min_temp / 10,
+        'precipitation': None if precipitation is None else precipitation / 10
+    }
+
+
+def batch_results(items, found):
+    """
+    Format the rows of `lookup_batch` for the API, one result per item in request order.
+
+    Args:
+        items (list): `BatchItem`s.
+        found (list): Rows per item, as returned by `lookup_batch`.
+
+    Returns:
+        list: Single-day results carry `found` and, if found, the measurements; range
+              results carry `found` and the `data` rows of the range.
+    """
+    results = []
+    for item, rows in zip(items, found):
+        if item.is_range:
+            results.append({
+                'station_id': item.station_id,
+                'start_date': item.start.isoformat(),
+                'end_date': item.end.isoformat(),
+                'found': bool(rows),
+                'data': [_record(*row) for row in rows]
+            })
+        elif rows:
+            results.append(dict(_record(*rows[0]), station_id=item.station_id, found=True))
+        else:
+            results.append({'station_id': item.station_id, 'date': item.start.isoformat(), 'found': False})
+    return results
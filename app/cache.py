@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import WeatherData, WeatherStats
+from app.formats import output_json, accepted_encoding, compress, compressible
+
+
+class DataGeneration:
+    """
+    A counter that changes whenever weather data or statistics are committed.
+
+    With a `path` the counter lives in a small file, so every process (API workers,
+    `flask ingest`, ...) sees the same value; reads only `stat` the file and re-read it
+    when it changed. Without a path the counter is local to the process.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._value = 0
+        self._stat_key = None
+
+    def current(self):
+        """
+        Return the current generation.
+
+        Returns:
+            int: The generation number.
+        """
+        if self.path is None:
+            return self._value
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._stat_key:
+            with open(self.path) as file:
+                content = file.read().strip()
+            self._value = int(content) if content else 0
+            self._stat_key = key
+        return self._value
+
+    def bump(self):
+        """
+        Advance the generation so every cached response becomes stale.
+
+        File-backed counters move to at least the current time in nanoseconds, so two
+        processes bumping at once still end on a value neither has used before.
+
+        Returns:
+            int: The new generation number.
+        """
+        with self._lock:
+            if self.path is None:
+                self._value += 1
+                return self._value
+
+            value = max(self.current() + 1, time.time_ns())
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.generation.')
+            with os.fdopen(fd, 'w') as file:
+                file.write(str(value))
+            os.replace(tmp_path, self.path)
+            return value
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of serialized API responses, bounded by total body size.
+
+    An optional directory backend shares entries between worker processes. Entries are
+    keyed on the data generation, so a bump makes all older entries unreachable.
+    """
+
+    def __init__(self, max_bytes, directory=None, disk_max_bytes=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'not_modified': 0}
+
+    def get(self, key):
+        """
+        Return a cached (body, headers) entry, promoting it to most recently used.
+
+        Args:
+            key (str): Cache key including the data generation.
+
+        Returns:
+            tuple: (body bytes, headers dict), or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            self.count('disk_hits')
+            self._store_memory(key, entry)
+            return entry
+
+        self.count('misses')
+        return None
+
+    def count(self, name):
+        """
+        Increment a counter; request threads share the cache.
+
+        Args:
+            name (str): Key of `counters`.
+        """
+        with self._lock:
+            self.counters[name] += 1
+
+    def set(self, key, body, headers):
+        """
+        Cache a response body and its headers.
+
+        Args:
+            key (str): Cache key including the data generation.
+            body (bytes): Serialized response body.
+            headers (dict): Response headers to replay on a hit.
+        """
+        entry = (body, headers)
+        self._store_memory(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self):
+        """
+        Return the cache counters and current size.
+
+        Returns:
+            dict: Hit, miss, eviction and 304 counters plus `entries` and `bytes`.
+        """
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), bytes=self._size)
+
+    def _store_memory(self, key, entry):
+        size = len(entry[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = entry
+            self._size += size
+            # Evict least recently used entries until the cache fits its byte budget
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[0])
+                self.counters['evictions'] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._disk_path(key), 'rb') as file:
+                headers = json.loads(file.readline())
+                return file.read(), headers
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.directory:
+            return
+        body, headers = entry
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.entry.')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(json.dumps(headers).encode() + b'\n')
+            file.write(body)
+        os.replace(tmp_path, self._disk_path(key))
+
+        self._disk_writes += 1
+        if self.disk_max_bytes and self._disk_writes % 100 == 0:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Delete the oldest entry files until the directory fits `disk_max_bytes`."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+def init_cache(app):
+    """
+    Attach the data generation counter and response cache to the app.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    path = app.config.get('DATA_GENERATION_FILE')
+    cache_dir = app.config.get('RESPONSE_CACHE_DIR')
+    app.extensions['data_generation'] = DataGeneration(path and os.path.join(app.instance_path, path))
+    app.extensions['response_cache'] = ResponseCache(
+        app.config.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+        cache_dir and os.path.join(app.instance_path, cache_dir),
+        app.config.get('RESPONSE_CACHE_DISK_MAX_BYTES')
+    )
+
+
+def mark_data_changed(session):
+    """
+    Flag a session as holding weather data or statistics changes.
+
+    The data generation is bumped when the session commits, so cached responses are
+    never served for data older than the last commit.
+
+    Args:
+        session (Session): The session that wrote the data.
+    """
+    session.info['data_changed'] = True
+
+
+def bump_generation():
+    """
+    Invalidate every cached response of the current app, in all processes sharing it.
+
+    Used after data derived outside the database (e.g. on-disk read views) changes.
+    """
+    if 'data_generation' in current_app.extensions:
+        current_app.extensions['data_generation'].bump()
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_changed_on_flush(session, flush_context):
+    """Flag ORM writes to weather data or statistics (bulk statements flag themselves)."""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (WeatherData, WeatherStats)):
+            mark_data_changed(session)
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_generation_on_commit(session):
+    if session.info.pop('data_changed', False):
+        bump_generation()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_changed_on_rollback(session):
+    session.info.pop('data_changed', None)
+
+
+def cached_response(view):
+    """
+    Cache a flask-restx `get` method's response, keyed on its normalized query.
+
+    The key combines the path, the sorted query parameters, the data generation and the
+    compression negotiated from Accept-Encoding, so each encoding is compressed once
+    and cached ready to send. Responses carry an ETag derived from the same values, so
+    a matching `If-None-Match` is answered with 304 before any query is run.
+
+    Args:
+        view (callable): Resource method returning data, (data, status, headers), or a
+                         response (for binary formats).
+
+    Returns:
+        callable: The wrapped method.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config.get('RESPONSE_CACHE_ENABLED', True):
+            return view(*args, **kwargs)
+
+        cache = current_app.extensions['response_cache']
+        generation = current_app.extensions['data_generation'].current()
+        params = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)) if v != '')
+        encoding = accepted_encoding()
+        key = f'{generation}|{request.path}?{params}' + (f'|{encoding}' if encoding else '')
+        etag = f'g{generation}-{hashlib.sha1(key.encode()).hexdigest()[:16]}'
+
+        if etag in request.if_none_match:
+            cache.count('not_modified')
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        entry = cache.get(key)
+        if entry is not None:
+            body, headers = entry
+            response = current_app.response_class(body, status=200, headers=headers)
+            response.headers['X-Cache'] = 'HIT'
+            response.set_etag(etag)
+            return response
+
+        result = view(*args, **kwargs)
+        if isinstance(result, current_app.response_class):
+            response = result
+        else:
+            if not isinstance(result, tuple):
+                result = (result, 200, {})
+            data, status, headers = (tuple(result) + ({},))[:3]
+            response = output_json(data, status, headers)
+
+        if response.status_code == 200:
+            if encoding is not None and compressible(response):
+                response.set_data(compress(response.get_data(), encoding))
+                response.headers['Content-Encoding'] = encoding
+            if current_app.config.get('RESPONSE_COMPRESSION_ENABLED', True):
+                response.vary.add('Accept-Encoding')
+            cache.set(key, response.get_data(), {
+                name: value for name, value in response.headers.items() if name != 'Content-Length'
+            })
+        response.headers['X-Cache'] = 'MISS'
+        response.set_etag(etag)
+        return response
+
+    return wrapper
@@ -0,0 +1,280 @@
+from datetime import date
+from flask import current_app
+from sqlalchemy import Integer, cast, delete, event, exists, func, insert, select
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Station, StationYear, WeatherData
+from app.partitioning import partition_scopes, weather_source
+from app.stations import station_key, station_keys
+
+MEASURES = ('max_temp', 'min_temp', 'precipitation')
+
+COLUMNS = ['station_key', 'year', 'first_date', 'last_date', 'days',
+           'max_temp_missing', 'min_temp_missing', 'precipitation_missing']
+
+
+def catalog_enabled():
+    """True if ingestion maintains the station catalog."""
+    return current_app.config.get('STATION_CATALOG_ENABLED', True)
+
+
+def _year_rows(source, *conditions):
+    """
+    Select the `StationYear` rows of the weather rows of `source` matching `conditions`.
+
+    Args:
+        source: A `weather_data` table's columns (`table.c`), `WeatherData` or an alias of it.
+        *conditions: Filters on the weather rows.
+
+    Returns:
+        Select: One row per station and year, with the columns of `COLUMNS`.
+    """
+    year = cast(func.extract('year', source.date), Integer)
+    return (
+        select(source.station_key, year, func.min(source.date), func.max(source.date), func.count(),
+               # NULL values are the -9999 sentinels of the source files, which COUNT(column) skips
+               func.count() - func.count(source.max_temp_tenths),
+               func.count() - func.count(source.min_temp_tenths),
+               func.count() - func.count(source.precipitation_tenths))
+        .where(*conditions)
+        .group_by(source.station_key, year)
+    )
+
+
+def build_catalog(station_ids=None):
+    """
+    Rebuild the catalog of some or all stations from `weather_data`.
+
+    Scans one partition at a time; each year lies in a single partition. The caller commits.
+
+    Args:
+        station_ids (iterable, optional): Stations to rebuild. Defaults to every station.
+
+    Returns:
+        int: Station-years written.
+    """
+    keys = None
+    if station_ids is not None:
+        keys = sorted(station_keys(station_ids).values())
+        if not keys:
+            return 0
+
+    stmt = delete(StationYear)
+    if keys is not None:
+        stmt = stmt.where(StationYear.station_key.in_(keys))
+    db.session.execute(stmt)
+
+    written = 0
+    for table, partition in partition_scopes():
+        conditions = [] if keys is None else [table.c.station_key.in_(keys)]
+        if partition is not None:
+            conditions += [table.c.date >= partition.start, table.c.date < partition.end]
+        written += db.session.execute(
+            insert(StationYear.__table__).from_select(COLUMNS, _year_rows(table.c, *conditions))
+        ).rowcount
+    return written
+
+
+def update_catalog(station_id, since=None):
+    """
+    Bring a station's catalog up to date after a write.
+
+    Only the years from `since` on are recomputed, with a range seek on the station's
+    rows. A station without catalog rows yet is rebuilt in full, so a station that has
+    any is always fully cataloged. The caller commits.
+
+    Args:
+        station_id (str): Identifier for the weather station that was written.
+        since (date, optional): Earliest date written. None (unknown) rebuilds every year.
+    """
+    key = station_key(station_id, create=False)
+    if key is None:
+        return
+    if since is not None and not _cataloged(key):
+        since = None
+
+    start = None if since is None else date(since.year, 1, 1)
+    source = weather_source(start, None)
+    stmt = delete(StationYear).where(StationYear.station_key == key)
+    conditions = [source.station_key == key]
+    if start is not None:
+        stmt = stmt.where(StationYear.year >= start.year)
+        conditions.append(source.date >= start)
+    db.session.execute(stmt)
+    db.session.execute(insert(StationYear.__table__).from_select(COLUMNS, _year_rows(source, *conditions)))
+
+
+def update_catalog_years(connection, partitions):
+    """
+    Recompute the catalog rows of some years of the stations that are cataloged.
+
+    Stations without catalog rows are left alone: the catalog does not vouch for them
+    until they are rebuilt in full.
+
+    Args:
+        connection (Connection): Where to execute, so the rows join the caller's transaction.
+        partitions (iterable): (station_key, year) pairs touched by a write.
+    """
+    partitions = sorted(set(partitions))
+    keys = {key for key, _ in partitions}
+    cataloged = set(connection.execute(
+        select(StationYear.station_key).distinct().where(StationYear.station_key.in_(keys))
+    ).scalars())
+    for key, year in partitions:
+        if key not in cataloged:
+            continue
+        start, end = date(year, 1, 1), date(year, 12, 31)
+        source = weather_source(start, end)
+        connection.execute(delete(StationYear).where(StationYear.station_key == key, StationYear.year == year))
+        connection.execute(insert(StationYear.__table__).from_select(COLUMNS, _year_rows(
+            source, source.station_key == key, source.date >= start, source.date <= end)))
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_catalog_on_flush(session, flush_context):
+    """Keep the catalog current for ORM writes to `WeatherData` (bulk writes refresh it after ingesting)."""
+    partitions = [
+        (obj.station_key, obj.date.year)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, WeatherData) and obj.station_key is not None and obj.date is not None
+    ]
+    if partitions and catalog_enabled():
+        update_catalog_years(session.connection(), partitions)
+
+
+def _cataloged(key):
+    """True if the station with this key has catalog rows."""
+    return db.session.execute(select(exists().where(StationYear.station_key == key))).scalar()
+
+
+def catalog_complete():
+    """
+    True if the catalog can be trusted to list every station-year with data: it is
+    maintained and every station has been cataloged.
+    """
+    if not catalog_enabled():
+        return False
+    uncataloged = select(Station.id).where(~exists().where(StationYear.station_key == Station.id))
+    return db.session.execute(select(~exists(uncataloged))).scalar()
+
+
+def years_with_data():
+    """
+    Return the years any station has data in, according to the catalog.
+
+    Returns:
+        set: The years, or None if the catalog is incomplete and cannot tell.
+    """
+    if not catalog_complete():
+        return None
+    return set(db.session.execute(select(StationYear.year).distinct()).scalars())
+
+
+def data_range(start=None, end=None, station_id=None):
+    """
+    Narrow a date range to the dates that have data, according to the catalog.
+
+    Args:
+        start (date, optional): First day of the range. Defaults to unbounded.
+        end (date, optional): Last day of the range, inclusive. Defaults to unbounded.
+        station_id (str, optional): Only this station's data. Defaults to every station.
+
+    Returns:
+        tuple: (start, end), narrowed to the first and last dates with data, or unchanged
+               if the catalog cannot tell; None if there is no data in the range.
+    """
+    if not catalog_enabled():
+        return start, end
+
+    query = select(func.min(StationYear.first_date), func.max(StationYear.last_date))
+    if station_id:
+        key = station_key(station_id, create=False)
+        if key is None:
+            # Weather rows reference their station, so an unknown station has none
+            return None
+        if not _cataloged(key):
+            return start, end
+        query = query.where(StationYear.station_key == key)
+    elif not catalog_complete():
+        return start, end
+
+    if start is not None:
+        query = query.where(StationYear.year >= start.year)
+    if end is not None:
+        query = query.where(StationYear.year <= end.year)
+    first, last = db.session.execute(query).one()
+    if first is None:
+        return None
+    first = max(start, first) if start else first
+    last = min(end, last) if end else last
+    return (first, last) if first <= last else None
+
+
+def station_summaries(start_year=None, end_year=None, min_days=None, max_missing=None):
+    """
+    Query the catalog summary of every station, over all years or a range of years.
+
+    Reads a row per station-year of the catalog, however many weather rows they stand for.
+
+    Args:
+        start_year (int, optional): First year, inclusive. Defaults to unbounded.
+        end_year (int, optional): Last year, inclusive. Defaults to unbounded.
+        min_days (float, optional): Only stations with at least this many days stored in
+                                    the years. Defaults to no minimum.
+        max_missing (dict, optional): Highest fraction of the stored days that may miss
+                                      each measure, by measure. Defaults to no limit.
+
+    Returns:
+        Query: Rows with the station `code`, its `first_date` and `last_date`, the `days`
+               stored and the `max_temp_missing`, `min_temp_missing` and
+               `precipitation_missing` counts, one per station with data in the years.
+    """
+    query = (
+        db.session.query(
+            Station.code,
+            func.min(StationYear.first_date).label('first_date'),
+            func.max(StationYear.last_date).label('last_date'),
+            func.sum(StationYear.days).label('days'),
+            *(func.sum(getattr(StationYear, f'{measure}_missing')).label(f'{measure}_missing')
+              for measure in MEASURES)
+        )
+        .join(StationYear, StationYear.station_key == Station.id)
+        .group_by(Station.id, Station.code)
+    )
+    if start_year is not None:
+        query = query.filter(StationYear.year >= start_year)
+    if end_year is not None:
+        query = query.filter(StationYear.year <= end_year)
+    if min_days is not None:
+        query = query.having(func.sum(StationYear.days) >= min_days)
+    for measure, fraction in (max_missing or {}).items():
+        query = query.having(func.sum(getattr(StationYear, f'{measure}_missing')) <= fraction * func.sum(StationYear.days))
+    return query
+
+
+def station_years(codes, start_year=None, end_year=None):
+    """
+    Fetch the per-year catalog rows of some stations.
+
+    Args:
+        codes (iterable): Station identifiers.
+        start_year (int, optional): First year, inclusive. Defaults to unbounded.
+        end_year (int, optional): Last year, inclusive. Defaults to unbounded.
+
+    Returns:
+        dict: The `StationYear` rows of each station with any, by code, in year order.
+    """
+    keys = station_keys(codes)
+    if not keys:
+        return {}
+    codes = {key: code for code, key in keys.items()}
+    query = (select(StationYear).where(StationYear.station_key.in_(sorted(codes)))
+             .order_by(StationYear.station_key, StationYear.year))
+    if start_year is not None:
+        query = query.where(StationYear.year >= start_year)
+    if end_year is not None:
+        query = query.where(StationYear.year <= end_year)
+    years = {}
+    for row in db.session.scalars(query):
+        years.setdefault(codes[row.station_key], []).append(row)
+    return years
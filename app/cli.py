@@ -0,0 +1,190 @@
+import os
+from datetime import date
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('ingest')
+@click.option('--file', 'filename', default=None, help='Single weather file to ingest (defaults to all of wx_data).')
+@click.option('--workers', type=int, default=None, help='Parser processes to run in parallel (defaults to INGEST_WORKERS).')
+@click.option('--batch-size', type=int, default=None, help='Rows per upsert/commit (defaults to INGEST_BATCH_SIZE).')
+@click.option('--full', is_flag=True, help='Re-ingest every file, ignoring the ingestion manifest.')
+@click.option('--from', 'source', default=None,
+              help='Directory, archive (.tar, .tar.gz, .tgz, .zip), .gz file or - for stdin to ingest from.')
+@click.option('--station', 'station_id', default=None, help='Station of a single file read from stdin.')
+@with_appcontext
+def ingest_command(filename, workers, batch_size, full, source, station_id):
+    """Ingest weather data files into the database."""
+    from app.ingestion import ingest_weather_data, ingest_stream
+
+    if source and os.path.isdir(source):
+        summary = ingest_weather_data(batch_size=batch_size, workers=workers,
+                                      incremental=False if full else None, data_dir=source)
+    elif source:
+        # Archives and stdin are streamed member by member, without extracting to disk
+        try:
+            summary = ingest_stream(source, station_id, batch_size=batch_size)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    else:
+        summary = ingest_weather_data(filename, batch_size=batch_size, workers=workers, incremental=False if full else None)
+    if summary is None:
+        raise click.ClickException('No valid files found for ingestion.')
+
+    click.echo(f"Inserted: {summary['inserted']}, updated: {summary['updated']}, skipped: {summary['skipped']}")
+    for filepath, error in summary['errors'].items():
+        click.echo(f"Failed: {filepath} - {error}", err=True)
+
+
+@click.command('build-store')
+@click.option('--station', 'station_ids', multiple=True, help='Station to rebuild (defaults to every station).')
+@with_appcontext
+def build_store_command(station_ids):
+    """Materialize the columnar station store from the weather_data table."""
+    from app.colstore import materialize_station, store_dir
+    from app.stations import station_codes
+
+    if not station_ids:
+        station_ids = station_codes()
+    for station_id in station_ids:
+        materialize_station(station_id)
+    click.echo(f"Materialized {len(station_ids)} stations into {store_dir()}")
+
+
+@click.command('build-index')
+@click.option('--station', 'station_ids', multiple=True, help='Station to rebuild (defaults to every station).')
+@with_appcontext
+def build_index_command(station_ids):
+    """Rebuild the prefix-sum index from the weather_data table."""
+    from app.prefix_index import build_station, index_dir
+    from app.stations import station_codes
+
+    if not station_ids:
+        station_ids = station_codes()
+    for station_id in station_ids:
+        build_station(station_id)
+    click.echo(f"Indexed {len(station_ids)} stations into {index_dir()}")
+
+
+@click.command('build-normals')
+@click.option('--station', 'station_ids', multiple=True, help='Station to rebuild (defaults to every station).')
+@with_appcontext
+def build_normals_command(station_ids):
+    """Rebuild the daily climatology normals from the weather_data table."""
+    from app import db
+    from app.cache import mark_data_changed
+    from app.climatology import update_normals
+
+    written = update_normals(station_ids or None)
+    mark_data_changed(db.session)
+    db.session.commit()
+    click.echo(f"Wrote {written} daily normals")
+
+
+@click.command('build-events')
+@with_appcontext
+def build_events_command():
+    """Detect the extreme events of every station again, e.g. after WEATHER_EVENTS changed."""
+    from app import db
+    from app.cache import mark_data_changed
+    from app.events import update_events
+
+    written = update_events()
+    mark_data_changed(db.session)
+    db.session.commit()
+    click.echo(f"Detected {written} events")
+
+
+@click.command('build-catalog')
+@click.option('--station', 'station_ids', multiple=True, help='Station to rebuild (defaults to every station).')
+@with_appcontext
+def build_catalog_command(station_ids):
+    """Rebuild the station catalog from the weather_data table."""
+    from app import db
+    from app.cache import mark_data_changed
+    from app.catalog import build_catalog
+
+    written = build_catalog(station_ids or None)
+    mark_data_changed(db.session)
+    db.session.commit()
+    click.echo(f"Cataloged {written} station-years")
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the tables and check the database, for apps started with SCHEMA_AUTO_CREATE off."""
+    from flask import current_app
+    from app import db, check_database
+    from app.schema import create_stats_key, create_weather_indexes
+
+    db.create_all()
+    for name in create_weather_indexes():
+        click.echo(f'Created index {name}')
+    if create_stats_key():
+        click.echo('Created index uix_station_year')
+    check_database(current_app)
+    click.echo('Database initialized')
+
+
+@click.command('upgrade-schema')
+@with_appcontext
+def upgrade_schema_command():
+    """Convert a legacy weather_data table to the normalized station/tenths layout."""
+    from app.schema import upgrade_weather_schema
+
+    converted = upgrade_weather_schema()
+    if converted is None:
+        click.echo('weather_data already has the normalized layout')
+    else:
+        click.echo(f'Converted {converted} rows')
+
+
+@click.command('partition-data')
+@with_appcontext
+def partition_data_command():
+    """Move weather_data rows written before partitioning was enabled into partitions."""
+    from app.partitioning import partitioning_enabled, partition_existing_rows
+
+    if not partitioning_enabled():
+        raise click.ClickException('WEATHER_PARTITIONING is not set.')
+    click.echo(f'Moved {partition_existing_rows()} rows into partitions')
+
+
+@click.command('rebuild-partition')
+@click.argument('year', type=int)
+@click.option('--data-dir', default=None, help='Directory of weather files (defaults to wx_data).')
+@with_appcontext
+def rebuild_partition_command(year, data_dir):
+    """Reload the partition holding YEAR from the weather files and swap it in."""
+    from app.ingestion import get_file_paths
+    from app.partitioning import partitioning_enabled, partition_for, rebuild_partition
+
+    if not partitioning_enabled():
+        raise click.ClickException('WEATHER_PARTITIONING is not set.')
+    file_paths = get_file_paths(os.path.dirname(os.path.abspath(__file__)), dir_path=data_dir)
+    if not file_paths:
+        raise click.ClickException('No valid files found.')
+
+    partition = partition_for(date(year, 1, 1))
+    loaded = rebuild_partition(partition, file_paths)
+    click.echo(f'Rebuilt partition {partition.name} with {loaded} rows')
+
+
+def register_commands(app):
+    """
+    Register the application's CLI commands with the Flask app.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(ingest_command)
+    app.cli.add_command(build_store_command)
+    app.cli.add_command(build_index_command)
+    app.cli.add_command(build_normals_command)
+    app.cli.add_command(build_catalog_command)
+    app.cli.add_command(build_events_command)
+    app.cli.add_command(upgrade_schema_command)
+    app.cli.add_command(partition_data_command)
+    app.cli.add_command(rebuild_partition_command)
@@ -0,0 +1,249 @@
+import math
+from datetime import date
+import numpy as np
+from flask import current_app
+from sqlalchemy import Integer, cast, delete, func, insert, select
+from app import db
+from app.models import Station, WeatherNormal
+from app.partitioning import partition_scopes
+from app.stations import station_keys
+
+DAYS = 366
+
+MEASURES = ('max_temp', 'min_temp', 'precipitation')
+
+# Days are numbered in a leap year, so a month and day always have the same number
+_LEAP_YEAR_START = date(2000, 1, 1).toordinal()
+
+# Zero-based day of each `month * 100 + day`, as grouped by the aggregate query
+_MONTH_DAY_INDEX = np.zeros(1232, dtype=np.int16)
+for _day in range(DAYS):
+    _date = date.fromordinal(_LEAP_YEAR_START + _day)
+    _MONTH_DAY_INDEX[_date.month * 100 + _date.day] = _day
+
+
+def day_of_year(day):
+    """
+    Return the `WeatherNormal.day_of_year` of a date.
+
+    Args:
+        day (date): Any date.
+
+    Returns:
+        int: 1 to 366, counted in a leap year, so March 1 is always day 61.
+    """
+    return date(2000, day.month, day.day).toordinal() - _LEAP_YEAR_START + 1
+
+
+def month_day(day_number):
+    """Return the MM-DD of a `WeatherNormal.day_of_year`."""
+    return date.fromordinal(_LEAP_YEAR_START + day_number - 1).strftime('%m-%d')
+
+
+def normals_enabled():
+    """True if climatology normals are maintained with the weather statistics."""
+    return current_app.config.get('NORMALS_ENABLED', True)
+
+
+def base_period():
+    """
+    Return the years the normals are computed from.
+
+    Returns:
+        tuple: (first, last) years from `NORMALS_BASE_PERIOD`, inclusive, or None for every year.
+    """
+    period = current_app.config.get('NORMALS_BASE_PERIOD')
+    return tuple(period) if period else None
+
+
+def in_base_period(year):
+    """True if rows of `year` contribute to the normals."""
+    period = base_period()
+    return period is None or period[0] <= year <= period[1]
+
+
+def _sufficient_statistics(keys=None):
+    """
+    Sum the count, total and sum of squares of each measure per station and day of year.
+
+    The grouping runs in the database, one aggregate query per partition of
+    `weather_data`; the partial sums are added up here.
+
+    Returns:
+        tuple: The station keys in ascending order, and an array of shape
+               (stations, 366, 9) holding count, sum and sum of squares (in tenths)
+               of max_temp, min_temp and precipitation.
+    """
+    period = base_period()
+    rows = []
+    for table, partition in partition_scopes(range(period[0], period[1] + 1) if period else None):
+        day = func.extract('month', table.c.date) * 100 + func.extract('day', table.c.date)
+        aggregates = []
+        for measure in MEASURES:
+            # Squares overflow the small integer columns on PostgreSQL
+            value = cast(table.c[f'{measure}_tenths'], Integer)
+            aggregates += [func.count(value), func.sum(value), func.sum(value * value)]
+        query = select(table.c.station_key, day, *aggregates).group_by(table.c.station_key, day)
+        if partition is not None:
+            query = query.where(table.c.date >= partition.start, table.c.date < partition.end)
+        if period is not None:
+            query = query.where(table.c.date >= date(period[0], 1, 1), table.c.date < date(period[1] + 1, 1, 1))
+        if keys is not None:
+            query = query.where(table.c.station_key.in_(keys))
+        rows += (tuple(row) for row in db.session.execute(query))
+
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, DAYS, 9))
+    # Sums over only missing values are NULL
+    data = np.nan_to_num(np.array(rows, dtype=np.float64))
+    stations, station_index = np.unique(data[:, 0].astype(np.int64), return_inverse=True)
+    totals = np.zeros((len(stations), DAYS, 9))
+    np.add.at(totals, (station_index, _MONTH_DAY_INDEX[data[:, 1].astype(np.int64)]), data[:, 2:])
+    return stations, totals
+
+
+def _smooth(totals, days):
+    """Add up each day's sums with those of the `days` days either side, wrapping around the year."""
+    if days <= 0:
+        return totals
+    return sum(np.roll(totals, shift, axis=1) for shift in range(-days, days + 1))
+
+
+def _normal_rows(stations, totals):
+    """Turn the sufficient statistics into `WeatherNormal` rows in degrees Celsius and mm."""
+    count, total, squares = totals[..., 0::3], totals[..., 1::3], totals[..., 2::3]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(count > 0, total / count / 10, np.nan)
+        variance = (squares - total * total / count) / (count - 1) / 100
+        std = np.where(count > 1, np.sqrt(np.maximum(variance, 0)), np.nan)
+
+    def value(x):
+        return None if math.isnan(x) else float(x)
+
+    rows = []
+    for station, day in zip(*np.nonzero(count.any(axis=2))):
+        row = {'station_key': int(stations[station]), 'day_of_year': int(day) + 1}
+        for index, measure in enumerate(MEASURES):
+            row[f'{measure}_mean'] = value(mean[station, day, index])
+            row[f'{measure}_count'] = int(count[station, day, index])
+            if measure != 'precipitation':
+                row[f'{measure}_std'] = value(std[station, day, index])
+        rows.append(row)
+    return rows
+
+
+def update_normals(station_ids=None):
+    """
+    Rebuild the climatology normals of some or all stations.
+
+    Per station and day of year, the mean and sample standard deviation of max_temp and
+    min_temp and the mean precipitation are computed over the years of the base period,
+    optionally smoothed over `NORMALS_SMOOTHING_DAYS` neighbouring days. The caller commits.
+
+    Args:
+        station_ids (iterable, optional): Stations to rebuild, e.g. those with new data.
+                                          Defaults to every station.
+
+    Returns:
+        int: Normals written.
+    """
+    keys = None
+    if station_ids is not None:
+        keys = sorted(station_keys(station_ids).values())
+        if not keys:
+            return 0
+
+    stations, totals = _sufficient_statistics(keys)
+    rows = _normal_rows(stations, _smooth(totals, current_app.config.get('NORMALS_SMOOTHING_DAYS', 0)))
+
+    stmt = delete(WeatherNormal)
+    if keys is not None:
+        stmt = stmt.where(WeatherNormal.station_key.in_(keys))
+    db.session.execute(stmt)
+    if rows:
+        db.session.execute(insert(WeatherNormal.__table__), rows)
+    return len(rows)
+
+
+def lookup_normals(pairs):
+    """
+    Fetch the normals of (station, date) pairs with one primary key lookup each.
+
+    Args:
+        pairs (iterable): (station_id, date) pairs.
+
+    Returns:
+        dict: `WeatherNormal` rows by (station_id, day_of_year), for the pairs that have one.
+    """
+    wanted = {(station_id, day_of_year(day)) for station_id, day in pairs}
+    if not wanted:
+        return {}
+    keys = station_keys(station_id for station_id, _ in wanted)
+    if not keys:
+        return {}
+    codes = {key: code for code, key in keys.items()}
+
+    # Separate IN lists on both key columns are primary key seeks (a row-value IN is not)
+    query = select(WeatherNormal).where(
+        WeatherNormal.station_key.in_(sorted(keys.values())),
+        WeatherNormal.day_of_year.in_(sorted({day for _, day in wanted}))
+    )
+    normals = ((codes[normal.station_key], normal.day_of_year, normal) for normal in db.session.scalars(query))
+    return {(code, day): normal for code, day, normal in normals if (code, day) in wanted}
+
+
+def anomalies(records):
+    """
+    Compute the departure from normal of weather records.
+
+    Args:
+        records (list): Dicts with `station_id`, `date` (YYYY-MM-DD) and the measures,
+                        as returned by `/api/weather`.
+
+    Returns:
+        list: For each record, a dict of max_temp, min_temp and precipitation minus
+              their normal (None where the value or normal is missing), or None if
+              the station has no normal for the day.
+    """
+    days = [(record['station_id'], date.fromisoformat(record['date'])) for record in records]
+    normals = lookup_normals(days)
+
+    result = []
+    for record, (station_id, day) in zip(records, days):
+        normal = normals.get((station_id, day_of_year(day)))
+        if normal is None:
+            result.append(None)
+            continue
+        result.append({
+            measure: None if record[measure] is None or getattr(normal, f'{measure}_mean') is None
+            else round(record[measure] - getattr(normal, f'{measure}_mean'), 2)
+            for measure in MEASURES
+        })
+    return result
+
+
+def normal_record(station_id, normal):
+    """Describe a `WeatherNormal` for the API."""
+    record = {'station_id': station_id, 'day_of_year': normal.day_of_year, 'day': month_day(normal.day_of_year)}
+    for column in WeatherNormal.__table__.columns:
+        if column.name not in ('station_key', 'day_of_year'):
+            record[column.name] = getattr(normal, column.name)
+    return record
+
+
+def station_normals(station_id, day=None):
+    """
+    Return a station's normals for the API.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+        day (int, optional): Only this day of year. Defaults to every day.
+
+    Returns:
+        list: Normals in day order; empty if the station has none.
+    """
+    query = select(WeatherNormal).join(Station, Station.id == WeatherNormal.station_key) \
+        .where(Station.code == station_id).order_by(WeatherNormal.day_of_year)
+    if day is not None:
+        query = query.where(WeatherNormal.day_of_year == day)
+    return [normal_record(station_id, normal) for normal in db.session.scalars(query)]
@@ -0,0 +1,332 @@
+import os
+import time
+import logging
+import bisect
+import struct
+import tempfile
+from collections import namedtuple
+from datetime import date
+import numpy as np
+from flask import current_app
+from sqlalchemy import String, select, type_coerce
+from app import db
+from app.partitioning import weather_source, station_filter
+from app.parser import MISSING_MAX_TEMP, MISSING_MIN_TEMP, MISSING_PRECIPITATION
+from app.stations import station_file
+
+# File layout: 16-byte header (magic, version, row count) followed by the columns
+# dates int32[n] | max_temp int16[n] | min_temp int16[n] | precipitation int16[n] | missing uint8[n]
+_MAGIC = b'WXC1'
+_HEADER = struct.Struct('<4sIQ')
+
+# Ordinal of the datetime64 epoch, to convert numpy days to `date.toordinal()` values
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+StationColumns = namedtuple('StationColumns', ['dates', 'max_temp', 'min_temp', 'precipitation', 'missing'])
+
+# Open stores per directory, shared by every request in this process
+_stores = {}
+
+
+def store_dir():
+    """
+    Return the directory of the columnar station store for the current app.
+
+    Returns:
+        str: `COLUMNAR_STORE_DIR`, resolved against the instance path if relative.
+    """
+    path = current_app.config.get('COLUMNAR_STORE_DIR', 'colstore')
+    return os.path.join(current_app.instance_path, path)
+
+
+def columnar_enabled():
+    """True if the columnar store is the configured read engine."""
+    return current_app.config.get('WEATHER_READ_ENGINE', 'sql') == 'columnar'
+
+
+def get_store():
+    """
+    Return the process-wide `ColumnarStore` for the current app.
+
+    Returns:
+        ColumnarStore: The store reading `store_dir()`.
+    """
+    path = store_dir()
+    if path not in _stores:
+        _stores[path] = ColumnarStore(path, current_app.config.get('COLUMNAR_RECHECK_SECONDS', 1.0))
+    return _stores[path]
+
+
+def write_station(directory, station_id, columns):
+    """
+    Atomically write one station's columns to the store.
+
+    The file is written next to its destination and renamed into place, so readers
+    either see the old or the new version; mappings of the old file stay valid.
+
+    Args:
+        directory (str): Store directory.
+        station_id (str): Identifier for the weather station.
+        columns (StationColumns): Columns sorted by date.
+
+    Raises:
+        ValueError: If the station identifier cannot name a file (see `station_file`).
+    """
+    path = station_file(directory, station_id, '.wxc')
+    if path is None:
+        raise ValueError(f"Station {station_id!r} cannot be stored in the columnar store")
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{station_id}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, 1, len(columns.dates)))
+            file.write(np.ascontiguousarray(columns.dates, dtype='<i4').tobytes())
+            for column in (columns.max_temp, columns.min_temp, columns.precipitation):
+                file.write(np.ascontiguousarray(column, dtype='<i2').tobytes())
+            file.write(np.ascontiguousarray(columns.missing, dtype=np.uint8).tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_station_columns(station_id, after=None, end=None):
+    """
+    Load one station's daily series from `weather_data` as typed columns.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+        after (date, optional): Only load rows dated after this day. Defaults to all rows.
+        end (date, optional): Only load rows up to this day, inclusive. Defaults to all rows.
+
+    Returns:
+        StationColumns: Columns sorted by date, in integer tenths with a missing bitmask.
+    """
+    source = weather_source(after, end)
+    # Dates are fetched as the driver returns them (ISO strings on SQLite) and parsed by
+    # numpy all at once, instead of into one date object per row
+    query = select(type_coerce(source.date, String), source.max_temp_tenths, source.min_temp_tenths,
+                   source.precipitation_tenths) \
+        .where(station_filter(source, station_id))
+    if after is not None:
+        query = query.where(source.date > after)
+    if end is not None:
+        query = query.where(source.date <= end)
+    # Core execution on the session's connection skips ORM row loading
+    rows = db.session.connection().execute(query.order_by(source.date)).all()
+
+    days = np.array([row[0] for row in rows], dtype='datetime64[D]').astype(np.int32)
+    dates = days + np.int32(_EPOCH_ORDINAL)
+    missing = np.zeros(len(rows), dtype=np.uint8)
+    columns = []
+    for index, bit in ((1, MISSING_MAX_TEMP), (2, MISSING_MIN_TEMP), (3, MISSING_PRECIPITATION)):
+        # None (missing) becomes NaN
+        values = np.array([row[index] for row in rows], dtype=np.float64)
+        is_missing = np.isnan(values)
+        missing[is_missing] |= bit
+        values[is_missing] = 0
+        columns.append(values.astype(np.int16))
+
+    return StationColumns(dates, columns[0], columns[1], columns[2], missing)
+
+
+def materialize_station(station_id):
+    """
+    Rewrite a station's columnar file from the `weather_data` table.
+
+    Called after each ingest of the station so the store stays consistent with the table.
+    Stations whose identifier cannot name a file are skipped; they are read from SQL.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+    """
+    if station_file(store_dir(), station_id, '.wxc') is None:
+        return
+    write_station(store_dir(), station_id, read_station_columns(station_id))
+    # Readers in this process see the new file at once; other processes on their next recheck
+    get_store().invalidate(station_id)
+
+
+def discard_station(station_id):
+    """
+    Remove a station's columnar file, so the station is read from SQL until it is
+    materialized again.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+    """
+    path = station_file(store_dir(), station_id, '.wxc')
+    if path is None:
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    get_store().invalidate(station_id)
+
+
+class ColumnarStore:
+    """
+    Read-only view over a directory of memory-mapped station files.
+
+    Files are mapped once per process and remapped when they are replaced, which is
+    checked at most every `recheck_seconds` to keep `stat` calls off the lookup path.
+    Because they are mapped read-only from the page cache, every worker process shares
+    the same physical memory.
+    """
+
+    def __init__(self, directory, recheck_seconds=1.0):
+        self.directory = directory
+        self.recheck_seconds = recheck_seconds
+        self._mapped = {}
+
+    def invalidate(self, station_id):
+        """
+        Forget the mapping of a station so its file is checked again on the next access.
+
+        Args:
+            station_id (str): Identifier for the weather station.
+        """
+        self._mapped.pop(station_id, None)
+
+    def station(self, station_id):
+        """
+        Return the columns of a station, mapping or remapping its file as needed.
+
+        Args:
+            station_id (str): Identifier for the weather station.
+
+        Returns:
+            StationColumns: Zero-copy column views, or None if the station has no valid
+                            file (the caller then reads the table).
+        """
+        now = time.monotonic()
+        cached = self._mapped.get(station_id)
+        if cached is not None and now - cached[1] < self.recheck_seconds:
+            return cached[2]
+
+        path = station_file(self.directory, station_id, '.wxc')
+        try:
+            stat = os.stat(path) if path else None
+        except (FileNotFoundError, ValueError):
+            stat = None
+        if stat is None:
+            self._mapped.pop(station_id, None)
+            return None
+
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if cached is not None and cached[0] == key:
+            self._mapped[station_id] = (key, now, cached[2])
+            return cached[2]
+
+        try:
+            station = _map_columns(path)
+        except (ValueError, struct.error) as e:
+            # Until the file is replaced, the station is served from SQL
+            logging.warning(f"Ignoring invalid columnar station file {path}: {e}")
+            station = None
+        self._mapped[station_id] = (key, now, station)
+        return station
+
+    def lookup(self, station_id, day):
+        """
+        Return the record of a station for one day.
+
+        Args:
+            station_id (str): Identifier for the weather station.
+            day (date): Date to look up.
+
+        Returns:
+            tuple: (date, max_temp, min_temp, precipitation) or None if there is no record.
+        """
+        station = self.station(station_id)
+        if station is None:
+            return None
+        ordinal = day.toordinal()
+        # bisect on the mapped array beats np.searchsorted's per-call overhead for scalars
+        index = bisect.bisect_left(station.dates, ordinal)
+        if index == len(station.dates) or station.dates[index] != ordinal:
+            return None
+        return record(station, index)
+
+    def date_range(self, station, start=None, end=None):
+        """
+        Return the row slice of a station between two dates (inclusive) by binary search.
+
+        Args:
+            station (StationColumns): Columns returned by `station()`.
+            start (date, optional): First date. Defaults to the first row.
+            end (date, optional): Last date. Defaults to the last row.
+
+        Returns:
+            tuple: (first, stop) row indexes.
+        """
+        first = 0 if start is None else bisect.bisect_left(station.dates, start.toordinal())
+        stop = len(station.dates) if end is None else bisect.bisect_right(station.dates, end.toordinal())
+        return first, max(first, stop)
+
+
+def _map_columns(path):
+    """
+    Map a station file as zero-copy column views.
+
+    Raises:
+        ValueError: If the file is not a complete columnar station file.
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    magic, _, count = _HEADER.unpack_from(buffer[:_HEADER.size].tobytes())
+    if magic != _MAGIC or len(buffer) < _HEADER.size + 11 * count:
+        raise ValueError("not a columnar station file")
+
+    offset = _HEADER.size
+    dates = np.frombuffer(buffer, dtype='<i4', count=count, offset=offset)
+    offset += 4 * count
+    columns = []
+    for _ in range(3):
+        columns.append(np.frombuffer(buffer, dtype='<i2', count=count, offset=offset))
+        offset += 2 * count
+    missing = np.frombuffer(buffer, dtype=np.uint8, count=count, offset=offset)
+    return StationColumns(dates, columns[0], columns[1], columns[2], missing)
+
+
+def decode_columns(station, first, stop):
+    """
+    Decode a range of rows of a station into the value lists the API returns.
+
+    Args:
+        station (StationColumns): Station columns.
+        first (int): First row index.
+        stop (int): Row index after the last.
+
+    Returns:
+        tuple: (dates as YYYY-MM-DD strings, max_temp, min_temp, precipitation) lists,
+               with None for missing values.
+    """
+    missing = station.missing[first:stop]
+    columns = [[date.fromordinal(day).isoformat() for day in station.dates[first:stop].tolist()]]
+    for values, bit in ((station.max_temp, MISSING_MAX_TEMP), (station.min_temp, MISSING_MIN_TEMP),
+                        (station.precipitation, MISSING_PRECIPITATION)):
+        decoded = (values[first:stop] / 10).astype(object)
+        decoded[(missing & bit) != 0] = None
+        columns.append(decoded.tolist())
+    return tuple(columns)
+
+
+def record(station, index):
+    """
+    Decode one row of a station into the values the API returns.
+
+    Args:
+        station (StationColumns): Station columns.
+        index (int): Row index.
+
+    Returns:
+        tuple: (date, max_temp, min_temp, precipitation) with None for missing values.
+    """
+    missing = int(station.missing[index])
+    return (
+        date.fromordinal(int(station.dates[index])),
+        None if missing & MISSING_MAX_TEMP else int(station.max_temp[index]) / 10,
+        None if missing & MISSING_MIN_TEMP else int(station.min_temp[index]) / 10,
+        None if missing & MISSING_PRECIPITATION else int(station.precipitation[index]) / 10
+    )
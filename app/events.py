@@ -0,0 +1,170 @@
+import operator
+from collections import namedtuple
+from datetime import date, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+from app import db
+from app.models import WeatherEvent
+from app.series import MEASURES, station_columns
+from app.stations import station_codes, station_key
+
+_OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+# An entry of `WEATHER_EVENTS`; the threshold is in degrees Celsius or mm
+EventType = namedtuple('EventType', ['name', 'measure', 'op', 'threshold', 'min_days'])
+
+# Events found by `detect_runs`, one array entry per event
+Runs = namedtuple('Runs', ['starts', 'ends', 'days', 'missing_days', 'peaks'])
+
+
+def events_enabled():
+    """True if events are detected with the weather statistics."""
+    return current_app.config.get('WEATHER_EVENTS_ENABLED', True)
+
+
+def event_types():
+    """
+    Return the configured event types.
+
+    Returns:
+        dict: `EventType` of each entry of `WEATHER_EVENTS`, by name.
+
+    Raises:
+        ValueError: If an entry has an unknown measure or comparison, or a minimum
+                    duration below one day.
+    """
+    types = {}
+    for name, (measure, op, threshold, min_days) in current_app.config.get('WEATHER_EVENTS', {}).items():
+        if measure not in MEASURES or op not in _OPERATORS or min_days < 1:
+            raise ValueError(f"Invalid WEATHER_EVENTS entry {name!r}: {(measure, op, threshold, min_days)}")
+        types[name] = EventType(name, measure, op, threshold, min_days)
+    return types
+
+
+def detect_runs(dates, values, valid, op, threshold, min_days, max_gap=0):
+    """
+    Find the runs of consecutive days whose value is beyond a threshold.
+
+    A run is ended by a day whose value is not beyond the threshold, or by more than
+    `max_gap` missing days in a row (days without a row or without a value). Shorter
+    gaps are bridged but do not count towards `min_days`, and runs always start and end
+    on a day beyond the threshold. Everything is computed on whole arrays.
+
+    Args:
+        dates (ndarray): Ascending date ordinals.
+        values (ndarray): Values of each date, in tenths.
+        valid (ndarray): False where the value is missing.
+        op (str): '<', '<=', '>' or '>='; a day is in a run if `value <op> threshold`.
+        threshold (float): Threshold, in tenths.
+        min_days (int): Days beyond the threshold a run needs.
+        max_gap (int, optional): Missing days in a row bridged inside a run. Defaults to 0.
+
+    Returns:
+        Runs: The runs' first and last date ordinals, days beyond the threshold, missing
+              days bridged and most extreme values (in tenths).
+    """
+    beyond = valid & _OPERATORS[op](values, threshold)
+    rows = np.flatnonzero(beyond)
+    if not len(rows):
+        empty = np.zeros(0, dtype=np.int64)
+        return Runs(empty, empty, empty, empty, empty)
+
+    # Days with a value not beyond the threshold, counted up to each row: a run cannot span one
+    ended = np.cumsum(valid & ~beyond)
+    run_dates = dates[rows].astype(np.int64)
+    breaks = np.flatnonzero((np.diff(ended[rows]) > 0) | (np.diff(run_dates) - 1 > max_gap)) + 1
+    firsts = np.concatenate([[0], breaks])
+    lasts = np.append(breaks, len(rows)) - 1
+
+    reduce = np.maximum if op in ('>', '>=') else np.minimum
+    peaks = reduce.reduceat(values[rows], firsts)
+    days = lasts - firsts + 1
+    keep = days >= min_days
+    starts, ends = run_dates[firsts][keep], run_dates[lasts][keep]
+    return Runs(starts, ends, days[keep], ends - starts + 1 - days[keep], peaks[keep])
+
+
+def _event_rows(key, event_type, columns, max_gap):
+    """Detect one type's events in a station's columns as `WeatherEvent` rows."""
+    valid = (columns.missing & MEASURES[event_type.measure]) == 0
+    runs = detect_runs(columns.dates, getattr(columns, event_type.measure), valid, event_type.op,
+                       round(event_type.threshold * 10, 6), event_type.min_days, max_gap)
+    return [{
+        'station_key': key,
+        'event_type': event_type.name,
+        'start_date': date.fromordinal(int(start)),
+        'end_date': date.fromordinal(int(end)),
+        'days': int(days),
+        'missing_days': int(missing_days),
+        'peak': int(peak) / 10
+    } for start, end, days, missing_days, peak in zip(*runs)]
+
+
+def _rescan_date(key, event_type, since, max_gap):
+    """
+    Return the date to detect a station's events of a type again from, for new data
+    dated from `since` on.
+
+    A run reaching `since` from before either is a stored event, which is detected
+    again from its start, or is too short to be one and started within the lookback.
+    """
+    lookback = since - timedelta(days=(event_type.min_days + 1) * (max_gap + 1))
+    earliest = db.session.execute(select(func.min(WeatherEvent.start_date)).where(
+        WeatherEvent.station_key == key,
+        WeatherEvent.event_type == event_type.name,
+        WeatherEvent.end_date >= lookback
+    )).scalar()
+    return min(lookback, earliest) if earliest else lookback
+
+
+def update_events(partitions=None):
+    """
+    Detect the events of the stations with new data, or of every station.
+
+    For each station, only the events from the first dirty year on (and any event
+    reaching into it) are detected again, from the station's columns. The caller commits.
+
+    Args:
+        partitions (list, optional): (station_id, year) pairs marked dirty.
+                                     Defaults to every year of every station.
+
+    Returns:
+        int: Events written.
+    """
+    types = event_types()
+    max_gap = current_app.config.get('WEATHER_EVENTS_MAX_GAP_DAYS', 0)
+    if partitions is None:
+        db.session.execute(delete(WeatherEvent))
+        first_years = dict.fromkeys(station_codes())
+    else:
+        first_years = {}
+        for station_id, year in partitions:
+            first_years[station_id] = min(year, first_years.get(station_id, year))
+
+    rows = []
+    for station_id, year in sorted(first_years.items()):
+        key = station_key(station_id, create=False)
+        if key is None or not types:
+            continue
+        rescan = {}
+        if year is not None:
+            for event_type in types.values():
+                rescan[event_type.name] = _rescan_date(key, event_type, date(year, 1, 1), max_gap)
+                db.session.execute(delete(WeatherEvent).where(
+                    WeatherEvent.station_key == key,
+                    WeatherEvent.event_type == event_type.name,
+                    WeatherEvent.start_date >= rescan[event_type.name]
+                ))
+
+        columns = station_columns(station_id, min(rescan.values()) if rescan else None)
+        for event_type in types.values():
+            part = columns
+            if event_type.name in rescan:
+                first = int(np.searchsorted(columns.dates, rescan[event_type.name].toordinal()))
+                part = type(columns)(*(column[first:] for column in columns))
+            rows.extend(_event_rows(key, event_type, part, max_gap))
+
+    if rows:
+        db.session.execute(insert(WeatherEvent.__table__), rows)
+    return len(rows)
@@ -0,0 +1,200 @@
+import gzip
+import json
+import math
+from datetime import date
+from flask import current_app, request
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library encoder is used without it
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: responses are only gzip-compressed without it
+    brotli = None
+
+# Values of the `format` argument of `/api/weather`: the default list of records, or
+# one array per field as JSON, MessagePack (requires msgpack) or an Arrow IPC stream
+# (requires pyarrow)
+FORMATS = ('rows', 'columnar', 'msgpack', 'arrow')
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+# Response types worth compressing; binary formats other than MessagePack are already dense
+_COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain', MSGPACK_MIMETYPE)
+
+
+def dumps_json(data):
+    """
+    Serialize a response body to JSON.
+
+    Uses orjson if installed, several times faster than the standard library on large
+    lists of records; NaN and infinity become null either way.
+
+    Args:
+        data: JSON-serializable data; dates are written as YYYY-MM-DD.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON document.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_json_default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    try:
+        return json.dumps(data, separators=(',', ':'), default=_json_default, allow_nan=False).encode()
+    except ValueError:
+        # Rare enough to only walk the data on failure; the standard library would write NaN
+        return json.dumps(_finite(data), separators=(',', ':'), default=_json_default).encode()
+
+
+def _finite(value):
+    """Copy `value` with non-finite floats replaced by None."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float):
+        # Float subclasses, which orjson does not serialize
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def output_json(data, code, headers=None):
+    """flask-restx representation serializing resource results with `dumps_json`."""
+    response = current_app.response_class(dumps_json(data), status=code, mimetype='application/json')
+    response.headers.extend(headers or {})
+    return response
+
+
+def packb(data):
+    """
+    Serialize data to MessagePack.
+
+    Requires msgpack. Dates are written as YYYY-MM-DD strings, as in JSON.
+
+    Args:
+        data: Data to serialize.
+
+    Returns:
+        bytes: The MessagePack document.
+
+    Raises:
+        ImportError: If msgpack is not installed.
+    """
+    import msgpack
+
+    return msgpack.packb(data, default=_msgpack_default)
+
+
+def _msgpack_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not MessagePack serializable")
+
+
+def arrow_stream(columns):
+    """
+    Serialize columnar weather data as an Arrow IPC stream.
+
+    Requires pyarrow. Dates become a date32 column and the measures nullable float64
+    columns; a scalar `station_id` is repeated for every row.
+
+    Args:
+        columns (dict): Columnar body with `station_id`, `dates` and the measures.
+
+    Returns:
+        bytes: The Arrow IPC stream.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    import pyarrow as pa
+
+    size = len(columns['dates'])
+    station_id = columns['station_id']
+    table = pa.table({
+        'station_id': station_id if isinstance(station_id, list) else [station_id] * size,
+        'date': pa.array([date.fromisoformat(day) for day in columns['dates']], pa.date32()),
+        'max_temp': pa.array(columns['max_temp'], pa.float64()),
+        'min_temp': pa.array(columns['min_temp'], pa.float64()),
+        'precipitation': pa.array(columns['precipitation'], pa.float64()),
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def accepted_encoding():
+    """
+    Choose the compression of the current response from the request's Accept-Encoding.
+
+    Returns:
+        str: 'br' (if brotli is installed) or 'gzip', whichever the client prefers, or
+             None if compression is disabled or the client accepts neither.
+    """
+    if not current_app.config.get('RESPONSE_COMPRESSION_ENABLED', True):
+        return None
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(encodings)
+
+
+def compress(body, encoding):
+    """
+    Compress a response body at `RESPONSE_COMPRESSION_LEVEL`.
+
+    Args:
+        body (bytes): Response body.
+        encoding (str): 'br' or 'gzip'.
+
+    Returns:
+        bytes: The compressed body.
+    """
+    level = current_app.config.get('RESPONSE_COMPRESSION_LEVEL', 5)
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def compressible(response):
+    """True if a response is large enough and of a type worth compressing."""
+    return (response.status_code == 200 and not response.direct_passthrough
+            and not response.is_streamed and 'Content-Encoding' not in response.headers
+            and response.mimetype in _COMPRESSIBLE
+            and response.content_length is not None
+            and response.content_length >= current_app.config.get('RESPONSE_COMPRESSION_MIN_BYTES', 1024))
+
+
+def _compress_response(response):
+    """Compress responses not already compressed by `cached_response`."""
+    if not compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding()
+    if encoding is not None:
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_compression(app):
+    """
+    Compress large responses with the encoding negotiated from Accept-Encoding.
+
+    Cached responses are compressed once per encoding by `cached_response`; this hook
+    handles the others. Streamed exports are left uncompressed.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    app.after_request(_compress_response)
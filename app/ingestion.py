@@ -1,9 +1,21 @@
 import os
+import sys
+import time
 import logging
-from datetime import datetime
+from datetime import datetime, date
+from flask import current_app
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from app import db
-from app.models import WeatherData
+from app.models import WeatherData, IngestManifest
+from app.stations import station_key
+from app.parser import parse_weather_file, iter_row_batches
+from app.sql import dialect_insert
+from app.analysis import mark_dirty_partitions
+from app.cache import mark_data_changed
+from app.metrics import INGEST_COMMIT_SECONDS, record_file_ingest
+from app.partitioning import partitioning_enabled, route_rows
+from app.streams import is_archive, iter_members, iter_parsed_blocks, station_id_from_member
 
 # Logging configuration
 logging.basicConfig(level=logging.INFO)
@@ -116,17 +128,406 @@ def process_file(filepath):
         return 0, 0, 1
 
 
-def ingest_weather_data(filename=None):
+def _upsert_statement(table=None):
+    """
+    Build a dialect-native upsert statement for the `weather_data` table.
+
+    The statement targets the (station_key, date) primary key so that an existing
+    row is updated in place instead of raising an IntegrityError.
+
+    Args:
+        table (Table, optional): Table to write, e.g. a SQLite partition of `weather_data`.
+                                 Defaults to `weather_data` itself.
+
+    Returns:
+        Insert: An `INSERT ... ON CONFLICT DO UPDATE` statement, or None if the
+                database dialect has no native upsert support.
+    """
+    stmt = dialect_insert(table if table is not None else WeatherData.__table__, db.engine.dialect.name)
+    if stmt is None:
+        return None
+
+    return stmt.on_conflict_do_update(
+        index_elements=['station_key', 'date'],
+        set_={
+            'max_temp_tenths': stmt.excluded.max_temp_tenths,
+            'min_temp_tenths': stmt.excluded.min_temp_tenths,
+            'precipitation_tenths': stmt.excluded.precipitation_tenths
+        }
+    )
+
+
+def upsert_weather_rows(station_id, rows, stmt=None, tenths=False):
+    """
+    Write a batch of parsed rows for one station with a single set-based upsert.
+
+    Existing dates are fetched with one range query over the batch so the
+    inserted/updated counts can still be reported. With date partitioning the rows
+    are routed to their partitions, which are created as needed.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+        rows (list): Tuples of (date, max_temp, min_temp, precipitation).
+        stmt (Insert, optional): Prebuilt upsert statement. Defaults to `_upsert_statement()`.
+        tenths (bool, optional): Values are integer tenths (see `iter_row_batches`) rather
+                                 than degrees Celsius and mm. Defaults to False.
+
+    Returns:
+        tuple: Counts of inserted and updated records.
+    """
+    if not rows:
+        return 0, 0
+
+    key = station_key(station_id)
+    dates = [row[0] for row in rows]
+    if not tenths:
+        rows = [
+            (day, *(None if value is None else round(value * 10) for value in values))
+            for day, *values in rows
+        ]
+
+    inserted_count = 0
+    updated_count = 0
+    for table, table_rows in route_rows(rows):
+        table_stmt = stmt if stmt is not None and table is WeatherData.__table__ else _upsert_statement(table)
+        table_dates = [row[0] for row in table_rows]
+
+        # One range query tells us which dates of this batch already exist
+        seen = set(db.session.execute(
+            select(table.c.date).where(
+                table.c.station_key == key,
+                table.c.date.between(min(table_dates), max(table_dates))
+            )
+        ).scalars())
+
+        for date in table_dates:
+            if date in seen:
+                updated_count += 1
+            else:
+                inserted_count += 1
+                seen.add(date)
+
+        db.session.execute(table_stmt, [{
+            'station_key': key,
+            'date': date,
+            'max_temp_tenths': max_temp,
+            'min_temp_tenths': min_temp,
+            'precipitation_tenths': precip
+        } for date, max_temp, min_temp, precip in table_rows])
+
+    # Flag the touched (station, year) partitions for the next stats run
+    mark_dirty_partitions(db.session.connection(), ((station_id, date.year) for date in dates))
+    # Cached API responses become stale once this transaction commits
+    mark_data_changed(db.session)
+
+    return inserted_count, updated_count
+
+
+def station_id_from_path(filepath):
+    """
+    Derive the station ID from a weather file name (e.g. `USC00110072.txt`).
+
+    Args:
+        filepath (str): Path to the weather data file.
+
+    Returns:
+        str: The station ID.
+    """
+    return os.path.basename(filepath).split('.')[0]
+
+
+def parse_station_file(filepath):
+    """
+    Parse a whole weather data file into typed arrays without touching the database.
+
+    This runs outside the Flask app context so it can be executed in worker processes;
+    the returned arrays are much cheaper to pass between processes than row tuples.
+
+    Args:
+        filepath (str): Path to the weather data file.
+
+    Returns:
+        tuple: Station ID and the `ParsedWeatherFile` for the file.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    parsed = parse_weather_file(filepath)
+    for line_number, line, reason in parsed.rejects:
+        logging.warning(f"Skipping invalid line {line_number} in file {filepath}: {line} - {reason}")
+    return station_id_from_path(filepath), parsed
+
+
+def write_station_batches(station_id, batches, stmt=None):
+    """
+    Upsert row batches for one station, committing after each batch.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+        batches (iterable): Lists of (date, max_temp, min_temp, precipitation) tuples in
+                            integer tenths, as yielded by `iter_row_batches(..., tenths=True)`.
+        stmt (Insert, optional): Prebuilt upsert statement. Defaults to `_upsert_statement()`.
+
+    Returns:
+        tuple: Counts of inserted and updated records.
+    """
+    stmt = stmt if stmt is not None else _upsert_statement()
+    inserted_count = 0
+    updated_count = 0
+
+    for batch in batches:
+        inserted, updated = upsert_weather_rows(station_id, batch, stmt, tenths=True)
+        with INGEST_COMMIT_SECONDS.time():
+            db.session.commit()
+        inserted_count += inserted
+        updated_count += updated
+
+    return inserted_count, updated_count
+
+
+def refresh_station_views(station_id, since=None):
+    """
+    Bring the read-side views derived from a station's rows up to date after a write:
+    the station catalog, the columnar store and the prefix-sum index.
+
+    Args:
+        station_id (str): Identifier for the weather station that was written.
+        since (date, optional): Earliest date written, which lets views that support it
+                                update incrementally. None if unknown.
+    """
+    from app.catalog import catalog_enabled, update_catalog
+    from app.colstore import columnar_enabled, materialize_station
+    from app.prefix_index import prefix_index_enabled, update_station
+    from app.cache import bump_generation
+
+    if catalog_enabled():
+        update_catalog(station_id, since)
+        mark_data_changed(db.session)
+        db.session.commit()
+
+    refreshed = False
+    if columnar_enabled():
+        materialize_station(station_id)
+        refreshed = True
+    if prefix_index_enabled():
+        update_station(station_id, since)
+        refreshed = True
+
+    if refreshed:
+        # Responses cached between the data commit and the view refresh are stale
+        bump_generation()
+
+
+def earliest_date(parsed):
+    """
+    Return the earliest date of a parsed file.
+
+    Args:
+        parsed (ParsedWeatherFile): Parsed rows, or None.
+
+    Returns:
+        date: The earliest date, or None if there are no rows.
+    """
+    if parsed is None or not len(parsed.dates):
+        return None
+    return date.fromordinal(int(parsed.dates.min()))
+
+
+def bulk_process_file(filepath, batch_size=None):
+    """
+    Process a single weather data file with batched upserts.
+
+    The file is parsed in one vectorized pass and written in batches of `batch_size`
+    rows; each batch is one upsert statement committed on its own.
+
+    Args:
+        filepath (str): Path to the weather data file.
+        batch_size (int, optional): Rows per upsert/commit. Defaults to `INGEST_BATCH_SIZE`.
+
+    Returns:
+        tuple: Counts of inserted, updated, and skipped records.
+    """
+    batch_size = batch_size or current_app.config.get('INGEST_BATCH_SIZE', 5000)
+    stmt = _upsert_statement()
+    if stmt is None:
+        # No native upsert for this dialect, fall back to the row-by-row path
+        inserted, updated, skipped = process_file(filepath)
+        db.session.commit()
+        refresh_station_views(station_id_from_path(filepath))
+        return inserted, updated, skipped
+
+    start = time.perf_counter()
+    try:
+        station_id, parsed = parse_station_file(filepath)
+    except FileNotFoundError as fnf_error:
+        logging.error(f"File not found: {filepath} - {fnf_error}")
+        return 0, 0, 1
+    parsed_at = time.perf_counter()
+
+    inserted_count, updated_count = write_station_batches(station_id, iter_row_batches(parsed, batch_size, tenths=True), stmt)
+    refresh_station_views(station_id, earliest_date(parsed))
+    record_file_ingest(filepath, inserted_count + updated_count, parsed_at - start, time.perf_counter() - parsed_at)
+    return inserted_count, updated_count, len(parsed.rejects)
+
+
+def incremental_process_file(filepath, batch_size=None):
+    """
+    Process a weather data file using the ingestion manifest.
+
+    Unchanged files are skipped, append-only growth ingests just the new tail, and a
+    changed prefix falls back to a full re-ingest. See `app.manifest.parse_station_tail`.
+
+    Args:
+        filepath (str): Path to the weather data file.
+        batch_size (int, optional): Rows per upsert/commit. Defaults to `INGEST_BATCH_SIZE`.
+
+    Returns:
+        tuple: Counts of inserted, updated, and skipped records.
+    """
+    from app.manifest import manifest_state, parse_station_tail, write_station_tail
+
+    batch_size = batch_size or current_app.config.get('INGEST_BATCH_SIZE', 5000)
+    stmt = _upsert_statement()
+    if stmt is None:
+        return bulk_process_file(filepath, batch_size)
+
+    entry = IngestManifest.query.filter_by(path=os.path.abspath(filepath)).first()
+
+    start = time.perf_counter()
+    try:
+        tail = parse_station_tail(filepath, manifest_state(entry), batch_size)
+    except FileNotFoundError as fnf_error:
+        logging.error(f"File not found: {filepath} - {fnf_error}")
+        return 0, 0, 1
+    parsed_at = time.perf_counter()
+
+    counts = write_station_tail(filepath, tail, stmt)
+    if tail.parsed is not None:
+        refresh_station_views(tail.station_id, earliest_date(tail.parsed))
+    record_file_ingest(filepath, counts[0] + counts[1], parsed_at - start, time.perf_counter() - parsed_at)
+    return counts
+
+
+def ingest_stream(source, station_id=None, batch_size=None, block_size=None, progress=None):
+    """
+    Ingest station files streamed from an archive, a compressed file or stdin.
+
+    Members are decompressed, parsed in blocks of `block_size` bytes and written in
+    batches as they are read, so nothing is extracted to disk and memory stays bounded
+    whatever the size of the archive. See `app.streams.iter_members` for the formats.
+    Streamed sources bypass the ingestion manifest.
+
+    Args:
+        source (str): Path of the archive or file, or '-' for stdin.
+        station_id (str, optional): Station of a single, non-archive stream. Defaults to
+                                    the station derived from each member name.
+        batch_size (int, optional): Rows per upsert/commit. Defaults to `INGEST_BATCH_SIZE`.
+        block_size (int, optional): Bytes parsed at a time. Defaults to `INGEST_STREAM_BLOCK_SIZE`.
+        progress (callable, optional): Called as `progress(name, inserted, updated, skipped)`
+                                       after each member.
+
+    Returns:
+        dict: Aggregated counts (`files`, `inserted`, `updated`, `skipped`, `errors`).
+
+    Raises:
+        RuntimeError: If the database dialect has no native upsert.
+        ValueError: If stdin holds a single station file and no `station_id` is given.
+    """
+    batch_size = batch_size or current_app.config.get('INGEST_BATCH_SIZE', 5000)
+    block_size = block_size or current_app.config.get('INGEST_STREAM_BLOCK_SIZE', 1024 * 1024)
+    stmt = _upsert_statement()
+    if stmt is None:
+        raise RuntimeError(f"Streaming ingestion needs native upsert support, not available on {db.engine.dialect.name}")
+
+    summary = {'files': 0, 'inserted': 0, 'updated': 0, 'skipped': 0, 'errors': {}}
+    if source == '-':
+        name = f'{station_id}.txt' if station_id else source
+    else:
+        name = source
+    fileobj = sys.stdin.buffer if source == '-' else open(source, 'rb')
+    try:
+        for member_name, stream in iter_members(fileobj, name):
+            if member_name == '-':
+                # A single station file on stdin has no name to derive its station from
+                raise ValueError("A station file read from stdin needs a station_id")
+            member_station = station_id or station_id_from_member(member_name)
+            label = member_name if source == '-' else f'{source}:{member_name}'
+            logging.info(f"Processing file: {label}")
+
+            start = time.perf_counter()
+            parse_seconds = 0.0
+            counts = [0, 0, 0]
+            first = None
+            blocks = iter_parsed_blocks(stream, block_size, label)
+            try:
+                while True:
+                    parse_start = time.perf_counter()
+                    parsed = next(blocks, None)
+                    parse_seconds += time.perf_counter() - parse_start
+                    if parsed is None:
+                        break
+                    inserted, updated = write_station_batches(
+                        member_station, iter_row_batches(parsed, batch_size, tenths=True), stmt)
+                    counts[0] += inserted
+                    counts[1] += updated
+                    counts[2] += len(parsed.rejects)
+                    block_first = earliest_date(parsed)
+                    if block_first and (first is None or block_first < first):
+                        first = block_first
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Failed to ingest {label}: {e}")
+                summary['errors'][label] = str(e)
+                if progress:
+                    progress(label, 0, 0, 0)
+                continue
+
+            if counts[0] or counts[1]:
+                refresh_station_views(member_station, first)
+            record_file_ingest(label, counts[0] + counts[1], parse_seconds,
+                               time.perf_counter() - start - parse_seconds)
+            summary['files'] += 1
+            summary['inserted'] += counts[0]
+            summary['updated'] += counts[1]
+            summary['skipped'] += counts[2]
+            if progress:
+                progress(label, *counts)
+    finally:
+        if source != '-':
+            fileobj.close()
+
+    return summary
+
+
+def ingest_weather_data(filename=None, bulk=None, batch_size=None, workers=None, incremental=None, data_dir=None,
+                        progress=None):
     """
     Ingest weather data from a specified file or directory of files.
 
     Args:
-        filename (str, optional): Specific file name to ingest. Defaults to None.
+        filename (str, optional): Specific file name to ingest; archives and compressed
+                                  files are streamed with `ingest_stream`. Defaults to None.
+        bulk (bool, optional): Use batched upserts instead of per-row lookups.
+                               Defaults to the `INGEST_BULK` config value.
+        batch_size (int, optional): Rows per upsert/commit in bulk mode.
+                                    Defaults to the `INGEST_BATCH_SIZE` config value.
+        workers (int, optional): Parser processes for bulk mode; more than one uses
+                                 `app.pipeline.ingest_parallel`. Defaults to `INGEST_WORKERS`.
+        incremental (bool, optional): Use the ingestion manifest to skip unchanged files and
+                                      ingest only appended rows in bulk mode.
+                                      Defaults to `INGEST_INCREMENTAL`.
+        data_dir (str, optional): Directory of weather files to ingest. Defaults to 'wx_data'.
+        progress (callable, optional): Called as `progress(filepath, inserted, updated, skipped)`
+                                       after each file.
+
+    Returns:
+        dict: Aggregated counts (`files`, `inserted`, `updated`, `skipped`, `errors`),
+              or None if no files were found.
 
     Steps:
         1. Retrieve file paths using `get_file_paths`.
         2. Process each file to update or insert weather data.
-        3. Commit changes to the database.
+        3. Commit changes to the database (per batch in bulk mode).
 
     Logs:
         Logs the number of inserted, updated, and skipped records.
@@ -134,26 +535,54 @@ def ingest_weather_data(filename=None):
     Raises:
         Exception: Logs and rolls back in case of database commit failure.
     """
+    if filename and is_archive(filename):
+        return ingest_stream(filename, batch_size=batch_size, progress=progress)
+
     base_dir = os.path.dirname(os.path.abspath(__file__))
-    file_paths = get_file_paths(base_dir, filename)
+    file_paths = get_file_paths(base_dir, filename, data_dir)
 
     if not file_paths:
         logging.error("No valid files found for ingestion.")
         return
 
+    if bulk is None:
+        bulk = current_app.config.get('INGEST_BULK', True)
+    if incremental is None:
+        incremental = current_app.config.get('INGEST_INCREMENTAL', True)
+    workers = workers or current_app.config.get('INGEST_WORKERS', 1)
+    if not bulk and partitioning_enabled():
+        # ORM writes go to the parent table, which only PostgreSQL routes to partitions
+        logging.warning("Per-row ingestion does not route rows to partitions, using bulk ingestion")
+        bulk = True
+
+    if bulk and workers > 1 and len(file_paths) > 1:
+        from app.pipeline import ingest_parallel
+        return ingest_parallel(file_paths, workers=workers, batch_size=batch_size, incremental=incremental,
+                               progress=progress)
+
     total_inserted = 0
     total_updated = 0
     total_skipped = 0
 
     logging.info(f"Starting data ingestion at {datetime.now()}")
-    for filepath in file_paths:
-        logging.info(f"Processing file: {filepath}")
-        inserted, updated, skipped = process_file(filepath)
-        total_inserted += inserted
-        total_updated += updated
-        total_skipped += skipped
-
+    summary = {'files': len(file_paths), 'inserted': 0, 'updated': 0, 'skipped': 0, 'errors': {}}
     try:
+        for filepath in file_paths:
+            logging.info(f"Processing file: {filepath}")
+            if bulk and incremental:
+                inserted, updated, skipped = incremental_process_file(filepath, batch_size)
+            elif bulk:
+                inserted, updated, skipped = bulk_process_file(filepath, batch_size)
+            else:
+                inserted, updated, skipped = process_file(filepath)
+                db.session.commit()
+                refresh_station_views(station_id_from_path(filepath))
+            total_inserted += inserted
+            total_updated += updated
+            total_skipped += skipped
+            if progress:
+                progress(filepath, inserted, updated, skipped)
+
         db.session.commit()
         logging.info(f"Data ingestion completed at {datetime.now()}")
         logging.info(f"Total records inserted: {total_inserted}")
@@ -162,7 +591,11 @@ def ingest_weather_data(filename=None):
     except Exception as e:
         db.session.rollback()
         logging.error(f"Failed to commit data to the database: {e}")
+        summary['errors'][filename or 'commit'] = str(e)
+
+    summary.update(inserted=total_inserted, updated=total_updated, skipped=total_skipped)
+    return summary
 
 
 if __name__ == "__main__":
-    ingest_weather_data()
\ No newline at end of file
+    ingest_weather_data()
@@ -0,0 +1,298 @@
+import os
+import json
+import uuid
+import socket
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Job
+
+JOB_KINDS = ('ingest', 'stats')
+
+
+def _now():
+    # Naive UTC, as stored by the DateTime columns
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _owner():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _owner_alive(owner):
+    """True unless `owner` is a process on this host that has exited."""
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+
+class JobRunner:
+    """
+    Runs jobs of one app on a bounded pool of background threads.
+
+    Ingestion commits per batch and SQLite releases the GIL while it works, so request
+    threads keep being served while a job runs.
+    """
+
+    def __init__(self, app, max_workers):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.futures = {}
+
+    def submit(self, job_id):
+        """Queue a job for execution."""
+        self.futures[job_id] = self.executor.submit(self._run, job_id)
+
+    def wait(self, job_id, timeout=None):
+        """
+        Block until a job submitted by this runner has finished.
+
+        Args:
+            job_id (str): The job ID.
+            timeout (float, optional): Seconds to wait at most. Defaults to no limit.
+        """
+        future = self.futures.get(job_id)
+        if future is not None:
+            future.result(timeout)
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                run_job(job_id)
+            finally:
+                self.futures.pop(job_id, None)
+                db.session.remove()
+
+
+def init_jobs(app):
+    """
+    Create the app's background job runner with `JOBS_MAX_WORKERS` threads.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    app.extensions['job_runner'] = JobRunner(app, app.config.get('JOBS_MAX_WORKERS', 2))
+
+
+def data_root():
+    """
+    Return the directory ingestion jobs may read from.
+
+    Returns:
+        str: `JOBS_DATA_ROOT`, or the default `wx_data` directory if unset.
+    """
+    root = current_app.config.get('JOBS_DATA_ROOT')
+    if root is None:
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'wx_data')
+    return os.path.realpath(root)
+
+
+def _inside_root(path):
+    """Resolve `path` against `data_root()`, rejecting anything outside it."""
+    root = data_root()
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"{path} is outside the data directory")
+    if not os.path.exists(resolved):
+        raise ValueError(f"{path} does not exist")
+    return resolved
+
+
+def ingest_job_files(params):
+    """
+    Resolve the files an ingestion job reads, for coalescing and progress.
+
+    Args:
+        params (dict): Job parameters: `file` or `data_dir`, relative to `data_root()`.
+
+    Returns:
+        list: Absolute paths of the files, sorted.
+
+    Raises:
+        ValueError: If a path is outside the data directory or does not exist.
+    """
+    from app.ingestion import get_file_paths
+    if params.get('file'):
+        return [_inside_root(params['file'])]
+    data_dir = _inside_root(params.get('data_dir') or '.')
+    return sorted(os.path.abspath(path) for path in get_file_paths(None, dir_path=data_dir))
+
+
+def job_key(kind, params):
+    """
+    Hash identifying the work a job does, so identical concurrent jobs coalesce.
+
+    Ingestion jobs are keyed by the files they read rather than how the files were named.
+
+    Args:
+        kind (str): 'ingest' or 'stats'.
+        params (dict): Job parameters.
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    work = dict(params)
+    if kind == 'ingest':
+        work = {'files': ingest_job_files(params), 'full': bool(params.get('full'))}
+    return hashlib.sha256(json.dumps([kind, work], sort_keys=True).encode()).hexdigest()
+
+
+def enqueue_job(kind, params):
+    """
+    Record a job and queue it on the background runner.
+
+    If an identical job is already queued or running, that job is returned instead.
+
+    Args:
+        kind (str): 'ingest' or 'stats'.
+        params (dict): Job parameters.
+
+    Returns:
+        tuple: The `Job` and whether it was newly created.
+
+    Raises:
+        ValueError: If the kind or parameters are invalid.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    key = job_key(kind, params)
+
+    existing = Job.query.filter_by(active_key=key).first()
+    if existing is not None:
+        if _owner_alive(existing.owner):
+            return existing, False
+        # The process that ran it is gone, so it will never finish
+        _finish(existing, 'failed', error='worker process exited')
+        db.session.commit()
+
+    job = Job(id=uuid.uuid4().hex, kind=kind, params=params, active_key=key, owner=_owner(),
+              status='queued', created_at=_now(), files_done=0, rows=0)
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request queued the same work first
+        db.session.rollback()
+        return Job.query.filter_by(active_key=key).one(), False
+
+    current_app.extensions['job_runner'].submit(job.id)
+    return job, True
+
+
+def _finish(job, status, result=None, error=None):
+    job.status = status
+    job.result = result
+    job.error = error
+    job.finished_at = _now()
+    job.active_key = None
+
+
+def run_job(job_id):
+    """
+    Run a queued job to completion, recording progress and the outcome on its row.
+
+    Args:
+        job_id (str): The job ID.
+    """
+    job = db.session.get(Job, job_id)
+    job.status = 'running'
+    job.started_at = _now()
+    db.session.commit()
+    logging.info(f"Job {job_id} ({job.kind}) started")
+
+    try:
+        result = _run_ingest(job) if job.kind == 'ingest' else _run_stats(job)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Job {job_id} failed: {e}")
+        _finish(db.session.get(Job, job_id), 'failed', error=str(e))
+    else:
+        _finish(job, 'succeeded', result=result)
+    db.session.commit()
+    logging.info(f"Job {job_id} finished")
+
+
+def _run_ingest(job):
+    # The ingestion pipeline is loaded by the first job, not when the app starts
+    from app.ingestion import ingest_weather_data
+    from app.streams import is_archive
+    params = job.params
+    file_paths = ingest_job_files(params)
+    streamed = len(file_paths) == 1 and is_archive(file_paths[0])
+    job.files_total = None if streamed else len(file_paths)
+    db.session.commit()
+
+    def progress(filepath, inserted, updated, skipped):
+        # Called between files, after their rows are committed
+        job.files_done += 1
+        job.rows += inserted + updated
+        db.session.commit()
+
+    if params.get('file'):
+        summary = ingest_weather_data(file_paths[0], incremental=False if params.get('full') else None,
+                                      progress=progress)
+    else:
+        summary = ingest_weather_data(data_dir=_inside_root(params.get('data_dir') or '.'),
+                                      incremental=False if params.get('full') else None, progress=progress)
+    if summary is None:
+        raise RuntimeError("No valid files found for ingestion.")
+    return summary
+
+
+def _run_stats(job):
+    from app.analysis import calculate_weather_stats
+
+    start = _now()
+    calculate_weather_stats(full=bool(job.params.get('full')))
+    return {'full': bool(job.params.get('full')), 'seconds': (_now() - start).total_seconds()}
+
+
+def job_status(job):
+    """
+    Describe a job for the API, with its progress rates.
+
+    Args:
+        job (Job): The job.
+
+    Returns:
+        dict: Status, timestamps, progress (files, rows, rows/sec, ETA) and outcome.
+    """
+    def timestamp(value):
+        return value.isoformat() + 'Z' if value else None
+
+    elapsed = ((job.finished_at or _now()) - job.started_at).total_seconds() if job.started_at else None
+    rows_per_second = job.rows / elapsed if elapsed else None
+    eta = None
+    if job.status == 'running' and job.files_total and job.files_done:
+        eta = elapsed / job.files_done * (job.files_total - job.files_done)
+
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'params': job.params,
+        'created_at': timestamp(job.created_at),
+        'started_at': timestamp(job.started_at),
+        'finished_at': timestamp(job.finished_at),
+        'progress': {
+            'files_total': job.files_total,
+            'files_done': job.files_done,
+            'rows': job.rows,
+            'elapsed_seconds': elapsed,
+            'rows_per_second': rows_per_second,
+            'eta_seconds': eta
+        },
+        'result': job.result,
+        'error': job.error
+    }
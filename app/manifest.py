@@ -0,0 +1,171 @@
+import os
+import logging
+import hashlib
+from collections import namedtuple
+import numpy as np
+from app import db
+from app.models import IngestManifest
+from app.parser import parse_weather_bytes, iter_row_batches
+from app.metrics import INGEST_COMMIT_SECONDS
+
+# Snapshot of a manifest row that can be shipped to parser processes
+ManifestState = namedtuple('ManifestState', ['size', 'mtime_ns', 'byte_offset', 'content_hash'])
+
+ParsedTail = namedtuple('ParsedTail', [
+    'station_id',   # Station the file belongs to
+    'size',         # File size when it was read
+    'mtime_ns',     # File modification time when it was read
+    'start',        # Byte offset the parse started from (0 for a full ingest), None if unchanged
+    'parsed',       # ParsedWeatherFile for the bytes after `start`, None if unchanged
+    'batch_size',   # Rows per batch the checkpoints were computed for
+    'checkpoints'   # (byte_offset, content_hash) after each batch
+])
+
+
+def manifest_state(entry):
+    """
+    Snapshot a manifest row as a picklable `ManifestState`.
+
+    Args:
+        entry (IngestManifest, optional): Manifest row, or None for a file never ingested.
+
+    Returns:
+        ManifestState: The snapshot, or None if `entry` is None.
+    """
+    if entry is None:
+        return None
+    return ManifestState(entry.size, entry.mtime_ns, entry.byte_offset, entry.content_hash)
+
+
+def load_manifest_states():
+    """
+    Load the manifest as picklable states keyed by absolute file path.
+
+    Returns:
+        dict: Mapping of path to `ManifestState`.
+    """
+    return {entry.path: manifest_state(entry) for entry in IngestManifest.query.all()}
+
+
+def parse_station_tail(filepath, state, batch_size):
+    """
+    Parse only the part of a weather file that has not been ingested yet.
+
+    The file is skipped if its size and mtime match the last completed run. Otherwise,
+    if the bytes up to the stored offset still hash to the stored digest, only the tail
+    after the offset is parsed (append-only growth, or resuming a crashed run). Any
+    change to that prefix falls back to parsing the whole file.
+
+    This runs outside the Flask app context so it can be executed in worker processes.
+
+    Args:
+        filepath (str): Path to the weather data file.
+        state (ManifestState, optional): Manifest state for the file, None if never ingested.
+        batch_size (int): Rows per batch; a checkpoint is computed after each batch.
+
+    Returns:
+        ParsedTail: The parsed tail and its checkpoints.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    from app.ingestion import station_id_from_path
+
+    station_id = station_id_from_path(filepath)
+    stat = os.stat(filepath)
+    if state and state.size == stat.st_size and state.mtime_ns == stat.st_mtime_ns:
+        return ParsedTail(station_id, stat.st_size, stat.st_mtime_ns, None, None, batch_size, [])
+
+    with open(filepath, 'rb') as file:
+        data = file.read()
+
+    start = 0
+    hasher = hashlib.sha256()
+    if state and state.byte_offset <= len(data):
+        prefix_hasher = hashlib.sha256(data[:state.byte_offset])
+        if prefix_hasher.hexdigest() == state.content_hash:
+            start, hasher = state.byte_offset, prefix_hasher
+        else:
+            logging.info(f"Content changed before offset {state.byte_offset} in {filepath}, re-ingesting whole file")
+
+    tail = data[start:]
+    first_line = data.count(b'\n', 0, start) + 1
+    parsed = parse_weather_bytes(tail, first_line)
+    for line_number, line, reason in parsed.rejects:
+        logging.warning(f"Skipping invalid line {line_number} in file {filepath}: {line} - {reason}")
+
+    # Offsets just past each line; a trailing line without newline is never checkpointed
+    line_ends = np.flatnonzero(np.frombuffer(tail, dtype=np.uint8) == 10) + 1
+    complete = int(line_ends[-1]) if len(line_ends) else 0
+
+    checkpoints = []
+    position = 0
+    row_count = len(parsed.dates)
+    for stop in list(range(batch_size, row_count, batch_size)) + [row_count]:
+        if stop == row_count:
+            end = complete
+        else:
+            end = int(line_ends[parsed.line_numbers[stop - 1] - first_line])
+        hasher.update(tail[position:end])
+        position = end
+        checkpoints.append((start + end, hasher.hexdigest()))
+
+    return ParsedTail(station_id, stat.st_size, stat.st_mtime_ns, start, parsed, batch_size, checkpoints)
+
+
+def write_station_tail(filepath, tail, stmt):
+    """
+    Upsert a parsed tail, committing a manifest checkpoint with every batch.
+
+    Each batch and its checkpoint are committed in one transaction, so after a crash the
+    next run resumes right after the last committed batch.
+
+    Args:
+        filepath (str): Path to the weather data file.
+        tail (ParsedTail): Output of `parse_station_tail`.
+        stmt (Insert): Prebuilt upsert statement.
+
+    Returns:
+        tuple: Counts of inserted, updated, and skipped records.
+    """
+    from app.ingestion import upsert_weather_rows
+
+    if tail.parsed is None:
+        logging.info(f"Skipping unchanged file: {filepath}")
+        return 0, 0, 0
+
+    path = os.path.abspath(filepath)
+    entry = IngestManifest.query.filter_by(path=path).first()
+    if entry is None:
+        entry = IngestManifest(path=path, station_id=tail.station_id,
+                               byte_offset=0, content_hash=hashlib.sha256().hexdigest())
+        db.session.add(entry)
+
+    # Mark the run as in progress until the final commit
+    entry.size = None
+    entry.mtime_ns = None
+    if tail.start == 0:
+        entry.last_date = None
+
+    inserted_count = 0
+    updated_count = 0
+    batches = iter_row_batches(tail.parsed, tail.batch_size, tenths=True)
+    for byte_offset, content_hash in tail.checkpoints:
+        rows = next(batches, [])
+        if rows:
+            inserted, updated = upsert_weather_rows(tail.station_id, rows, stmt, tenths=True)
+            inserted_count += inserted
+            updated_count += updated
+            last_date = max(row[0] for row in rows)
+            entry.last_date = max(entry.last_date, last_date) if entry.last_date else last_date
+
+        entry.byte_offset = byte_offset
+        entry.content_hash = content_hash
+        with INGEST_COMMIT_SECONDS.time():
+            db.session.commit()
+
+    entry.size = tail.size
+    entry.mtime_ns = tail.mtime_ns
+    db.session.commit()
+
+    return inserted_count, updated_count, len(tail.parsed.rejects)
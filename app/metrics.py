@@ -0,0 +1,294 @@
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Every metric created in this module, in exposition order
+REGISTRY = []
+
+# Latency buckets in seconds, from sub-millisecond lookups to multi-second scans
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Statement types used as the `operation` label; anything else is reported as OTHER
+_OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'PRAGMA', 'CREATE', 'DROP', 'ALTER', 'BEGIN', 'COMMIT'}
+
+
+class _Metric:
+    """Base of the metric types: a name, help text and per-label-set values."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def samples(self):
+        """Return the exposition lines of this metric's samples, one per label set."""
+        with self._lock:
+            return [f'{self.name}{self._label_text(key)} {value}' for key, value in sorted(self._values.items())]
+
+    def render(self):
+        """
+        Render the metric in the Prometheus text exposition format.
+
+        Returns:
+            str: HELP and TYPE lines followed by one line per sample.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        return '\n'.join(lines + self.samples())
+
+
+class Counter(_Metric):
+    """A monotonically increasing value."""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that can go up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, with their sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last one is +Inf), then the sum
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the `with` block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), state[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self._label_text(key, [("le", str(bound))])} {cumulative}')
+            lines.append(f'{self.name}_sum{self._label_text(key)} {state[-1]}')
+            lines.append(f'{self.name}_count{self._label_text(key)} {cumulative}')
+        return lines
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time spent handling HTTP requests.', ['method', 'endpoint', 'status'])
+HTTP_REQUEST_QUERIES = Histogram(
+    'http_request_queries', 'SQL statements executed per HTTP request.', ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100))
+HTTP_REQUEST_QUERY_SECONDS = Histogram(
+    'http_request_query_seconds', 'Time spent in SQL per HTTP request.', ['endpoint'])
+DB_QUERY_SECONDS = Histogram(
+    'db_query_duration_seconds', 'Time spent executing SQL statements.', ['operation'])
+DB_SLOW_QUERIES = Counter(
+    'db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_THRESHOLD_MS.', ['operation'])
+INGEST_ROWS = Counter(
+    'ingest_rows_total', 'Rows written by ingestion.')
+INGEST_FILES = Counter(
+    'ingest_files_total', 'Files processed by ingestion.')
+INGEST_PARSE_SECONDS = Counter(
+    'ingest_parse_seconds_total', 'Time spent parsing weather files.')
+INGEST_WRITE_SECONDS = Counter(
+    'ingest_write_seconds_total', 'Time spent writing parsed rows to the database.')
+INGEST_FILE_ROWS_PER_SECOND = Histogram(
+    'ingest_file_rows_per_second', 'Rows written per second of parse and write time, per file.',
+    buckets=(1000, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000))
+INGEST_COMMIT_SECONDS = Histogram(
+    'ingest_batch_commit_seconds', 'Latency of ingestion batch commits.')
+STATS_RUN_SECONDS = Histogram(
+    'stats_run_duration_seconds', 'Duration of weather statistics runs.', ['mode'],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
+STATS_LAST_RUN = Gauge(
+    'stats_last_run_timestamp_seconds', 'Unix time the last weather statistics run finished.', ['mode'])
+
+
+def timed_call(function, *args):
+    """
+    Call `function` and also return how long it took.
+
+    Module-level so it can wrap work submitted to worker processes.
+
+    Returns:
+        tuple: (result, elapsed seconds).
+    """
+    start = time.perf_counter()
+    return function(*args), time.perf_counter() - start
+
+
+def record_file_ingest(filepath, rows, parse_seconds, write_seconds):
+    """
+    Record and log the throughput of one ingested file.
+
+    Args:
+        filepath (str): Path of the ingested file.
+        rows (int): Rows inserted or updated.
+        parse_seconds (float): Time spent parsing.
+        write_seconds (float): Time spent writing, including commits and view refreshes.
+    """
+    INGEST_FILES.inc()
+    INGEST_ROWS.inc(rows)
+    INGEST_PARSE_SECONDS.inc(parse_seconds)
+    INGEST_WRITE_SECONDS.inc(write_seconds)
+    elapsed = parse_seconds + write_seconds
+    if rows and elapsed > 0:
+        INGEST_FILE_ROWS_PER_SECOND.observe(rows / elapsed)
+        logging.info(f"Ingested {rows} rows from {filepath} in {elapsed:.3f}s "
+                     f"(parse {parse_seconds:.3f}s, write {write_seconds:.3f}s, {rows / elapsed:.0f} rows/s)")
+
+
+def record_stats_run(mode, seconds, partitions=None):
+    """
+    Record and log the duration of a weather statistics run.
+
+    Args:
+        mode (str): 'full' or 'incremental'.
+        seconds (float): Duration of the run.
+        partitions (int, optional): Number of (station, year) partitions recomputed.
+    """
+    STATS_RUN_SECONDS.observe(seconds, mode=mode)
+    STATS_LAST_RUN.set(time.time(), mode=mode)
+    scope = f"{partitions} partitions" if partitions is not None else "all partitions"
+    logging.info(f"Weather stats {mode} run recomputed {scope} in {seconds:.3f}s")
+
+
+def _operation(statement):
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].upper() if words else ''
+    return operation if operation in _OPERATIONS else 'OTHER'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own execution context, which is discarded with it whether
+    # the statement succeeds or fails
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_metrics_start', None)
+    if start is None or not has_app_context() or not current_app.config.get('METRICS_ENABLED', True):
+        return
+    elapsed = time.perf_counter() - start
+
+    operation = _operation(statement)
+    DB_QUERY_SECONDS.observe(elapsed, operation=operation)
+    if has_request_context() and 'metrics_queries' in g:
+        g.metrics_queries += 1
+        g.metrics_query_seconds += elapsed
+
+    threshold = current_app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    if threshold is not None and elapsed * 1000 >= threshold:
+        DB_SLOW_QUERIES.inc(operation=operation)
+        logging.warning(f"Slow query ({elapsed * 1000:.1f} ms): {' '.join(statement.split())}")
+
+
+def _start_request_timer():
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_query_seconds = 0.0
+
+
+def _record_request(response):
+    if 'metrics_start' in g:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_start,
+                                     method=request.method, endpoint=endpoint, status=response.status_code)
+        HTTP_REQUEST_QUERIES.observe(g.metrics_queries, endpoint=endpoint)
+        HTTP_REQUEST_QUERY_SECONDS.observe(g.metrics_query_seconds, endpoint=endpoint)
+    return response
+
+
+def render_metrics():
+    """
+    Render every metric of this process in the Prometheus text exposition format.
+
+    Response cache counters of the current app are included as well.
+
+    Returns:
+        str: The exposition text.
+    """
+    blocks = [metric.render() for metric in REGISTRY]
+    cache = current_app.extensions.get('response_cache')
+    if cache is not None:
+        stats = cache.stats()
+        blocks.append('# HELP response_cache_events_total Response cache lookups by result.\n'
+                      '# TYPE response_cache_events_total counter\n' + '\n'.join(
+                          f'response_cache_events_total{{result="{name}"}} {stats[name]}'
+                          for name in ('hits', 'disk_hits', 'misses', 'evictions', 'not_modified')))
+        blocks.append('# HELP response_cache_bytes Bytes held by the in-process response cache.\n'
+                      f'# TYPE response_cache_bytes gauge\nresponse_cache_bytes {stats["bytes"]}')
+    return '\n'.join(blocks) + '\n'
+
+
+def metrics_view():
+    """Serve `/metrics` for Prometheus scraping."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    """
+    Register request instrumentation and the `/metrics` endpoint.
+
+    Metrics are kept per process; with several worker processes each one is scraped
+    separately. SQL statements are timed through SQLAlchemy engine events and counted
+    per request, so N+1 query patterns show up in `http_request_queries`.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.before_request(_start_request_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
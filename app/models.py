@@ -1,34 +1,140 @@
+from sqlalchemy import select
+from sqlalchemy.ext.hybrid import hybrid_property, Comparator
+from sqlalchemy.sql import operators
 from app import db
 
+
+class Station(db.Model):
+    """
+    Dimension table of weather stations.
+
+    Weather rows reference a station by its small integer key instead of repeating
+    the station code on every row.
+
+    Attributes:
+        id (int): Primary key, auto-incremented surrogate key of the station.
+        code (str): Station identifier from the source files (e.g. `USC00110072`).
+    """
+    __tablename__ = 'stations'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    code = db.Column(db.String, nullable=False, unique=True)
+
+    @classmethod
+    def for_code(cls, code):
+        """
+        Return the station with the given code, adding a new one to the session if needed.
+
+        Args:
+            code (str): Station identifier.
+
+        Returns:
+            Station: The existing or pending station.
+        """
+        # The query autoflushes, so a station added earlier in this session is found too
+        station = cls.query.filter_by(code=code).first()
+        if station is None:
+            station = cls(code=code)
+            db.session.add(station)
+        return station
+
+
+class StationCodeComparator(Comparator):
+    """
+    Compares `WeatherData.station_id` by resolving the code to the station key first.
+
+    `station_id == code` becomes `station_key == (SELECT id FROM stations WHERE code = ...)`,
+    which seeks the primary key instead of looking up every row's code.
+    """
+
+    def __init__(self, station_key):
+        self.station_key = station_key
+        super().__init__(select(Station.code).where(Station.id == station_key).scalar_subquery())
+
+    def operate(self, op, *other, **kwargs):
+        if op is operators.eq:
+            return self.station_key == select(Station.id).where(Station.code == other[0]).scalar_subquery()
+        if op is operators.ne:
+            return self.station_key != select(Station.id).where(Station.code == other[0]).scalar_subquery()
+        if op is operators.in_op:
+            return self.station_key.in_(select(Station.id).where(Station.code.in_(other[0])))
+        return op(self.__clause_element__(), *other, **kwargs)
+
+
+def _tenths_property(column_name, doc):
+    """Expose an integer-tenths column as a float attribute and SQL expression."""
+    def fget(self):
+        value = getattr(self, column_name)
+        return None if value is None else value / 10
+
+    def fset(self, value):
+        setattr(self, column_name, None if value is None else round(value * 10))
+
+    def expr(cls):
+        return getattr(cls, column_name) / 10.0
+
+    prop = hybrid_property(fget, fset, expr=expr)
+    prop.__doc__ = doc
+    return prop
+
+
 class WeatherData(db.Model):
     """
     Represents the daily weather data for a station.
 
+    Rows are keyed by (station_key, date) and measurements are stored as small integers
+    in tenths, exactly as in the source files. On SQLite the table is stored without a
+    rowid, so the primary key index is the table itself.
+
     Attributes:
-        id (int): Primary key, auto-incremented unique identifier for each record.
-        station_id (str): Identifier for the weather station.
+        station_key (int): Key of the `Station` the record belongs to.
         date (Date): The date of the weather record.
+        max_temp_tenths (int, optional): Maximum temperature in tenths of a degree Celsius.
+        min_temp_tenths (int, optional): Minimum temperature in tenths of a degree Celsius.
+        precipitation_tenths (int, optional): Total precipitation in tenths of a mm.
+        station_id (str): Identifier for the weather station; resolves to `station_key`.
         max_temp (float, optional): Maximum temperature recorded on the date (in degrees Celsius).
         min_temp (float, optional): Minimum temperature recorded on the date (in degrees Celsius).
         precipitation (float, optional): Total precipitation recorded on the date (in mm).
 
     Constraints:
-        - A unique combination of `station_id` and `date` ensures no duplicate records for the same station and date.
+        - The (station_key, date) primary key ensures no duplicate records for the same station and date.
+        - `ix_weather_data_date` leads with the date, so all stations of a day (see
+          `/api/weather/snapshot`) are an index seek instead of a scan.
     """
     __tablename__ = 'weather_data'
 
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    station_id = db.Column(db.String, nullable=False)
-    date = db.Column(db.Date, nullable=False)
-    max_temp = db.Column(db.Float, nullable=True)
-    min_temp = db.Column(db.Float, nullable=True)
-    precipitation = db.Column(db.Float, nullable=True)
+    station_key = db.Column(db.Integer, db.ForeignKey('stations.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    max_temp_tenths = db.Column(db.SmallInteger, nullable=True)
+    min_temp_tenths = db.Column(db.SmallInteger, nullable=True)
+    precipitation_tenths = db.Column(db.SmallInteger, nullable=True)
+
+    station = db.relationship(Station)
 
-    # Ensure unique combination of station_id and date
     __table_args__ = (
-        db.UniqueConstraint('station_id', 'date', name='uix_station_date'),
+        db.Index('ix_weather_data_date', 'date'),
+        {'sqlite_with_rowid': False},
     )
 
+    max_temp = _tenths_property('max_temp_tenths', 'Maximum temperature in degrees Celsius.')
+    min_temp = _tenths_property('min_temp_tenths', 'Minimum temperature in degrees Celsius.')
+    precipitation = _tenths_property('precipitation_tenths', 'Precipitation in mm.')
+
+    @hybrid_property
+    def station_id(self):
+        """Identifier for the weather station."""
+        return self.station.code if self.station is not None else None
+
+    @station_id.inplace.setter
+    def _station_id_setter(self, code):
+        self.station = Station.for_code(code)
+
+    @station_id.inplace.comparator
+    @classmethod
+    def _station_id_comparator(cls):
+        return StationCodeComparator(cls.station_key)
+
 
 class WeatherStats(db.Model):
     """
@@ -41,6 +147,9 @@ class WeatherStats(db.Model):
         avg_max_temp (float, optional): Average of maximum daily temperatures for the year.
         avg_min_temp (float, optional): Average of minimum daily temperatures for the year.
         total_precipitation (float, optional): Total precipitation recorded for the year (in mm).
+
+    Constraints:
+        - A unique combination of `station_id` and `year` so recomputation updates rows in place.
     """
     __tablename__ = 'weather_stats'
 
@@ -49,4 +158,233 @@ class WeatherStats(db.Model):
     year = db.Column(db.Integer, nullable=False)
     avg_max_temp = db.Column(db.Float, nullable=True)
     avg_min_temp = db.Column(db.Float, nullable=True)
-    total_precipitation = db.Column(db.Float, nullable=True)
\ No newline at end of file
+    total_precipitation = db.Column(db.Float, nullable=True)
+
+    # Ensure unique combination of station_id and year
+    __table_args__ = (
+        db.UniqueConstraint('station_id', 'year', name='uix_station_year'),
+    )
+
+
+class WeatherStatsSketch(db.Model):
+    """
+    Value distributions of a station-year, kept next to its `WeatherStats` row.
+
+    Each sketch is a serialized `app.sketches.ValueHistogram` of the year's daily values
+    in integer tenths. Sketches of several years or stations merge by adding counts, so
+    percentiles, extremes and threshold day counts never read `weather_data`.
+
+    Attributes:
+        station_id (str): Identifier for the weather station.
+        year (int): The year of the sketched values.
+        max_temp_sketch (bytes, optional): Distribution of the maximum temperatures.
+        min_temp_sketch (bytes, optional): Distribution of the minimum temperatures.
+        precipitation_sketch (bytes, optional): Distribution of the daily precipitation.
+    """
+    __tablename__ = 'weather_stats_sketches'
+
+    station_id = db.Column(db.String, primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    max_temp_sketch = db.Column(db.LargeBinary, nullable=True)
+    min_temp_sketch = db.Column(db.LargeBinary, nullable=True)
+    precipitation_sketch = db.Column(db.LargeBinary, nullable=True)
+
+
+class WeatherNormal(db.Model):
+    """
+    Daily climatology of a station: the normal for one day of the year.
+
+    Built by `app.climatology.update_normals` from the years of the base period, so a
+    day's anomaly is a primary key lookup rather than a scan of 30 years of rows. Days
+    are numbered in a leap-year calendar (February 29 is day 60 and March 1 is always
+    day 61), and with smoothing each day also includes its neighbouring days.
+
+    Attributes:
+        station_key (int): Key of the `Station`.
+        day_of_year (int): Day of the year, 1 to 366.
+        max_temp_mean (float, optional): Mean maximum temperature in degrees Celsius.
+        max_temp_std (float, optional): Sample standard deviation of the maximum temperature.
+        max_temp_count (int): Non-missing maximum temperatures averaged.
+        min_temp_mean (float, optional): Mean minimum temperature in degrees Celsius.
+        min_temp_std (float, optional): Sample standard deviation of the minimum temperature.
+        min_temp_count (int): Non-missing minimum temperatures averaged.
+        precipitation_mean (float, optional): Mean daily precipitation in mm.
+        precipitation_count (int): Non-missing precipitation values averaged.
+    """
+    __tablename__ = 'weather_normals'
+
+    station_key = db.Column(db.Integer, db.ForeignKey('stations.id'), primary_key=True)
+    day_of_year = db.Column(db.SmallInteger, primary_key=True)
+    max_temp_mean = db.Column(db.Float, nullable=True)
+    max_temp_std = db.Column(db.Float, nullable=True)
+    max_temp_count = db.Column(db.Integer, nullable=False)
+    min_temp_mean = db.Column(db.Float, nullable=True)
+    min_temp_std = db.Column(db.Float, nullable=True)
+    min_temp_count = db.Column(db.Integer, nullable=False)
+    precipitation_mean = db.Column(db.Float, nullable=True)
+    precipitation_count = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        {'sqlite_with_rowid': False},
+    )
+
+
+class StationYear(db.Model):
+    """
+    Station catalog: what a station has stored for one year.
+
+    Maintained by `app.catalog` whenever a station's rows are written, so listing the
+    stations and their coverage (`/api/stations`) reads a few rows per station instead
+    of `weather_data`. Missing counts are the values stored as NULL, i.e. read as -9999.
+
+    Attributes:
+        station_key (int): Key of the `Station`.
+        year (int): Calendar year.
+        first_date (Date): First date with a row in the year.
+        last_date (Date): Last date with a row in the year.
+        days (int): Rows (days) stored in the year.
+        max_temp_missing (int): Rows without a maximum temperature.
+        min_temp_missing (int): Rows without a minimum temperature.
+        precipitation_missing (int): Rows without precipitation.
+    """
+    __tablename__ = 'station_years'
+
+    station_key = db.Column(db.Integer, db.ForeignKey('stations.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    first_date = db.Column(db.Date, nullable=False)
+    last_date = db.Column(db.Date, nullable=False)
+    days = db.Column(db.Integer, nullable=False)
+    max_temp_missing = db.Column(db.Integer, nullable=False)
+    min_temp_missing = db.Column(db.Integer, nullable=False)
+    precipitation_missing = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        {'sqlite_with_rowid': False},
+    )
+
+
+class WeatherEvent(db.Model):
+    """
+    An extreme weather event of a station: a run of days beyond one of the thresholds
+    of `WEATHER_EVENTS`, such as a heat wave or a dry spell.
+
+    Detected by `app.events` with the stats, so `/api/weather/events` never reads
+    `weather_data`. Events of a station and type never overlap.
+
+    Attributes:
+        station_key (int): Key of the `Station`.
+        event_type (str): Name of the event type in `WEATHER_EVENTS`.
+        start_date (Date): First day of the event.
+        end_date (Date): Last day of the event, inclusive.
+        days (int): Days with a value beyond the threshold.
+        missing_days (int): Missing days bridged inside the event (see
+                            `WEATHER_EVENTS_MAX_GAP_DAYS`), not counted in `days`.
+        peak (float): Most extreme value of the event, in degrees Celsius or mm.
+
+    Constraints:
+        - `ix_weather_events_type_start` finds the events of a type across stations by date.
+    """
+    __tablename__ = 'weather_events'
+
+    station_key = db.Column(db.Integer, db.ForeignKey('stations.id'), primary_key=True)
+    event_type = db.Column(db.String, primary_key=True)
+    start_date = db.Column(db.Date, primary_key=True)
+    end_date = db.Column(db.Date, nullable=False)
+    days = db.Column(db.Integer, nullable=False)
+    missing_days = db.Column(db.Integer, nullable=False)
+    peak = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_weather_events_type_start', 'event_type', 'start_date'),
+        {'sqlite_with_rowid': False},
+    )
+
+
+class StatsDirtyPartition(db.Model):
+    """
+    Marks a (station, year) partition whose `WeatherStats` row is out of date.
+
+    Rows are added whenever weather data is written and removed once
+    `calculate_weather_stats` has recomputed the partition.
+
+    Attributes:
+        station_id (str): Identifier for the weather station.
+        year (int): Year whose statistics need recomputing.
+        start_date (Date): First day of the year, so recomputation can seek `uix_station_date`.
+        end_date (Date): First day of the following year (exclusive bound).
+    """
+    __tablename__ = 'weather_stats_dirty'
+
+    station_id = db.Column(db.String, primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+
+class IngestManifest(db.Model):
+    """
+    Records how far each weather file has been ingested.
+
+    Attributes:
+        id (int): Primary key, auto-incremented unique identifier for each record.
+        path (str): Absolute path of the ingested file.
+        station_id (str): Identifier for the weather station the file belongs to.
+        size (int, optional): File size in bytes at the end of the last completed run.
+        mtime_ns (int, optional): File modification time (ns) at the end of the last completed run.
+        byte_offset (int): Offset just past the last committed line.
+        content_hash (str): SHA-256 hex digest of the file's first `byte_offset` bytes.
+        last_date (Date, optional): Latest date ingested from the file.
+
+    Notes:
+        `size` and `mtime_ns` are cleared while a run is in progress, so a crashed run is
+        resumed from `byte_offset` rather than treated as complete.
+    """
+    __tablename__ = 'ingest_manifest'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    path = db.Column(db.String, nullable=False, unique=True)
+    station_id = db.Column(db.String, nullable=False)
+    size = db.Column(db.BigInteger, nullable=True)
+    mtime_ns = db.Column(db.BigInteger, nullable=True)
+    byte_offset = db.Column(db.BigInteger, nullable=False, default=0)
+    content_hash = db.Column(db.String(64), nullable=False)
+    last_date = db.Column(db.Date, nullable=True)
+
+
+class Job(db.Model):
+    """
+    A background ingestion or statistics job, run by `app.jobs`.
+
+    Attributes:
+        id (str): Random hex identifier returned by the API.
+        kind (str): 'ingest' or 'stats'.
+        params (dict): Parameters the job was submitted with.
+        active_key (str, optional): Hash of the kind and the work to do while the job is
+                                    queued or running, None once it has finished. Being
+                                    unique, it lets identical jobs be coalesced.
+        owner (str): `host:pid` of the process running the job.
+        status (str): 'queued', 'running', 'succeeded' or 'failed'.
+        created_at (DateTime): Submission time (UTC).
+        started_at (DateTime, optional): Start time (UTC).
+        finished_at (DateTime, optional): End time (UTC).
+        files_total (int, optional): Files to ingest, if known up front.
+        files_done (int): Files ingested so far.
+        rows (int): Rows inserted or updated so far.
+        result (dict, optional): Final counts of a finished job.
+        error (str, optional): Error message of a failed job.
+    """
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String, nullable=False)
+    params = db.Column(db.JSON, nullable=False)
+    active_key = db.Column(db.String(64), nullable=True, unique=True)
+    owner = db.Column(db.String, nullable=False)
+    status = db.Column(db.String, nullable=False, default='queued')
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    files_total = db.Column(db.Integer, nullable=True)
+    files_done = db.Column(db.Integer, nullable=False, default=0)
+    rows = db.Column(db.BigInteger, nullable=False, default=0)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.String, nullable=True)
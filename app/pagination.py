@@ -0,0 +1,82 @@
+import base64
+import json
+from flask import current_app
+from sqlalchemy import tuple_
+
+
+def encode_cursor(values):
+    """
+    Encode the sort key of the last returned row as an opaque cursor token.
+
+    Args:
+        values (list): JSON-serializable sort key values.
+
+    Returns:
+        str: URL-safe cursor token.
+    """
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """
+    Decode a cursor token produced by `encode_cursor`.
+
+    Args:
+        token (str): Cursor token from a previous response.
+        size (int): Expected number of sort key values.
+
+    Returns:
+        list: The sort key values.
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def page_limit(requested):
+    """
+    Clamp a requested page size to the configured bounds.
+
+    Args:
+        requested (int, optional): `limit` query parameter.
+
+    Returns:
+        int: Page size between 1 and `API_MAX_PAGE_SIZE`, `API_DEFAULT_PAGE_SIZE` if not given.
+    """
+    if requested is None:
+        return current_app.config.get('API_DEFAULT_PAGE_SIZE', 10)
+    return max(1, min(requested, current_app.config.get('API_MAX_PAGE_SIZE', 1000)))
+
+
+def keyset_page(query, columns, after, limit):
+    """
+    Fetch one page ordered by `columns`, starting after the given sort key.
+
+    Instead of OFFSET, the page starts with a `(columns) > (after)` condition that
+    seeks the index, so every page costs the same no matter how deep it is. One extra
+    row is fetched to tell whether another page exists.
+
+    Args:
+        query (Query): Filtered query to page through.
+        columns (list): Columns forming a unique, indexed sort key.
+        after (list, optional): Sort key of the last row of the previous page.
+        limit (int): Page size.
+
+    Returns:
+        tuple: The page's rows and whether more rows follow.
+    """
+    if after is not None:
+        if len(columns) == 1:
+            query = query.filter(columns[0] > after[0])
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*after))
+
+    rows = query.order_by(*columns).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
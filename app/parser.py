@@ -0,0 +1,247 @@
+import warnings
+from collections import namedtuple
+from datetime import date
+import numpy as np
+
+# Sentinel used by the source files for a missing measurement
+MISSING_VALUE = -9999
+
+# Bits of the per-row `missing` mask
+MISSING_MAX_TEMP = 1
+MISSING_MIN_TEMP = 2
+MISSING_PRECIPITATION = 4
+
+ParsedWeatherFile = namedtuple('ParsedWeatherFile', [
+    'dates',          # int32 proleptic Gregorian ordinals (`date.toordinal()`)
+    'max_temp',       # int16 tenths of a degree Celsius, 0 where missing
+    'min_temp',       # int16 tenths of a degree Celsius, 0 where missing
+    'precipitation',  # int16 tenths of a mm, 0 where missing
+    'missing',        # uint8 bitmask of MISSING_* flags
+    'line_numbers',   # int32 1-based source line of each row
+    'rejects'         # list of (line_number, line, reason) for invalid lines
+])
+
+_TAB, _NEWLINE, _CR, _SPACE, _MINUS = 9, 10, 13, 32, 45
+_DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+
+def parse_weather_file(filepath):
+    """
+    Parse a whole station file into typed arrays in one pass.
+
+    Args:
+        filepath (str): Path to the weather data file.
+
+    Returns:
+        ParsedWeatherFile: Column arrays and the list of rejected lines.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    with open(filepath, 'rb') as file:
+        return parse_weather_bytes(file.read())
+
+
+def parse_weather_bytes(data, first_line=1):
+    """
+    Parse the raw bytes of a station file into typed arrays.
+
+    Every line is validated in vectorized form: it must have exactly four tab separated
+    integer fields and a valid YYYYMMDD date. Lines that fail go to `rejects` with their
+    line number instead of raising. Values equal to -9999 are flagged in the `missing`
+    bitmask; values that do not fit in int16 tenths are rejected.
+
+    Args:
+        data (bytes): File content, optionally a tail starting on a line boundary.
+        first_line (int, optional): Line number of the first line in `data`. Defaults to 1.
+
+    Returns:
+        ParsedWeatherFile: Column arrays and the list of rejected lines.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    starts, ends = _line_bounds(buf)
+    line_numbers = np.arange(first_line, first_line + len(starts), dtype=np.int32)
+    rejects = []
+
+    good = _well_formed_lines(buf, starts, ends)
+    for i in np.flatnonzero(~good):
+        rejects.append((int(line_numbers[i]), _line_text(data, starts[i], ends[i]), 'expected 4 tab separated integers'))
+
+    values = _tokenize(data, starts[good], ends[good], whole=bool(good.all()))
+    if values is None:
+        # Some token is not a plain integer (e.g. "2-2"): fall back to per-line parsing
+        values, ok = _tokenize_lines(data, starts[good], ends[good])
+        bad = np.flatnonzero(good)[~ok]
+        for i in bad:
+            rejects.append((int(line_numbers[i]), _line_text(data, starts[i], ends[i]), 'invalid integer'))
+        good[bad] = False
+
+    line_numbers = line_numbers[good]
+    raw_dates, raw_max, raw_min, raw_precip = values.T
+
+    # Calendar validation and conversion to day ordinals
+    year, month, day = raw_dates // 10000, raw_dates // 100 % 100, raw_dates % 100
+    valid = (year >= 1) & (year <= 9999) & (month >= 1) & (month <= 12) & (day >= 1)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_index = np.clip(month - 1, 0, 11)
+    valid &= day <= _DAYS_IN_MONTH[month_index] + ((month == 2) & leap)
+    reasons = np.where(valid, '', 'invalid date').astype(object)
+
+    # Values must fit int16 tenths unless they are the missing sentinel
+    in_range = np.ones(len(valid), dtype=bool)
+    for column in (raw_max, raw_min, raw_precip):
+        in_range &= (column == MISSING_VALUE) | ((column >= -32768) & (column <= 32767))
+    reasons[valid & ~in_range] = 'value out of range'
+    valid &= in_range
+
+    for i in np.flatnonzero(~valid):
+        line_number = int(line_numbers[i])
+        offset = line_number - first_line
+        rejects.append((line_number, _line_text(data, starts[offset], ends[offset]), reasons[i]))
+    rejects.sort()
+
+    missing = np.zeros(int(valid.sum()), dtype=np.uint8)
+    columns = []
+    for bit, column in ((MISSING_MAX_TEMP, raw_max), (MISSING_MIN_TEMP, raw_min), (MISSING_PRECIPITATION, raw_precip)):
+        column = column[valid]
+        is_missing = column == MISSING_VALUE
+        missing[is_missing] |= bit
+        columns.append(np.where(is_missing, 0, column).astype(np.int16))
+
+    return ParsedWeatherFile(
+        dates=_to_ordinals(year[valid], month[valid], day[valid]),
+        max_temp=columns[0],
+        min_temp=columns[1],
+        precipitation=columns[2],
+        missing=missing,
+        line_numbers=line_numbers[valid],
+        rejects=rejects
+    )
+
+
+def iter_row_batches(parsed, batch_size, tenths=False):
+    """
+    Convert parsed arrays into row batches shaped like `parse_weather_line` output.
+
+    Args:
+        parsed (ParsedWeatherFile): Output of `parse_weather_file`.
+        batch_size (int): Maximum rows per batch.
+        tenths (bool, optional): Keep values as integer tenths, as stored in `weather_data`,
+                                 instead of converting them to floats. Defaults to False.
+
+    Yields:
+        list: Tuples of (date, max_temp, min_temp, precipitation) with None for missing values.
+    """
+    for start in range(0, len(parsed.dates), batch_size):
+        stop = start + batch_size
+        dates = [date.fromordinal(ordinal) for ordinal in parsed.dates[start:stop].tolist()]
+        missing = parsed.missing[start:stop]
+        columns = []
+        for bit, column in ((MISSING_MAX_TEMP, parsed.max_temp), (MISSING_MIN_TEMP, parsed.min_temp),
+                            (MISSING_PRECIPITATION, parsed.precipitation)):
+            values = column[start:stop].tolist() if tenths else (column[start:stop] / 10).tolist()
+            for i in np.flatnonzero(missing & bit).tolist():
+                values[i] = None
+            columns.append(values)
+        yield list(zip(dates, *columns))
+
+
+def _line_bounds(buf):
+    """Return start and end offsets of each line, ignoring a trailing newline."""
+    newlines = np.flatnonzero(buf == _NEWLINE)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(buf)]))
+    if len(starts) and starts[-1] == len(buf):
+        starts, ends = starts[:-1], ends[:-1]
+    return starts, ends
+
+
+def _well_formed_lines(buf, starts, ends):
+    """
+    Flag lines made of exactly four tab separated tokens of digits and minus signs.
+
+    A token may be padded with spaces but must not contain inner whitespace, so each of
+    the four fields holds exactly one token.
+    """
+    if not len(starts):
+        return np.zeros(0, dtype=bool)
+
+    is_tab = buf == _TAB
+    is_space = (buf == _SPACE) | (buf == _CR)
+    is_token_char = ((buf >= 48) & (buf <= 57)) | (buf == _MINUS)
+
+    # A token starts at a token character not preceded by another token character
+    token_start = is_token_char.copy()
+    token_start[1:] &= ~is_token_char[:-1]
+
+    # The nearest non-space character before a token start must be a tab or newline
+    positions = np.arange(len(buf), dtype=np.int32)
+    last_non_space = np.maximum.accumulate(np.where(is_space, -1, positions))
+    previous = last_non_space[np.maximum(positions[token_start] - 1, 0)]
+    split_token = np.zeros(len(buf), dtype=bool)
+    split_token[positions[token_start]] = (previous >= 0) & is_token_char[previous] & (positions[token_start] > 0)
+
+    # Any character other than digit, minus, space, tab or newline invalidates the line
+    invalid = split_token | ~(is_token_char | is_tab | is_space | (buf == _NEWLINE))
+
+    def per_line(mask):
+        # Each segment runs from a line start up to the next line start (newline included)
+        counts = np.add.reduceat(mask, starts, dtype=np.int32)
+        counts[starts == ends] = 0
+        return counts
+
+    return (per_line(is_tab) == 3) & (per_line(token_start) == 4) & (per_line(invalid) == 0)
+
+
+def _tokenize(data, starts, ends, whole):
+    """
+    Parse the integer tokens of the given lines into an (n, 4) array, or None on failure.
+
+    When `whole` is set every line of `data` is well formed and the buffer is parsed
+    without copying.
+    """
+    if not len(starts):
+        return np.zeros((0, 4), dtype=np.int64)
+
+    text = data if whole else b'\n'.join(data[start:end] for start, end in zip(starts.tolist(), ends.tolist()))
+
+    with warnings.catch_warnings():
+        # Older NumPy warns instead of raising on unparsable data
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            values = np.fromstring(text, dtype=np.int64, sep=' ')
+        except (ValueError, DeprecationWarning):
+            return None
+
+    if len(values) != 4 * len(starts):
+        return None
+    return values.reshape(-1, 4)
+
+
+def _tokenize_lines(data, starts, ends):
+    """Parse lines one at a time, returning an (n, 4) array of the parsable ones and a mask."""
+    rows = []
+    ok = np.zeros(len(starts), dtype=bool)
+    for i, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        try:
+            rows.append([int(field) for field in data[start:end].split(b'\t')])
+            ok[i] = True
+        except ValueError:
+            continue
+    return np.array(rows, dtype=np.int64).reshape(-1, 4), ok
+
+
+def _line_text(data, start, end):
+    """Decode one line for the reject list."""
+    return data[start:end].decode('utf-8', errors='replace').strip()
+
+
+def _to_ordinals(year, month, day):
+    """Convert validated year/month/day arrays to `date.toordinal()` values."""
+    shifted_year = year - (month <= 2)
+    era = shifted_year // 400
+    year_of_era = shifted_year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    # Days since 0000-03-01 shifted so that 0001-01-01 is ordinal 1
+    return (era * 146097 + day_of_era - 305).astype(np.int32)
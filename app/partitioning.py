@@ -0,0 +1,644 @@
+import os
+import re
+import logging
+import weakref
+from collections import namedtuple
+from datetime import date, timedelta
+from flask import current_app
+from sqlalchemy import (MetaData, Table, Column, Index, create_engine, delete, event, func, insert, select,
+                        text, union_all)
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import aliased
+from sqlalchemy.schema import CreateTable
+from app import db
+from app.models import Station, WeatherData
+from app.stations import station_key
+
+# A range of `weather_data` stored separately: rows with start <= date < end
+StoragePartition = namedtuple('StoragePartition', ['name', 'start', 'end'])
+
+SCHEMES = ('year', 'decade')
+
+_NAME = re.compile(r'^([yd])(\d{4})$')
+_FILE = re.compile(r'^weather_([yd]\d{4})\.db$')
+
+# Tables of the attached SQLite partition files, one schema per partition
+_metadata = MetaData()
+
+# PostgreSQL partitions known to exist, per database URL
+_created = {}
+
+# Dialects of the PostgreSQL engines creating `weather_data` partitioned; each engine
+# has its own, so the table definition shared by every app is left unchanged
+_partitioned_dialects = weakref.WeakSet()
+
+
+def partition_scheme(app=None):
+    """
+    Return the configured partitioning scheme.
+
+    Args:
+        app (Flask, optional): Application to read the config from. Defaults to the current app.
+
+    Returns:
+        str: 'year', 'decade', or None if `weather_data` is not partitioned.
+
+    Raises:
+        ValueError: If `WEATHER_PARTITIONING` is not a known scheme.
+    """
+    scheme = (app or current_app).config.get('WEATHER_PARTITIONING')
+    if scheme is not None and scheme not in SCHEMES:
+        raise ValueError(f"WEATHER_PARTITIONING must be one of {SCHEMES} or None, not {scheme!r}")
+    return scheme
+
+
+def partitioning_enabled():
+    """True if `weather_data` is partitioned by date."""
+    return partition_scheme() is not None
+
+
+def _attached_files():
+    """True if partitions are SQLite files attached to every connection."""
+    return partitioning_enabled() and db.engine.dialect.name == 'sqlite'
+
+
+def partition_dir(app=None):
+    """
+    Return the directory of the SQLite partition files.
+
+    Returns:
+        str: `WEATHER_PARTITION_DIR`, resolved against the instance path if relative.
+    """
+    app = app or current_app
+    return os.path.join(app.instance_path, app.config.get('WEATHER_PARTITION_DIR', 'partitions'))
+
+
+def partition_for(day):
+    """
+    Return the partition holding a date under the configured scheme.
+
+    Args:
+        day (date): Date of a weather row.
+
+    Returns:
+        StoragePartition: The partition, named `y<year>` or `d<first year of the decade>`.
+    """
+    if partition_scheme() == 'year':
+        return StoragePartition(f'y{day.year}', date(day.year, 1, 1), date(day.year + 1, 1, 1))
+    first = day.year - day.year % 10
+    return StoragePartition(f'd{first}', date(first, 1, 1), date(first + 10, 1, 1))
+
+
+def partition_named(name):
+    """
+    Return the partition with the given name.
+
+    Args:
+        name (str): Partition name, e.g. `d1990` or `y1994`.
+
+    Returns:
+        StoragePartition: The partition.
+
+    Raises:
+        ValueError: If the name is not a partition name.
+    """
+    match = _NAME.match(name)
+    if match is None:
+        raise ValueError(f"Invalid partition name: {name}")
+    first = int(match.group(2))
+    span = 1 if match.group(1) == 'y' else 10
+    return StoragePartition(name, date(first, 1, 1), date(first + span, 1, 1))
+
+
+def partitions_between(start, end):
+    """
+    Return the partitions covering a date range.
+
+    Args:
+        start (date): First day of the range.
+        end (date): Last day of the range, inclusive.
+
+    Returns:
+        list: `StoragePartition`s in date order.
+    """
+    partitions = []
+    day = start
+    while day <= end:
+        partition = partition_for(day)
+        partitions.append(partition)
+        day = partition.end
+    return partitions
+
+
+def existing_partitions():
+    """
+    Return the partitions that have been created.
+
+    Returns:
+        list: `StoragePartition`s of the configured scheme in date order; empty if
+              partitioning is disabled.
+    """
+    if not partitioning_enabled():
+        return []
+
+    if db.engine.dialect.name == 'sqlite':
+        directory = partition_dir()
+        names = [match.group(1) for match in map(_FILE.match, os.listdir(directory)) if match] \
+            if os.path.isdir(directory) else []
+    else:
+        names = [name.removeprefix('weather_data_') for name in db.session.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'weather_data'"
+        )).scalars()]
+
+    prefix = 'y' if partition_scheme() == 'year' else 'd'
+    return sorted((partition_named(name) for name in names if _NAME.match(name) and name[0] == prefix),
+                  key=lambda partition: partition.start)
+
+
+def _weather_columns():
+    # Same columns as `weather_data`, without the foreign key: the stations table
+    # lives in the main database, which SQLite foreign keys cannot reference
+    return [Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+            for column in WeatherData.__table__.columns]
+
+
+def _weather_table(metadata, schema=None):
+    """Define a SQLite partition's `weather_data` table, with the indexes of the main one."""
+    indexes = (Index(index.name, *(column.name for column in index.columns))
+               for index in WeatherData.__table__.indexes)
+    return Table('weather_data', metadata, *_weather_columns(), *indexes,
+                 schema=schema, sqlite_with_rowid=False)
+
+
+def partition_table(partition):
+    """
+    Return the table of a SQLite partition, in the schema its file is attached as.
+
+    Args:
+        partition (StoragePartition): The partition.
+
+    Returns:
+        Table: `wx_<name>.weather_data`.
+    """
+    schema = f'wx_{partition.name}'
+    table = _metadata.tables.get(f'{schema}.weather_data')
+    if table is None:
+        table = _weather_table(_metadata, schema)
+    return table
+
+
+def _partition_path(directory, partition):
+    return os.path.join(directory, f'weather_{partition.name}.db')
+
+
+def _create_partition_file(path):
+    """Create an empty partition file, unless another writer created it first."""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    engine = create_engine(f'sqlite:///{tmp_path}')
+    try:
+        _weather_table(MetaData()).create(engine)
+        engine.dispose()
+        try:
+            # Unlike a rename, a link never replaces a partition that already has rows
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+    finally:
+        engine.dispose()
+        os.unlink(tmp_path)
+
+
+def _sync_attached(dbapi_connection, directory, attached):
+    """
+    Attach new partition files to a SQLite connection and re-attach swapped ones.
+
+    Args:
+        dbapi_connection: The sqlite3 connection.
+        directory (str): Partition directory.
+        attached (dict): Inode of each attached schema, kept with the pooled connection.
+    """
+    files = {}
+    if os.path.isdir(directory):
+        for entry in os.scandir(directory):
+            match = _FILE.match(entry.name)
+            if match:
+                files[f'wx_{match.group(1)}'] = (entry.path, entry.inode())
+
+    for schema, inode in list(attached.items()):
+        if schema not in files or files[schema][1] != inode:
+            # Removed, or replaced by a rebuild: the old file is still open under this name
+            dbapi_connection.execute(f'DETACH DATABASE {schema}')
+            del attached[schema]
+    for schema, (path, inode) in sorted(files.items()):
+        if schema not in attached:
+            dbapi_connection.execute(f'ATTACH DATABASE ? AS {schema}', (path,))
+            attached[schema] = inode
+
+
+def ensure_partitions(partitions):
+    """
+    Create missing partitions so rows of their date ranges can be written.
+
+    On SQLite each partition is a database file attached to every pooled connection;
+    on PostgreSQL it is a `PARTITION OF weather_data` table.
+
+    Args:
+        partitions (iterable): `StoragePartition`s about to be written.
+    """
+    partitions = set(partitions)
+    if not partitions or not partitioning_enabled():
+        return
+
+    if db.engine.dialect.name == 'sqlite':
+        directory = partition_dir()
+        os.makedirs(directory, exist_ok=True)
+        for partition in partitions:
+            path = _partition_path(directory, partition)
+            if not os.path.exists(path):
+                _create_partition_file(path)
+
+        # Other pooled connections attach the new files when they are next checked out
+        pooled = db.session.connection().connection
+        attached = pooled.info.setdefault('partitions', {})
+        if any(f'wx_{partition.name}' not in attached for partition in partitions):
+            _sync_attached(pooled.dbapi_connection, directory, attached)
+        return
+
+    created = _created.setdefault(str(db.engine.url), set())
+    missing = partitions - created
+    if missing:
+        created.update(existing_partitions())
+    for partition in sorted(missing - created, key=lambda partition: partition.start):
+        db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS weather_data_{partition.name} PARTITION OF weather_data "
+            f"FOR VALUES FROM ('{partition.start.isoformat()}') TO ('{partition.end.isoformat()}')"
+        ))
+        created.add(partition)
+
+
+def route_rows(rows):
+    """
+    Group rows to write by the table that stores them, creating partitions as needed.
+
+    Args:
+        rows (list): Tuples starting with the row's date.
+
+    Returns:
+        list: (table, rows) pairs. Without SQLite partition files everything goes to
+              `weather_data`, which PostgreSQL routes to its partitions itself.
+    """
+    if not partitioning_enabled():
+        return [(WeatherData.__table__, rows)]
+
+    by_year = {}
+    for row in rows:
+        by_year.setdefault(row[0].year, []).append(row)
+    groups = {}
+    for year, year_rows in by_year.items():
+        groups.setdefault(partition_for(date(year, 1, 1)), []).extend(year_rows)
+    ensure_partitions(groups)
+
+    if not _attached_files():
+        return [(WeatherData.__table__, rows)]
+    return [(partition_table(partition), groups[partition])
+            for partition in sorted(groups, key=lambda partition: partition.start)]
+
+
+def weather_source(start=None, end=None):
+    """
+    Return what to query `WeatherData` rows of a date range from.
+
+    With SQLite partition files, the result is `WeatherData` aliased to the partitions
+    overlapping the range: a single partition's table, or a `UNION ALL` of several.
+    Partitions outside the range are never read. Otherwise it is `WeatherData` itself;
+    PostgreSQL prunes partitions from the date predicates.
+
+    Args:
+        start (date, optional): First day of the range. Defaults to unbounded.
+        end (date, optional): Last day of the range, inclusive. Defaults to unbounded.
+
+    Returns:
+        The `WeatherData` class or an alias of it, usable in ORM and Core queries.
+    """
+    if not _attached_files():
+        return WeatherData
+
+    partitions = [
+        partition for partition in existing_partitions()
+        if (start is None or partition.end > start) and (end is None or partition.start <= end)
+    ]
+    if not partitions:
+        # Nothing stored in the range; the unpartitioned table is empty
+        return WeatherData
+    if len(partitions) == 1:
+        source = partition_table(partitions[0]).alias('weather_data')
+    else:
+        selects = (select(partition_table(partition)) for partition in partitions)
+        source = union_all(*selects).subquery('weather_data')
+    return aliased(WeatherData, source, adapt_on_names=True)
+
+
+def source_scopes(start, end):
+    """
+    Split a date range into pieces that each read from a single table.
+
+    Joins against a `UNION ALL` of SQLite partitions cannot seek into them, so set-based
+    lookups spanning partitions run once per partition instead.
+
+    Args:
+        start (date): First day of the range.
+        end (date): Last day of the range, inclusive.
+
+    Returns:
+        list: (source, first, last) tuples in date order, where `source` is what
+              `weather_source(first, last)` returns and `first`..`last` the part of the
+              range it holds.
+    """
+    if not _attached_files():
+        return [(WeatherData, start, end)]
+
+    scopes = []
+    for partition in existing_partitions():
+        first = max(start, partition.start)
+        last = min(end, partition.end - timedelta(days=1))
+        if first <= last:
+            scopes.append((weather_source(first, last), first, last))
+    return scopes
+
+
+def station_filter(source, station_id):
+    """
+    Return the condition `source.station_id == station_id` for a `weather_source` result.
+
+    SQLite does not push conditions containing a subquery into the branches of a
+    `UNION ALL`, so for partitioned sources the station key is looked up first and
+    compared as a value, keeping each partition a primary key seek.
+
+    Args:
+        source: `WeatherData` or an alias returned by `weather_source`.
+        station_id (str): Identifier for the weather station.
+
+    Returns:
+        ColumnElement: The filter condition.
+    """
+    if source is WeatherData:
+        return WeatherData.station_id == station_id
+    return source.station_key == station_key(station_id, create=False)
+
+
+def partition_scopes(years=None):
+    """
+    Return the tables to scan one partition at a time, e.g. for yearly statistics.
+
+    Args:
+        years (iterable, optional): Only the partitions holding these years. Defaults to all.
+
+    Returns:
+        list: (table, partition) pairs. `partition` is None for an unpartitioned table;
+              otherwise queries should also bound the date to the partition's range so
+              PostgreSQL prunes the others.
+    """
+    if not partitioning_enabled():
+        return [(WeatherData.__table__, None)]
+
+    partitions = existing_partitions()
+    if years is not None:
+        wanted = {partition_for(date(year, 1, 1)) for year in years}
+        partitions = [partition for partition in partitions if partition in wanted]
+    if _attached_files():
+        return [(partition_table(partition), partition) for partition in partitions]
+    return [(WeatherData.__table__, partition) for partition in partitions]
+
+
+def _mark_partition_dirty(codes, partition):
+    """Mark every year of a partition dirty for the given stations and invalidate caches."""
+    from app.analysis import mark_dirty_partitions
+    from app.cache import mark_data_changed
+
+    years = range(partition.start.year, partition.end.year)
+    mark_dirty_partitions(db.session.connection(), ((code, year) for code in codes for year in years))
+    mark_data_changed(db.session)
+
+
+def rebuild_partition(partition, file_paths, batch_size=None):
+    """
+    Reload one partition from the weather files and swap it in.
+
+    The partition is written next to the live one from the rows of `file_paths`
+    dated in its range, then swapped in as a whole: on SQLite the file is renamed over
+    the old one (pooled connections re-attach it on checkout), on PostgreSQL the new
+    table is attached in place of the detached old one. Readers see either version,
+    and no row of the old partition is updated in place.
+
+    Args:
+        partition (StoragePartition): The partition to rebuild.
+        file_paths (list): Weather files to load the rows from.
+        batch_size (int, optional): Rows per insert. Defaults to `INGEST_BATCH_SIZE`.
+
+    Returns:
+        int: Rows loaded into the new partition.
+
+    Raises:
+        RuntimeError: If partitioning is disabled.
+    """
+    from app.ingestion import parse_station_file, refresh_station_views
+    from app.parser import iter_row_batches
+
+    if not partitioning_enabled():
+        raise RuntimeError("weather_data is not partitioned, set WEATHER_PARTITIONING")
+    batch_size = batch_size or current_app.config.get('INGEST_BATCH_SIZE', 5000)
+
+    # Stations with rows in the old partition need their stats and views refreshed too
+    source = weather_source(partition.start, partition.end - date.resolution)
+    codes = set(db.session.execute(
+        select(Station.code).where(Station.id.in_(
+            select(source.station_key).where(source.date >= partition.start, source.date < partition.end)
+        ))
+    ).scalars())
+
+    def load(execute, table):
+        loaded = 0
+        for filepath in file_paths:
+            station_id, parsed = parse_station_file(filepath)
+            keep = (parsed.dates >= partition.start.toordinal()) & (parsed.dates < partition.end.toordinal())
+            fields = ('dates', 'max_temp', 'min_temp', 'precipitation', 'missing', 'line_numbers')
+            parsed = parsed._replace(**{field: getattr(parsed, field)[keep] for field in fields})
+            if not len(parsed.dates):
+                continue
+            key = station_key(station_id)
+            codes.add(station_id)
+            for batch in iter_row_batches(parsed, batch_size, tenths=True):
+                # A date repeated in a file keeps its last row, as an upsert would
+                rows = {day: (max_temp, min_temp, precipitation)
+                        for day, max_temp, min_temp, precipitation in batch}
+                execute(insert(table), [{
+                    'station_key': key,
+                    'date': day,
+                    'max_temp_tenths': values[0],
+                    'min_temp_tenths': values[1],
+                    'precipitation_tenths': values[2]
+                } for day, values in rows.items()])
+                loaded += len(rows)
+        return loaded
+
+    if db.engine.dialect.name == 'sqlite':
+        directory = partition_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = _partition_path(directory, partition)
+        tmp_path = f'{path}.{os.getpid()}.rebuild'
+        engine = create_engine(f'sqlite:///{tmp_path}')
+        try:
+            table = _weather_table(MetaData())
+            table.create(engine)
+            with engine.begin() as connection:
+                loaded = load(connection.execute, table)
+            engine.dispose()
+            # New stations must be committed before any reader can see their rows
+            db.session.commit()
+            os.replace(tmp_path, path)
+        finally:
+            engine.dispose()
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        # Release this session's connection so its next checkout attaches the new file
+        db.session.close()
+    else:
+        name = f'weather_data_{partition.name}'
+        db.session.execute(text(f'DROP TABLE IF EXISTS {name}_new'))
+        db.session.execute(text(f'CREATE TABLE {name}_new (LIKE weather_data INCLUDING DEFAULTS)'))
+        loaded = load(db.session.execute, Table(f'{name}_new', MetaData(), *_weather_columns()))
+        db.session.execute(text(f'ALTER TABLE {name}_new ADD PRIMARY KEY (station_key, date)'))
+        if partition in existing_partitions():
+            db.session.execute(text(f'ALTER TABLE weather_data DETACH PARTITION {name}'))
+            db.session.execute(text(f'DROP TABLE {name}'))
+        db.session.execute(text(
+            f"ALTER TABLE weather_data ATTACH PARTITION {name}_new "
+            f"FOR VALUES FROM ('{partition.start.isoformat()}') TO ('{partition.end.isoformat()}')"
+        ))
+        db.session.execute(text(f'ALTER TABLE {name}_new RENAME TO {name}'))
+        _created.setdefault(str(db.engine.url), set()).add(partition)
+
+    _mark_partition_dirty(codes, partition)
+    db.session.commit()
+    for code in sorted(codes):
+        refresh_station_views(code)
+
+    logging.info(f"Rebuilt partition {partition.name} with {loaded} rows")
+    return loaded
+
+
+def has_unpartitioned_rows(connection):
+    """
+    Tell whether rows are stored outside the partitions, e.g. from before partitioning was enabled.
+
+    Args:
+        connection (Connection): Database connection.
+
+    Returns:
+        bool: True if `partition_existing_rows` has rows to move.
+    """
+    if connection.dialect.name == 'postgresql':
+        return connection.execute(text(
+            "SELECT relkind = 'r' FROM pg_class WHERE relname = 'weather_data'"
+        )).scalar() or False
+    return connection.execute(select(WeatherData.__table__.c.date).limit(1)).first() is not None
+
+
+def partition_existing_rows():
+    """
+    Move the rows of an unpartitioned `weather_data` table into partitions.
+
+    On SQLite the rows are copied into the partition files and deleted from the main
+    database; on PostgreSQL the plain table is renamed, a partitioned `weather_data`
+    is created in its place and the rows are copied over.
+
+    Returns:
+        int: Rows moved.
+    """
+    main = WeatherData.__table__
+    columns = [column.name for column in main.columns]
+    postgresql = db.engine.dialect.name == 'postgresql'
+    if not has_unpartitioned_rows(db.session.connection()):
+        return 0
+
+    if postgresql:
+        db.session.execute(text('ALTER TABLE weather_data RENAME TO weather_data_unpartitioned'))
+        db.session.execute(text(
+            'ALTER INDEX IF EXISTS weather_data_pkey RENAME TO weather_data_unpartitioned_pkey'))
+        main.create(db.session.connection())
+        _created.pop(str(db.engine.url), None)
+        main = Table('weather_data_unpartitioned', MetaData(), *_weather_columns())
+
+    first, last = db.session.execute(select(func.min(main.c.date), func.max(main.c.date))).one()
+    moved = 0
+    if first is not None:
+        partitions = partitions_between(first, last)
+        ensure_partitions(partitions)
+        for partition in partitions:
+            target = WeatherData.__table__ if postgresql else partition_table(partition)
+            moved += db.session.execute(insert(target).from_select(
+                columns, select(main).where(main.c.date >= partition.start, main.c.date < partition.end)
+            )).rowcount
+
+    if postgresql:
+        db.session.execute(text('DROP TABLE weather_data_unpartitioned'))
+    else:
+        db.session.execute(delete(main))
+    db.session.commit()
+
+    logging.info(f"Moved {moved} weather rows into partitions")
+    return moved
+
+
+@compiles(CreateTable, 'postgresql')
+def _create_weather_table(create, compiler, **kw):
+    """Declare `weather_data` as `PARTITION BY RANGE (date)` on the engines partitioning it."""
+    ddl = compiler.visit_create_table(create, **kw)
+    if create.element is WeatherData.__table__ and compiler.dialect in _partitioned_dialects:
+        ddl = ddl.rstrip() + ' PARTITION BY RANGE (date)\n\n'
+    return ddl
+
+
+def init_partitioning(app):
+    """
+    Set up date partitioning of `weather_data` if `WEATHER_PARTITIONING` is set.
+
+    Must run before the tables are created. On PostgreSQL `weather_data` becomes a
+    `PARTITION BY RANGE (date)` table. On SQLite each partition is a separate database
+    file under `partition_dir()`, attached to every pooled connection of the app's
+    engine and SQLite read replica on checkout; as SQLite attaches at most 10 databases
+    per connection, only 'decade' is supported.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Raises:
+        ValueError: If the scheme is unknown or unsupported by the database.
+    """
+    scheme = partition_scheme(app)
+    if scheme is None:
+        return
+
+    with app.app_context():
+        engine = db.engine
+
+    if engine.dialect.name == 'postgresql':
+        _partitioned_dialects.add(engine.dialect)
+    elif engine.dialect.name == 'sqlite':
+        if scheme != 'decade':
+            raise ValueError("SQLite attaches one file per partition, at most 10 per connection; "
+                             "use WEATHER_PARTITIONING = 'decade'")
+        directory = partition_dir(app)
+
+        def _attach_partitions(dbapi_connection, connection_record, connection_proxy):
+            _sync_attached(dbapi_connection, directory, connection_record.info.setdefault('partitions', {}))
+
+        # The read replica serves the same queries, so it needs the partitions attached too
+        for target in (engine, app.extensions.get('read_replica')):
+            if target is not None and target.dialect.name == 'sqlite':
+                event.listen(target, 'checkout', _attach_partitions)
+    else:
+        raise ValueError(f"Partitioning is not supported on {engine.dialect.name}")
@@ -0,0 +1,135 @@
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.ingestion import parse_station_file, write_station_batches, refresh_station_views, earliest_date, _upsert_statement
+from app.manifest import ParsedTail, load_manifest_states, parse_station_tail, write_station_tail
+from app.parser import iter_row_batches
+from app.metrics import timed_call, record_file_ingest
+
+
+def ingest_parallel(file_paths, workers=None, queue_size=None, batch_size=None, incremental=False, progress=None):
+    """
+    Ingest many weather files with a pool of parser processes and a single writer.
+
+    Worker processes parse whole files into compact typed arrays. The calling process is the
+    only database writer: it drains parsed files as they complete and upserts them.
+    At most `queue_size` files are parsed or waiting to be written at any time, so a
+    slow database applies backpressure to the parsers instead of growing memory.
+
+    Args:
+        file_paths (list): Paths of the weather files to ingest.
+        workers (int, optional): Number of parser processes. Defaults to `INGEST_WORKERS`.
+        queue_size (int, optional): Maximum parsed files held in flight.
+                                    Defaults to `INGEST_QUEUE_SIZE`.
+        batch_size (int, optional): Rows per upsert/commit. Defaults to `INGEST_BATCH_SIZE`.
+        incremental (bool, optional): Parse only what the ingestion manifest has not seen
+                                      and checkpoint it per batch. Defaults to False.
+        progress (callable, optional): Called as `progress(filepath, inserted, updated, skipped)`
+                                       after each file is written or has failed.
+
+    Returns:
+        dict: Aggregated `files`, `inserted`, `updated` and `skipped` counts, plus an
+              `errors` mapping of file path to error message for files that failed.
+
+    Raises:
+        RuntimeError: If the database dialect has no native upsert.
+    """
+    workers = workers or current_app.config.get('INGEST_WORKERS', 1)
+    queue_size = queue_size or current_app.config.get('INGEST_QUEUE_SIZE', 2 * workers)
+    batch_size = batch_size or current_app.config.get('INGEST_BATCH_SIZE', 5000)
+    stmt = _upsert_statement()
+    if stmt is None:
+        raise RuntimeError(f"Parallel ingestion needs native upsert support, not available on {db.engine.dialect.name}")
+
+    summary = {'files': 0, 'inserted': 0, 'updated': 0, 'skipped': 0, 'errors': {}}
+    states = load_manifest_states() if incremental else None
+
+    logging.info(f"Starting parallel ingestion of {len(file_paths)} files with {workers} workers at {datetime.now()}")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        remaining = iter(file_paths)
+        in_flight = {}
+
+        def fill():
+            # Keep at most `queue_size` files parsed-but-unwritten at once
+            while len(in_flight) < queue_size:
+                filepath = next(remaining, None)
+                if filepath is None:
+                    return
+                if incremental:
+                    state = states.get(os.path.abspath(filepath))
+                    future = pool.submit(timed_call, parse_station_tail, filepath, state, batch_size)
+                else:
+                    future = pool.submit(timed_call, parse_station_file, filepath)
+                in_flight[future] = filepath
+
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                filepath = in_flight.pop(future)
+                counts = _write_parsed_file(filepath, future, stmt, batch_size, summary)
+                if progress:
+                    progress(filepath, *counts)
+            fill()
+
+    logging.info(f"Parallel ingestion completed at {datetime.now()}")
+    logging.info(f"Total records inserted: {summary['inserted']}")
+    logging.info(f"Total records updated: {summary['updated']}")
+    logging.info(f"Total records skipped: {summary['skipped']}")
+    if summary['errors']:
+        logging.error(f"Files failed: {len(summary['errors'])}")
+
+    return summary
+
+
+def _write_parsed_file(filepath, future, stmt, batch_size, summary):
+    """
+    Write one parsed file and fold its counts into the run summary.
+
+    Parse and write failures are recorded per file so one bad file does not abort the run.
+
+    Args:
+        filepath (str): Path of the parsed file.
+        future (Future): Completed `timed_call` future of `parse_station_file` or `parse_station_tail`.
+        stmt (Insert): Prebuilt upsert statement.
+        batch_size (int): Rows per upsert/commit.
+        summary (dict): Run summary to update in place.
+
+    Returns:
+        tuple: Counts of inserted, updated, and skipped records of the file.
+    """
+    try:
+        result, parse_seconds = future.result()
+    except Exception as e:
+        logging.error(f"Failed to parse file {filepath}: {e}")
+        summary['errors'][filepath] = str(e)
+        summary['skipped'] += 1
+        return 0, 0, 1
+
+    start = time.perf_counter()
+    try:
+        if isinstance(result, ParsedTail):
+            inserted, updated, skipped = write_station_tail(filepath, result, stmt)
+            if result.parsed is not None:
+                refresh_station_views(result.station_id, earliest_date(result.parsed))
+        else:
+            station_id, parsed = result
+            inserted, updated = write_station_batches(station_id, iter_row_batches(parsed, batch_size, tenths=True), stmt)
+            skipped = len(parsed.rejects)
+            refresh_station_views(station_id, earliest_date(parsed))
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Failed to write file {filepath}: {e}")
+        summary['errors'][filepath] = str(e)
+        return 0, 0, 0
+
+    record_file_ingest(filepath, inserted + updated, parse_seconds, time.perf_counter() - start)
+    summary['files'] += 1
+    summary['inserted'] += inserted
+    summary['updated'] += updated
+    summary['skipped'] += skipped
+    return inserted, updated, skipped
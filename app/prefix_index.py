@@ -0,0 +1,308 @@
+import os
+import time
+import struct
+import logging
+import tempfile
+from datetime import date
+import numpy as np
+from flask import current_app
+from app.colstore import read_station_columns
+from app.parser import MISSING_MAX_TEMP, MISSING_MIN_TEMP, MISSING_PRECIPITATION
+from app.stations import station_file
+
+# File layout: 24-byte header (magic, version, first day ordinal, day count n) followed by
+# (n + 1) rows of int64 running totals; row i covers the days before `first + i`, so
+# row 0 is all zeros and any window is the difference of two rows.
+_MAGIC = b'WXP1'
+_HEADER = struct.Struct('<4sIqQ')
+
+# Running totals kept per day, in integer tenths for the sums
+COLUMNS = (
+    'rows',
+    'max_temp_sum', 'max_temp_count',
+    'min_temp_sum', 'min_temp_count',
+    'precipitation_sum', 'precipitation_count'
+)
+_MEASUREMENTS = (('max_temp', MISSING_MAX_TEMP), ('min_temp', MISSING_MIN_TEMP),
+                 ('precipitation', MISSING_PRECIPITATION))
+
+# Open indexes per directory, shared by every request in this process
+_indexes = {}
+
+
+def index_dir():
+    """
+    Return the directory of the prefix-sum index for the current app.
+
+    Returns:
+        str: `PREFIX_INDEX_DIR`, resolved against the instance path if relative.
+    """
+    path = current_app.config.get('PREFIX_INDEX_DIR', 'prefix')
+    return os.path.join(current_app.instance_path, path)
+
+
+def prefix_index_enabled():
+    """True if ingestion maintains the prefix-sum index."""
+    return current_app.config.get('PREFIX_INDEX_ENABLED', True)
+
+
+def get_index():
+    """
+    Return the process-wide `PrefixIndex` for the current app.
+
+    Returns:
+        PrefixIndex: The index reading `index_dir()`.
+    """
+    path = index_dir()
+    if path not in _indexes:
+        _indexes[path] = PrefixIndex(path, current_app.config.get('PREFIX_INDEX_RECHECK_SECONDS', 1.0))
+    return _indexes[path]
+
+
+def _daily_totals(columns, first, days):
+    """Spread station columns over a dense per-day array of the `COLUMNS` values."""
+    daily = np.zeros((days, len(COLUMNS)), dtype=np.int64)
+    offsets = columns.dates.astype(np.int64) - first
+    daily[offsets, 0] = 1
+    for k, (name, bit) in enumerate(_MEASUREMENTS):
+        present = (columns.missing & bit) == 0
+        daily[offsets, 1 + 2 * k] = np.where(present, getattr(columns, name), 0)
+        daily[offsets, 2 + 2 * k] = present
+    return daily
+
+
+def build_station(station_id):
+    """
+    Rebuild a station's prefix-sum file from the `weather_data` table.
+
+    The file is written next to its destination and renamed into place. Stations whose
+    identifier cannot name a file are skipped; their windows are summed in SQL.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+    """
+    directory = index_dir()
+    path = station_file(directory, station_id, '.wxp')
+    if path is None:
+        return
+    columns = read_station_columns(station_id)
+    if not len(columns.dates):
+        if os.path.exists(path):
+            os.unlink(path)
+        get_index().invalidate(station_id)
+        return
+
+    first = int(columns.dates[0])
+    days = int(columns.dates[-1]) - first + 1
+    totals = np.zeros((days + 1, len(COLUMNS)), dtype=np.int64)
+    np.cumsum(_daily_totals(columns, first, days), axis=0, out=totals[1:])
+
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{station_id}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, 1, first, days))
+            file.write(totals.astype('<i8').tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    get_index().invalidate(station_id)
+
+
+def update_station(station_id, since=None):
+    """
+    Bring a station's prefix sums up to date after a write.
+
+    When every written row is dated after the last indexed day (appended data), only
+    the new days are read and their running totals appended to the file in place;
+    the header's day count is rewritten last, so a crash leaves the old index intact.
+    Anything else rebuilds the file.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+        since (date, optional): Earliest date written, None if unknown.
+    """
+    path = station_file(index_dir(), station_id, '.wxp')
+    header = path and _read_header(path)
+    if since is None or header is None or since.toordinal() < header[0] + header[1]:
+        build_station(station_id)
+        return
+
+    first, days = header
+    last_day = date.fromordinal(first + days - 1)
+    columns = read_station_columns(station_id, after=last_day)
+    if not len(columns.dates):
+        return
+
+    added = int(columns.dates[-1]) - (first + days) + 1
+    with open(path, 'r+b') as file:
+        file.seek(_HEADER.size + days * len(COLUMNS) * 8)
+        previous = np.frombuffer(file.read(len(COLUMNS) * 8), dtype='<i8')
+        totals = previous + np.cumsum(_daily_totals(columns, first + days, added), axis=0)
+        # Drops bytes of an append that crashed before its header update
+        file.truncate()
+        file.write(totals.astype('<i8').tobytes())
+        file.flush()
+        file.seek(0)
+        file.write(_HEADER.pack(_MAGIC, 1, first, days + added))
+    get_index().invalidate(station_id)
+
+
+def discard_station(station_id):
+    """
+    Remove a station's prefix-sum file, so its windows are summed in SQL until it is
+    rebuilt.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+    """
+    path = station_file(index_dir(), station_id, '.wxp')
+    if path is None:
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    get_index().invalidate(station_id)
+
+
+def _read_header(path):
+    """
+    Return (first day ordinal, day count) of an index file, or None if it does not exist
+    or is not a complete index file.
+    """
+    try:
+        with open(path, 'rb') as file:
+            magic, _, first, days = _HEADER.unpack(file.read(_HEADER.size))
+            size = os.fstat(file.fileno()).st_size
+    except (FileNotFoundError, struct.error):
+        return None
+    if magic != _MAGIC or size < _HEADER.size + (days + 1) * len(COLUMNS) * 8:
+        return None
+    return first, days
+
+
+def _map_totals(path):
+    """
+    Map an index file as its first day ordinal and running totals.
+
+    Raises:
+        ValueError: If the file is not a complete prefix-sum index file.
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    magic, _, first, days = _HEADER.unpack_from(buffer[:_HEADER.size].tobytes())
+    if magic != _MAGIC or len(buffer) < _HEADER.size + (days + 1) * len(COLUMNS) * 8:
+        raise ValueError("not a prefix-sum index file")
+    totals = np.frombuffer(buffer, dtype='<i8', count=(days + 1) * len(COLUMNS), offset=_HEADER.size)
+    return first, totals.reshape(days + 1, len(COLUMNS))
+
+
+class PrefixIndex:
+    """
+    Read-only view over a directory of memory-mapped per-station prefix-sum files.
+
+    Like `ColumnarStore`, files are remapped when they change, checked at most every
+    `recheck_seconds`.
+    """
+
+    def __init__(self, directory, recheck_seconds=1.0):
+        self.directory = directory
+        self.recheck_seconds = recheck_seconds
+        self._mapped = {}
+
+    def invalidate(self, station_id):
+        """
+        Forget the mapping of a station so its file is checked again on the next access.
+
+        Args:
+            station_id (str): Identifier for the weather station.
+        """
+        self._mapped.pop(station_id, None)
+
+    def station(self, station_id):
+        """
+        Return the first day and running totals of a station, mapping its file as needed.
+
+        Args:
+            station_id (str): Identifier for the weather station.
+
+        Returns:
+            tuple: (first day ordinal, (n + 1, len(COLUMNS)) int64 array), or None if the
+                   station has no valid index file (windows are then summed in SQL).
+        """
+        now = time.monotonic()
+        cached = self._mapped.get(station_id)
+        if cached is not None and now - cached[1] < self.recheck_seconds:
+            return cached[2]
+
+        path = station_file(self.directory, station_id, '.wxp')
+        try:
+            stat = os.stat(path) if path else None
+        except (FileNotFoundError, ValueError):
+            stat = None
+        if stat is None:
+            self._mapped.pop(station_id, None)
+            return None
+
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if cached is not None and cached[0] == key:
+            self._mapped[station_id] = (key, now, cached[2])
+            return cached[2]
+
+        try:
+            entry = _map_totals(path)
+        except (ValueError, struct.error) as e:
+            # Until the file is replaced, the station's windows are summed in SQL
+            logging.warning(f"Ignoring invalid prefix-sum index file {path}: {e}")
+            entry = None
+        self._mapped[station_id] = (key, now, entry)
+        return entry
+
+    def window(self, station_id, start=None, end=None):
+        """
+        Return the totals of a station over a date window (inclusive) in constant time.
+
+        Args:
+            station_id (str): Identifier for the weather station.
+            start (date, optional): First day. Defaults to the first indexed day.
+            end (date, optional): Last day. Defaults to the last indexed day.
+
+        Returns:
+            dict: Totals keyed by `COLUMNS`, or None if the station is not indexed.
+        """
+        entry = self.station(station_id)
+        if entry is None:
+            return None
+
+        first, totals = entry
+        days = len(totals) - 1
+        low = 0 if start is None else min(max(start.toordinal() - first, 0), days)
+        high = days if end is None else min(max(end.toordinal() - first + 1, 0), days)
+        if high <= low:
+            return dict.fromkeys(COLUMNS, 0)
+        return dict(zip(COLUMNS, (totals[high] - totals[low]).tolist()))
+
+
+def summarize(totals):
+    """
+    Turn window totals into per-measurement count, sum and average.
+
+    Missing values are ignored like `AVG`/`SUM` in `calculate_weather_stats`: a
+    measurement without any value has a None sum and average.
+
+    Args:
+        totals (dict): Totals keyed by `COLUMNS`, sums in integer tenths.
+
+    Returns:
+        dict: `count` of days with a record and a {count, sum, avg} dict per measurement.
+    """
+    summary = {'count': totals['rows']}
+    for name, _ in _MEASUREMENTS:
+        count, total = totals[f'{name}_count'], totals[f'{name}_sum']
+        summary[name] = {
+            'count': count,
+            'sum': total / 10 if count else None,
+            'avg': total / count / 10 if count else None
+        }
+    return summary
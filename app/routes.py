@@ -1,8 +1,26 @@
-from flask import Blueprint, request, jsonify
-from app.models import WeatherData, WeatherStats
+import bisect
+import csv
+import io
+import json
+from datetime import datetime, date as date_type
+from flask import Blueprint, current_app, request, jsonify, Response, stream_with_context
+from sqlalchemy import select, func
+from sqlalchemy.orm import contains_eager
+from app.models import Station, WeatherData, WeatherStats, WeatherStatsSketch, WeatherEvent, Job
+from app.pagination import encode_cursor, decode_cursor, page_limit, keyset_page
+from app.cache import cached_response
+from app.partitioning import weather_source, station_filter
+from app.batch import parse_batch_items, lookup_batch, batch_results
+from app.storage import read_from_primary
+from app.snapshot import snapshot
+from app.formats import FORMATS, MSGPACK_MIMETYPE, ARROW_MIMETYPE, arrow_stream, output_json, packb
 from flask_restx import Api, Resource, fields
 from app import db
 
+# Modules using numpy (columnar store, prefix index, climatology, sketches, series) and
+# the ingestion pipeline behind jobs are imported by the resources that use them, so
+# starting the app does not load them
+
 # Blueprint for API
 api_blueprint = Blueprint('api', __name__)
 
@@ -14,6 +32,9 @@ api = Api(
     description='API for managing and retrieving weather data and statistics'
 )
 
+# Serialize JSON responses with orjson when it is installed
+api.representation('application/json')(output_json)
+
 # Define the model for weather data
 weather_data_model = api.model('WeatherData', {
     'station_id': fields.String(required=True, description='Weather station ID'),
@@ -32,49 +53,866 @@ weather_stats_model = api.model('WeatherStats', {
     'total_precipitation': fields.Float(description='Total precipitation in mm')
 })
 
+def paginate(query, sort_columns, cursor_key, cursor_types, pinned=0):
+    """
+    Page through a query in cursor (keyset) mode or, if `page` is given, page-number mode.
+
+    Both modes order by `sort_columns`, so page boundaries are stable. Cursor mode seeks
+    past the sort key carried in the opaque `cursor` token and returns the next token in
+    the `X-Next-Cursor` header. The total row count is only computed when `count=true`
+    is requested and is returned in the `X-Total-Count` header.
+
+    Args:
+        query (Query): Filtered query to page through.
+        sort_columns (list): Columns forming a unique, indexed sort key.
+        cursor_key (callable): Returns the JSON-serializable sort key of a row.
+        cursor_types (list): Converters from cursor values back to column values.
+        pinned (int, optional): Leading sort columns fixed by equality filters; they are
+                                left out of the keyset condition. Defaults to 0.
+
+    Returns:
+        tuple: The page's rows and the response headers.
+    """
+    limit = page_limit(request.args.get('limit', type=int))
+    headers = {}
+
+    if request.args.get('count', '').lower() in ('1', 'true', 'yes'):
+        headers['X-Total-Count'] = str(query.order_by(None).count())
+
+    page = request.args.get('page', type=int)
+    if page is not None:
+        # Page-number mode, kept for compatibility
+        results = query.order_by(*sort_columns).paginate(page=page, per_page=limit, count=False)
+        return results.items, headers
+
+    after = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            values = decode_cursor(cursor, len(sort_columns))
+            after = [convert(value) for convert, value in zip(cursor_types, values)]
+        except (ValueError, TypeError) as e:
+            api.abort(400, f"Invalid cursor: {e}")
+
+    items, has_more = keyset_page(query, sort_columns[pinned:], after and after[pinned:], limit)
+    if has_more:
+        headers['X-Next-Cursor'] = encode_cursor(cursor_key(items[-1]))
+    return items, headers
+
+
+def _parse_date(value):
+    """Parse a YYYY-MM-DD string into a date."""
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def date_range_args():
+    """
+    Parse the `start_date` and `end_date` request arguments.
+
+    Returns:
+        tuple: (start_date, end_date), each a date or None if not given.
+    """
+    try:
+        start_date = request.args.get('start_date') and _parse_date(request.args['start_date'])
+        end_date = request.args.get('end_date') and _parse_date(request.args['end_date'])
+    except ValueError:
+        api.abort(400, "start_date and end_date must be in the format YYYY-MM-DD")
+    return start_date or None, end_date or None
+
+
+def request_date_bounds():
+    """
+    Combine the `date`, `start_date` and `end_date` request filters into one range.
+
+    Returns:
+        tuple: (first, last) dates of the range, inclusive, each None if unbounded.
+    """
+    start_date, end_date = date_range_args()
+    try:
+        day = request.args.get('date') and _parse_date(request.args['date'])
+    except ValueError:
+        # A malformed date matches no rows; leave the range unbounded
+        day = None
+    if day:
+        start_date = max(start_date, day) if start_date else day
+        end_date = min(end_date, day) if end_date else day
+    return start_date, end_date
+
+
+def request_weather_source():
+    """
+    Return what to query `WeatherData` from for the request's date filters.
+
+    With date partitioning only the partitions overlapping the requested dates are
+    read; see `weather_source`.
+
+    Returns:
+        The `WeatherData` class or an alias of it.
+    """
+    return weather_source(*request_date_bounds())
+
+
+def filter_weather_data(query, source=WeatherData):
+    """
+    Apply the `station_id`, `date`, `start_date` and `end_date` request filters.
+
+    The date range is inclusive on both ends and, combined with `station_id`, is a
+    range seek on the (station_id, date) index.
+
+    Args:
+        query (Query or Select): Query over `WeatherData`.
+        source (optional): `WeatherData` or the alias returned by `request_weather_source`
+                           that the query selects from. Defaults to `WeatherData`.
+
+    Returns:
+        Query or Select: The filtered query.
+    """
+    station_id = request.args.get('station_id')
+    date = request.args.get('date')
+    start_date, end_date = date_range_args()
+
+    if station_id:
+        query = query.filter(station_filter(source, station_id))
+    if date:
+        query = query.filter(source.date == date)
+    if start_date:
+        query = query.filter(source.date >= start_date)
+    if end_date:
+        query = query.filter(source.date <= end_date)
+    return query
+
+
+def columnar_weather_page(station_id, weather_format='rows'):
+    """
+    Answer a single-station `/api/weather` request from the memory-mapped columnar store.
+
+    Supports the same filters and pagination modes as the SQL path: the date filters and
+    the cursor become binary searches over the station's date column and the page is a
+    slice of it, so no database round trip is made.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+        weather_format (str, optional): One of `FORMATS`. Defaults to 'rows'.
+
+    Returns:
+        tuple: Response body (a list of records, or columns for the other formats) and
+               headers, or None if the station is not in the store.
+    """
+    from app.colstore import decode_columns, get_store, record
+    store = get_store()
+    station = store.station(station_id)
+    if station is None:
+        return None
+
+    start_date, end_date = date_range_args()
+    if request.args.get('date'):
+        try:
+            day = _parse_date(request.args['date'])
+        except ValueError:
+            # Matches the SQL path, where a malformed date simply matches no rows
+            return ([] if weather_format == 'rows' else columnar_body(station_id, [], [], [], [])), {}
+        start_date = max(start_date, day) if start_date else day
+        end_date = min(end_date, day) if end_date else day
+
+    first, stop = store.date_range(station, start_date, end_date)
+    limit = page_limit(request.args.get('limit', type=int))
+    headers = {}
+    if request.args.get('count', '').lower() in ('1', 'true', 'yes'):
+        headers['X-Total-Count'] = str(stop - first)
+
+    page = request.args.get('page', type=int)
+    if page is not None:
+        first += (page - 1) * limit
+        if page < 1 or (page > 1 and first >= stop):
+            api.abort(404)
+    elif request.args.get('cursor'):
+        try:
+            _, after = decode_cursor(request.args['cursor'], 2)
+            after = _parse_date(after).toordinal()
+        except (ValueError, TypeError) as e:
+            api.abort(400, f"Invalid cursor: {e}")
+        first = max(first, bisect.bisect_right(station.dates, after))
+
+    end = min(stop, first + limit)
+    if page is None and end < stop:
+        headers['X-Next-Cursor'] = encode_cursor([station_id, date_type.fromordinal(int(station.dates[end - 1])).isoformat()])
+
+    if weather_format != 'rows':
+        # Whole columns are decoded at once instead of row by row
+        return columnar_body(station_id, *decode_columns(station, first, end)), headers
+
+    body = []
+    for index in range(first, end):
+        day, max_temp, min_temp, precipitation = record(station, index)
+        body.append({
+            'station_id': station_id,
+            'date': day.isoformat(),
+            'max_temp': max_temp,
+            'min_temp': min_temp,
+            'precipitation': precipitation
+        })
+    return body, headers
+
+
+def format_arg():
+    """
+    Parse the `format` request argument of `/api/weather`.
+
+    Returns:
+        str: One of `FORMATS`, 'rows' if absent.
+    """
+    weather_format = request.args.get('format', 'rows').lower()
+    if weather_format not in FORMATS:
+        api.abort(400, f"format must be one of {', '.join(FORMATS)}")
+    return weather_format
+
+
+def columnar_body(station_id, dates, max_temp, min_temp, precipitation):
+    """
+    Build a columnar `/api/weather` body: one array per field instead of one object per record.
+
+    Args:
+        station_id (str or list): The station of every record, or one per record.
+        dates (list): Dates as YYYY-MM-DD strings.
+        max_temp (list): Values in degrees Celsius, None where missing.
+        min_temp (list): Values in degrees Celsius, None where missing.
+        precipitation (list): Values in mm, None where missing.
+
+    Returns:
+        dict: The arrays keyed `station_id`, `dates`, `max_temp`, `min_temp` and `precipitation`.
+    """
+    return {'station_id': station_id, 'dates': dates, 'max_temp': max_temp,
+            'min_temp': min_temp, 'precipitation': precipitation}
+
+
+def anomaly_requested():
+    """True if `anomaly=true` is requested."""
+    return request.args.get('anomaly', '').lower() in ('1', 'true', 'yes')
+
+
+def add_anomalies(body):
+    """
+    Add the departure from the daily climatology normal to `/api/weather` records if
+    `anomaly=true` is requested.
+
+    Args:
+        body (list or dict): Records of the response, or its columns, updated in place.
+                             Columns get an `anomaly` array with one entry per record.
+    """
+    if not anomaly_requested():
+        return
+    from app.climatology import anomalies
+    if isinstance(body, dict):
+        station_ids = body['station_id']
+        if not isinstance(station_ids, list):
+            station_ids = [station_ids] * len(body['dates'])
+        records = [
+            {'station_id': station_id, 'date': day, 'max_temp': max_temp, 'min_temp': min_temp,
+             'precipitation': precipitation}
+            for station_id, day, max_temp, min_temp, precipitation
+            in zip(station_ids, body['dates'], body['max_temp'], body['min_temp'], body['precipitation'])
+        ]
+        body['anomaly'] = anomalies(records)
+        return
+    for record, anomaly in zip(body, anomalies(body)):
+        record['anomaly'] = anomaly
+
+
+def weather_response(body, weather_format, headers):
+    """
+    Return an `/api/weather` body in the requested format.
+
+    Args:
+        body (list or dict): Records, or columns for the columnar formats.
+        weather_format (str): One of `FORMATS`.
+        headers (dict): Response headers.
+
+    Returns:
+        Body, status and headers for JSON, or a binary response.
+    """
+    if weather_format == 'msgpack':
+        try:
+            data = packb(body)
+        except ImportError:
+            api.abort(406, "format=msgpack requires msgpack to be installed")
+        return Response(data, mimetype=MSGPACK_MIMETYPE, headers=headers)
+    if weather_format == 'arrow':
+        try:
+            data = arrow_stream(body)
+        except ImportError:
+            api.abort(406, "format=arrow requires pyarrow to be installed")
+        return Response(data, mimetype=ARROW_MIMETYPE, headers=headers)
+    return body, 200, headers
+
+
+def percentiles_arg():
+    """
+    Parse the `percentiles` request argument.
+
+    Returns:
+        tuple: The requested percentiles, the defaults if the argument is empty, or None if absent.
+    """
+    if 'percentiles' not in request.args:
+        return None
+    from app.sketches import parse_percentiles
+    try:
+        return parse_percentiles(request.args['percentiles'])
+    except ValueError:
+        api.abort(400, "percentiles must be comma-separated numbers between 0 and 100")
+
+
 # Route to retrieve weather data
 @api.route('/api/weather')
 @api.param('station_id', 'Weather station ID (optional)', type=str)
 @api.param('date', 'Date of the weather data (optional, YYYY-MM-DD)', type=str)
+@api.param('start_date', 'First date of a range, inclusive (optional, YYYY-MM-DD)', type=str)
+@api.param('end_date', 'Last date of a range, inclusive (optional, YYYY-MM-DD)', type=str)
+@api.param('limit', 'Page size (optional, default 10, capped at API_MAX_PAGE_SIZE)', type=int)
+@api.param('cursor', 'Opaque token from the X-Next-Cursor header of the previous page (optional)', type=str)
+@api.param('page', 'Page number, for page-number pagination (optional)', type=int)
+@api.param('count', 'Return the total row count in the X-Total-Count header (optional)', type=bool)
+@api.param('anomaly', 'Add each record\'s departure from the daily normal (optional)', type=bool)
+@api.param('format', 'rows (default), or columnar as JSON, msgpack or arrow (optional)', type=str)
 class WeatherDataResource(Resource):
+    method_decorators = [cached_response]
+
     def get(self):
         """
         Retrieve weather data.
         Filters:
         - `station_id` (optional): Filter by weather station ID.
         - `date` (optional): Filter by specific date in the format YYYY-MM-DD.
+        - `start_date` / `end_date` (optional): Inclusive date range in the format YYYY-MM-DD.
+
+        With `anomaly=true`, each record has an `anomaly` with max_temp, min_temp and
+        precipitation minus the station's normal for the day (null without a normal).
+
+        Formats:
+        - `rows` (default): A list of records.
+        - `columnar`: `{station_id, dates[], max_temp[], min_temp[], precipitation[]}`;
+          `station_id` is an array too unless filtered on. Several times smaller and
+          cheaper to serialize than records.
+        - `msgpack`: The columnar body as MessagePack (requires msgpack).
+        - `arrow`: The columns as an Arrow IPC stream (requires pyarrow).
 
         Pagination:
-        - Default page size is 10 records.
+        - Ordered by station ID and date; default page size is 10 records.
+        - Pass the `X-Next-Cursor` response header as `cursor` to get the next page.
         """
+        from app.colstore import columnar_enabled
         station_id = request.args.get('station_id')
-        date = request.args.get('date')
-        query = WeatherData.query
+        weather_format = format_arg()
 
-        # Apply filters
-        if station_id:
-            query = query.filter_by(station_id=station_id)
-        if date:
-            query = query.filter_by(date=date)
+        # Single-station reads can be served from the memory-mapped columnar store
+        if station_id and columnar_enabled():
+            page = columnar_weather_page(station_id, weather_format)
+            if page is not None:
+                body, headers = page
+                add_anomalies(body)
+                return weather_response(body, weather_format, headers)
+
+        # Apply filters; the station join orders by code and loads it with each row
+        source = request_weather_source()
+        query = filter_weather_data(
+            db.session.query(source).join(source.station).options(contains_eager(source.station)), source)
 
         # Apply pagination
-        results = query.paginate(page=request.args.get('page', 1, type=int), per_page=10)
+        items, headers = paginate(
+            query,
+            [Station.code, source.date],
+            lambda data: [data.station_id, data.date.isoformat()],
+            [str, _parse_date],
+            pinned=1 if station_id else 0
+        )
 
         # Return results in a structured format
-        return [{
-            'station_id': data.station_id,
-            'date': data.date.isoformat(),
-            'max_temp': data.max_temp,
-            'min_temp': data.min_temp,
-            'precipitation': data.precipitation
-        } for data in results.items]
+        if weather_format == 'rows':
+            body = [{
+                'station_id': data.station_id,
+                'date': data.date.isoformat(),
+                'max_temp': data.max_temp,
+                'min_temp': data.min_temp,
+                'precipitation': data.precipitation
+            } for data in items]
+        else:
+            body = columnar_body(
+                station_id or [data.station_id for data in items],
+                [data.date.isoformat() for data in items],
+                [data.max_temp for data in items],
+                [data.min_temp for data in items],
+                [data.precipitation for data in items]
+            )
+        add_anomalies(body)
+        return weather_response(body, weather_format, headers)
+
+
+# Route to export weather data in bulk
+@api.route('/api/weather/export')
+@api.param('station_id', 'Weather station ID (optional)', type=str)
+@api.param('start_date', 'First date of a range, inclusive (optional, YYYY-MM-DD)', type=str)
+@api.param('end_date', 'Last date of a range, inclusive (optional, YYYY-MM-DD)', type=str)
+@api.param('format', 'Export format: csv (default) or ndjson', type=str)
+class WeatherExportResource(Resource):
+    def get(self):
+        """
+        Stream weather data as CSV or newline-delimited JSON.
+        Filters:
+        - `station_id`, `date`, `start_date`, `end_date` as for `/api/weather`.
+
+        The response is chunked and generated from a server-side cursor, so memory stays
+        constant regardless of how many rows are exported.
+        """
+        export_format = request.args.get('format', 'csv').lower()
+        if export_format not in ('csv', 'ndjson'):
+            api.abort(400, "format must be csv or ndjson")
+
+        from app.catalog import data_range
+        columns = ['station_id', 'date', 'max_temp', 'min_temp', 'precipitation']
+        # The station catalog narrows the range to the dates with data, so only the
+        # partitions holding them are read, and an export without data reads no rows at
+        # all. Rows are still filtered by the requested dates alone.
+        bounds = data_range(*request_date_bounds(), request.args.get('station_id'))
+        query = None
+        if bounds is not None:
+            source = weather_source(*bounds)
+            query = filter_weather_data(
+                select(Station.code, source.date, source.max_temp_tenths,
+                       source.min_temp_tenths, source.precipitation_tenths)
+                .join(Station, Station.id == source.station_key),
+                source
+            ).order_by(Station.code, source.date)
+        chunk_size = current_app.config.get('EXPORT_CHUNK_SIZE', 5000)
+
+        def generate():
+            partitions = ()
+            if query is not None:
+                # Core execution on the session's connection skips ORM row loading
+                connection = db.session.connection().execution_options(stream_results=True, yield_per=chunk_size)
+                partitions = connection.execute(query).partitions()
+            if export_format == 'csv':
+                yield ','.join(columns) + '\n'
+            for rows in partitions:
+                # Stored tenths back to degrees Celsius and mm
+                rows = [
+                    (station_id, date, *(None if value is None else value / 10 for value in values))
+                    for station_id, date, *values in rows
+                ]
+                buffer = io.StringIO()
+                if export_format == 'csv':
+                    csv.writer(buffer, lineterminator='\n').writerows(rows)
+                else:
+                    for station_id, date, max_temp, min_temp, precipitation in rows:
+                        buffer.write(json.dumps({
+                            'station_id': station_id,
+                            'date': date.isoformat(),
+                            'max_temp': max_temp,
+                            'min_temp': min_temp,
+                            'precipitation': precipitation
+                        }))
+                        buffer.write('\n')
+                yield buffer.getvalue()
+
+        mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename=weather_data.{export_format}'
+        })
+
+
+# Route to look up many stations and dates at once
+@api.route('/api/weather/batch')
+class WeatherBatchResource(Resource):
+    def post(self):
+        """
+        Look up weather data for many (station, date) pairs or station date ranges in one request.
+
+        JSON body:
+        - `items`: List of `{"station_id", "date"}` or `{"station_id", "start_date", "end_date"}`
+          objects, at most `API_BATCH_MAX_ITEMS`, spanning at most `API_BATCH_MAX_ROWS` days in total.
+
+        Results are returned in request order. A single-day result has `found` and, when
+        found, the measurements; a range result has `found` and the `data` rows of the range.
+        The lookups are resolved with a few set-based queries rather than one per item.
+        """
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or 'items' not in body:
+            api.abort(400, "JSON body with an items list is required")
+        try:
+            items = parse_batch_items(
+                body['items'],
+                current_app.config.get('API_BATCH_MAX_ITEMS', 10000),
+                current_app.config.get('API_BATCH_MAX_ROWS', 100000)
+            )
+        except ValueError as e:
+            api.abort(400, str(e))
+        return {'results': batch_results(items, lookup_batch(items))}
+
+
+# Route to retrieve a downsampled series for charts
+@api.route('/api/weather/series')
+@api.param('station_id', 'Weather station ID (required)', type=str)
+@api.param('measure', 'max_temp (default), min_temp or precipitation', type=str)
+@api.param('start_date', 'First date of a range, inclusive (optional, YYYY-MM-DD)', type=str)
+@api.param('end_date', 'Last date of a range, inclusive (optional, YYYY-MM-DD)', type=str)
+@api.param('points', 'Number of points to return (optional, default API_SERIES_DEFAULT_POINTS)', type=int)
+@api.param('method', 'lttb (Largest-Triangle-Three-Buckets, default) or minmax', type=str)
+class WeatherSeriesResource(Resource):
+    method_decorators = [cached_response]
+
+    def get(self):
+        """
+        Retrieve one measure of a station as a series downsampled to about `points` points.
+
+        `lttb` keeps the points that best preserve the visual shape of the line; `minmax`
+        keeps the lowest and highest point of each bucket. Missing values are left out and
+        gaps in the series are marked with a null value. The work depends on the station's
+        rows in the range, read as arrays, and the response size on `points` only.
+        """
+        from app.series import METHODS, MEASURES, downsample, station_columns
+        station_id = request.args.get('station_id')
+        if not station_id:
+            api.abort(400, "station_id is required")
+        measure = request.args.get('measure', 'max_temp')
+        if measure not in MEASURES:
+            api.abort(400, f"measure must be one of {', '.join(MEASURES)}")
+        method = request.args.get('method', 'lttb')
+        if method not in METHODS:
+            api.abort(400, f"method must be one of {', '.join(METHODS)}")
+        points = request.args.get('points', current_app.config.get('API_SERIES_DEFAULT_POINTS', 1000), type=int)
+        max_points = current_app.config.get('API_SERIES_MAX_POINTS', 10000)
+        if not 3 <= points <= max_points:
+            api.abort(400, f"points must be between 3 and {max_points}")
+        start_date, end_date = date_range_args()
+
+        series = downsample(station_columns(station_id, start_date, end_date), measure, points, method)
+        return dict(series, station_id=station_id, measure=measure, method=method,
+                    start_date=start_date and start_date.isoformat(),
+                    end_date=end_date and end_date.isoformat(), points=len(series['data']))
+
+
+def sql_window_totals(station_id, start, end):
+    """
+    Compute window totals like `PrefixIndex.window` with one aggregate query.
+
+    Used for stations that are not in the prefix-sum index.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+        start (date, optional): First day of the window.
+        end (date, optional): Last day of the window.
+
+    Returns:
+        dict: Totals keyed by `COLUMNS`, sums in integer tenths.
+    """
+    from app.prefix_index import COLUMNS
+    source = weather_source(start, end)
+    aggregates = [func.count()]
+    for column in (source.max_temp_tenths, source.min_temp_tenths, source.precipitation_tenths):
+        aggregates += [func.sum(column), func.count(column)]
+    query = select(*aggregates).where(station_filter(source, station_id))
+    if start:
+        query = query.where(source.date >= start)
+    if end:
+        query = query.where(source.date <= end)
+    return dict(zip(COLUMNS, (int(value or 0) for value in db.session.execute(query).one())))
+
+
+# Route to retrieve every station's weather on a day
+@api.route('/api/weather/snapshot')
+@api.param('date', 'Day of the snapshot (YYYY-MM-DD); or give start_date and end_date', type=str)
+@api.param('start_date', 'First day of a range of snapshots, inclusive (YYYY-MM-DD)', type=str)
+@api.param('end_date', 'Last day of a range of snapshots, inclusive (YYYY-MM-DD)', type=str)
+@api.param('summary', 'Add the cross-station count, mean, min and max of each day (optional)', type=bool)
+class WeatherSnapshotResource(Resource):
+    method_decorators = [cached_response]
+
+    def get(self):
+        """
+        Retrieve what every station recorded on a day, or on each day of a short range.
+
+        With `date`, returns `{date, stations[], summary}`, `stations` being every
+        station's record of the day, unpaginated. With `start_date` and `end_date`
+        (at most API_SNAPSHOT_MAX_DAYS days), returns `{start_date, end_date, days[]}`
+        with one such snapshot per day, days without data included. `summary` is only
+        present with `summary=true`.
+
+        Each call is a seek on the date index, not a scan of weather_data.
+        """
+        summary = request.args.get('summary', '').lower() in ('1', 'true', 'yes')
+        if request.args.get('date'):
+            try:
+                day = _parse_date(request.args['date'])
+            except ValueError:
+                api.abort(400, "date must be in the format YYYY-MM-DD")
+            return snapshot(day, day, summary)[0]
+
+        start_date, end_date = date_range_args()
+        if not (start_date and end_date):
+            api.abort(400, "date, or start_date and end_date, is required")
+        max_days = current_app.config.get('API_SNAPSHOT_MAX_DAYS', 31)
+        if not 0 <= (end_date - start_date).days < max_days:
+            api.abort(400, f"the range must run forward and span at most {max_days} days")
+        return {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+                'days': snapshot(start_date, end_date, summary)}
+
+
+# Route to aggregate weather data over an arbitrary window
+@api.route('/api/weather/aggregate')
+@api.param('station_id', 'Weather station ID (required)', type=str)
+@api.param('start', 'First date of the window, inclusive (optional, YYYY-MM-DD)', type=str)
+@api.param('end', 'Last date of the window, inclusive (optional, YYYY-MM-DD)', type=str)
+class WeatherAggregateResource(Resource):
+    def get(self):
+        """
+        Aggregate a station's weather data over any date window.
+
+        Returns the number of days with a record and, for max_temp, min_temp and
+        precipitation, the count of non-missing values with their sum and average.
+        Missing values are ignored, as in `/api/weather/stats`.
+
+        Answered in constant time from the station's prefix sums, so any window costs
+        two row lookups instead of a scan.
+        """
+        from app.prefix_index import get_index, summarize
+        station_id = request.args.get('station_id')
+        if not station_id:
+            api.abort(400, "station_id is required")
+        try:
+            start = request.args.get('start') and _parse_date(request.args['start'])
+            end = request.args.get('end') and _parse_date(request.args['end'])
+        except ValueError:
+            api.abort(400, "start and end must be in the format YYYY-MM-DD")
+
+        totals = get_index().window(station_id, start or None, end or None)
+        if totals is None:
+            totals = sql_window_totals(station_id, start, end)
+
+        return dict(summarize(totals), station_id=station_id,
+                    start=start.isoformat() if start else None,
+                    end=end.isoformat() if end else None)
+
+
+# Route to retrieve daily climatology normals
+@api.route('/api/weather/normals')
+@api.param('station_id', 'Weather station ID (required)', type=str)
+@api.param('date', 'Only the normal of this date\'s day of year (optional, YYYY-MM-DD)', type=str)
+class WeatherNormalsResource(Resource):
+    method_decorators = [cached_response]
+
+    def get(self):
+        """
+        Retrieve a station's daily climatology normals.
+
+        One record per day of the year (or only the day of `date`) with the mean and
+        standard deviation of max_temp and min_temp, the mean precipitation and the number
+        of values averaged. Normals are rebuilt with `/api/weather/stats` statistics.
+        """
+        from app.climatology import day_of_year, station_normals
+        station_id = request.args.get('station_id')
+        if not station_id:
+            api.abort(400, "station_id is required")
+        day = None
+        if request.args.get('date'):
+            try:
+                day = day_of_year(_parse_date(request.args['date']))
+            except ValueError:
+                api.abort(400, "date must be in the format YYYY-MM-DD")
+        return station_normals(station_id, day)
+
+
+def fraction_arg(name):
+    """
+    Parse a request argument holding a fraction between 0 and 1.
+
+    Args:
+        name (str): Name of the argument.
+
+    Returns:
+        float: The fraction, or None if absent.
+    """
+    if not request.args.get(name):
+        return None
+    try:
+        value = float(request.args[name])
+    except ValueError:
+        value = None
+    if value is None or not 0 <= value <= 1:
+        api.abort(400, f"{name} must be a number between 0 and 1")
+    return value
+
+
+# Route to list the stations and the data they have
+@api.route('/api/stations')
+@api.param('station_id', 'Weather station IDs, comma-separated (optional, default all)', type=str)
+@api.param('start_year', 'First year, inclusive (optional)', type=int)
+@api.param('end_year', 'Last year, inclusive (optional)', type=int)
+@api.param('min_coverage', 'Minimum fraction of the days from start_year to end_year with data, 0 to 1 (optional)', type=float)
+@api.param('max_missing_max_temp', 'Maximum fraction of the days stored without max_temp (optional)', type=float)
+@api.param('max_missing_min_temp', 'Maximum fraction of the days stored without min_temp (optional)', type=float)
+@api.param('max_missing_precipitation', 'Maximum fraction of the days stored without precipitation (optional)', type=float)
+@api.param('years', 'Add the per-year breakdown of each station (optional)', type=bool)
+@api.param('limit', 'Page size (optional, default 10, capped at API_MAX_PAGE_SIZE)', type=int)
+@api.param('cursor', 'Opaque token from the X-Next-Cursor header of the previous page (optional)', type=str)
+@api.param('page', 'Page number, for page-number pagination (optional)', type=int)
+@api.param('count', 'Return the total station count in the X-Total-Count header (optional)', type=bool)
+class StationsResource(Resource):
+    method_decorators = [cached_response]
+
+    def get(self):
+        """
+        List the stations with their first and last date, days stored and missing values.
+
+        Served from the station catalog, which ingestion keeps up to date, so the cost
+        does not depend on the number of weather rows. With `start_year` and/or
+        `end_year`, every figure covers those years only and stations without data in
+        them are left out.
+
+        Each station has `coverage`, the fraction of the days from `start_year` to
+        `end_year` (without both, from its first to its last date) with a row, `missing`,
+        the rows without each measure, and `missing_fraction`, their fraction of the rows.
+
+        Filters:
+        - `min_coverage` (requires `start_year` and `end_year`): e.g. 0.9 for stations
+          with rows on at least 90% of the days of the years.
+        - `max_missing_<measure>`: e.g. `max_missing_precipitation=0.05` for stations
+          missing precipitation on under 5% of their rows.
+
+        Pagination:
+        - Ordered by station ID; default page size is 10 stations.
+        - Pass the `X-Next-Cursor` response header as `cursor` to get the next page.
+        """
+        from app.catalog import MEASURES, station_summaries, station_years
+        try:
+            start_year = request.args.get('start_year') and int(request.args['start_year'])
+            end_year = request.args.get('end_year') and int(request.args['end_year'])
+        except ValueError:
+            api.abort(400, "start_year and end_year must be integers")
+        start_year, end_year = start_year or None, end_year or None
+
+        window_days = None
+        if start_year and end_year:
+            window_days = (date_type(end_year, 12, 31) - date_type(start_year, 1, 1)).days + 1
+        min_coverage = fraction_arg('min_coverage')
+        if min_coverage is not None and window_days is None:
+            api.abort(400, "min_coverage requires start_year and end_year")
+        max_missing = {measure: fraction_arg(f'max_missing_{measure}') for measure in MEASURES}
+
+        query = station_summaries(
+            start_year, end_year,
+            min_days=None if min_coverage is None else min_coverage * window_days,
+            max_missing={measure: fraction for measure, fraction in max_missing.items() if fraction is not None}
+        )
+        if request.args.get('station_id'):
+            query = query.filter(Station.code.in_(request.args['station_id'].split(',')))
+
+        items, headers = paginate(query, [Station.code], lambda row: [row.code], [str])
+
+        body = []
+        for row in items:
+            days = window_days or (row.last_date - row.first_date).days + 1
+            missing = {measure: getattr(row, f'{measure}_missing') for measure in MEASURES}
+            body.append({
+                'station_id': row.code,
+                'first_date': row.first_date.isoformat(),
+                'last_date': row.last_date.isoformat(),
+                'days': row.days,
+                'coverage': round(row.days / days, 4),
+                'missing': missing,
+                'missing_fraction': {measure: round(count / row.days, 4) for measure, count in missing.items()}
+            })
+        if request.args.get('years', '').lower() in ('1', 'true', 'yes'):
+            years = station_years([record['station_id'] for record in body], start_year, end_year)
+            for record in body:
+                record['years'] = [{
+                    'year': year.year,
+                    'first_date': year.first_date.isoformat(),
+                    'last_date': year.last_date.isoformat(),
+                    'days': year.days,
+                    'missing': {measure: getattr(year, f'{measure}_missing') for measure in MEASURES}
+                } for year in years.get(record['station_id'], [])]
+        return body, 200, headers
+
+
+# Route to retrieve extreme weather events
+@api.route('/api/weather/events')
+@api.param('station_id', 'Weather station ID (optional)', type=str)
+@api.param('type', 'Event type, a key of WEATHER_EVENTS such as heat_wave (optional)', type=str)
+@api.param('start', 'Only events ending on or after this date (optional, YYYY-MM-DD)', type=str)
+@api.param('end', 'Only events starting on or before this date (optional, YYYY-MM-DD)', type=str)
+@api.param('limit', 'Page size (optional, default 10, capped at API_MAX_PAGE_SIZE)', type=int)
+@api.param('cursor', 'Opaque token from the X-Next-Cursor header of the previous page (optional)', type=str)
+@api.param('page', 'Page number, for page-number pagination (optional)', type=int)
+@api.param('count', 'Return the total event count in the X-Total-Count header (optional)', type=bool)
+class WeatherEventsResource(Resource):
+    method_decorators = [cached_response]
+
+    def get(self):
+        """
+        Retrieve extreme weather events: runs of days beyond a threshold of `WEATHER_EVENTS`.
+
+        Events are detected with the weather statistics and read from `weather_events`,
+        never from the daily rows. Each has its `start_date` and `end_date`, the `days`
+        beyond the threshold, the `missing_days` bridged inside it and its `peak`.
+
+        Pagination:
+        - Ordered by station ID, type and start date; default page size is 10 events.
+        - Pass the `X-Next-Cursor` response header as `cursor` to get the next page.
+        """
+        from app.events import event_types
+        station_id = request.args.get('station_id')
+        event_type = request.args.get('type')
+        types = event_types()
+        if event_type and event_type not in types:
+            api.abort(400, f"type must be one of {', '.join(types)}")
+        try:
+            start = request.args.get('start') and _parse_date(request.args['start'])
+            end = request.args.get('end') and _parse_date(request.args['end'])
+        except ValueError:
+            api.abort(400, "start and end must be in the format YYYY-MM-DD")
+
+        query = db.session.query(WeatherEvent, Station.code).join(Station, Station.id == WeatherEvent.station_key)
+        if station_id:
+            query = query.filter(WeatherEvent.station_key == select(Station.id).where(Station.code == station_id).scalar_subquery())
+        if event_type:
+            query = query.filter(WeatherEvent.event_type == event_type)
+        # Events overlapping the range
+        if start:
+            query = query.filter(WeatherEvent.end_date >= start)
+        if end:
+            query = query.filter(WeatherEvent.start_date <= end)
+
+        items, headers = paginate(
+            query,
+            [Station.code, WeatherEvent.event_type, WeatherEvent.start_date],
+            lambda row: [row.code, row.WeatherEvent.event_type, row.WeatherEvent.start_date.isoformat()],
+            [str, str, _parse_date],
+            pinned=(1 + bool(event_type)) if station_id else 0
+        )
+
+        body = [{
+            'station_id': code,
+            'type': event.event_type,
+            'measure': types[event.event_type].measure if event.event_type in types else None,
+            'start_date': event.start_date.isoformat(),
+            'end_date': event.end_date.isoformat(),
+            'days': event.days,
+            'missing_days': event.missing_days,
+            'peak': event.peak
+        } for event, code in items]
+        return body, 200, headers
 
 
 # Route to retrieve weather statistics
 @api.route('/api/weather/stats')
 @api.param('station_id', 'Weather station ID (optional)', type=str)
 @api.param('year', 'Year of the weather stats (optional)', type=int)
+@api.param('limit', 'Page size (optional, default 10, capped at API_MAX_PAGE_SIZE)', type=int)
+@api.param('cursor', 'Opaque token from the X-Next-Cursor header of the previous page (optional)', type=str)
+@api.param('page', 'Page number, for page-number pagination (optional)', type=int)
+@api.param('count', 'Return the total row count in the X-Total-Count header (optional)', type=bool)
+@api.param('percentiles', 'Add each row\'s distribution with these percentiles, e.g. 5,50,95 (optional)', type=str)
 class WeatherStatsResource(Resource):
+    method_decorators = [cached_response]
+
     def get(self):
         """
         Retrieve weather statistics.
@@ -82,12 +920,18 @@ class WeatherStatsResource(Resource):
         - `station_id` (optional): Filter by weather station ID.
         - `year` (optional): Filter by specific year.
 
+        With `percentiles`, each row also has a `distribution`: for max_temp, min_temp and
+        precipitation the count, min, max and requested percentiles, and the
+        `threshold_days` counts. They are read from the station-year's sketches.
+
         Pagination:
-        - Default page size is 10 records.
+        - Ordered by station ID and year; default page size is 10 records.
+        - Pass the `X-Next-Cursor` response header as `cursor` to get the next page.
         """
         station_id = request.args.get('station_id')
         year = request.args.get('year')
         query = WeatherStats.query
+        percentiles = percentiles_arg()
 
         # Apply filters
         if station_id:
@@ -96,13 +940,142 @@ class WeatherStatsResource(Resource):
             query = query.filter_by(year=int(year))
 
         # Apply pagination
-        results = query.paginate(page=request.args.get('page', 1, type=int), per_page=10)
+        items, headers = paginate(
+            query,
+            [WeatherStats.station_id, WeatherStats.year],
+            lambda stat: [stat.station_id, stat.year],
+            [str, int],
+            pinned=1 if station_id else 0
+        )
 
         # Return results in a structured format
-        return [{
+        body = [{
             'station_id': stat.station_id,
             'year': stat.year,
             'avg_max_temp': stat.avg_max_temp,
             'avg_min_temp': stat.avg_min_temp,
             'total_precipitation': stat.total_precipitation
-        } for stat in results.items]
\ No newline at end of file
+        } for stat in items]
+        if percentiles is not None:
+            from app.sketches import describe, load_sketches
+            sketches = load_sketches((stat.station_id, stat.year) for stat in items)
+            for record in body:
+                sketch = sketches.get((record['station_id'], record['year']))
+                record['distribution'] = describe([sketch] if sketch else [], percentiles)
+        return body, 200, headers
+
+
+# Route to merge weather statistics distributions
+@api.route('/api/weather/stats/distribution')
+@api.param('station_id', 'Weather station IDs, comma-separated (optional, default all)', type=str)
+@api.param('start_year', 'First year, inclusive (optional)', type=int)
+@api.param('end_year', 'Last year, inclusive (optional)', type=int)
+@api.param('percentiles', 'Percentiles to report, comma-separated (optional, default 5,50,95)', type=str)
+class WeatherDistributionResource(Resource):
+    method_decorators = [cached_response]
+
+    def get(self):
+        """
+        Retrieve the distribution of daily values over several stations and years.
+
+        The sketches of every matching station-year are merged, so multi-year and
+        multi-station percentiles, extremes and threshold day counts are exact without
+        reading the daily rows. Returns the number of station-years merged and, for
+        max_temp, min_temp and precipitation, the count, min, max and percentiles.
+        """
+        from app.sketches import DEFAULT_PERCENTILES, describe
+        percentiles = percentiles_arg() or DEFAULT_PERCENTILES
+        try:
+            start_year = request.args.get('start_year') and int(request.args['start_year'])
+            end_year = request.args.get('end_year') and int(request.args['end_year'])
+        except ValueError:
+            api.abort(400, "start_year and end_year must be integers")
+
+        query = select(WeatherStatsSketch)
+        if request.args.get('station_id'):
+            query = query.where(WeatherStatsSketch.station_id.in_(request.args['station_id'].split(',')))
+        if start_year:
+            query = query.where(WeatherStatsSketch.year >= start_year)
+        if end_year:
+            query = query.where(WeatherStatsSketch.year <= end_year)
+        rows = db.session.scalars(query).all()
+        return dict(describe(rows, percentiles), station_years=len(rows))
+
+
+# Route to inspect the response cache
+@api.route('/api/cache/stats')
+class CacheStatsResource(Resource):
+    def get(self):
+        """
+        Retrieve response cache counters.
+
+        Returns hits, misses, evictions and 304 responses of this process, the current
+        entry count and size, and the data generation the cache is keyed on.
+        """
+        stats = current_app.extensions['response_cache'].stats()
+        stats['generation'] = current_app.extensions['data_generation'].current()
+        return stats
+
+
+def _submit_job(kind, params):
+    """Queue a job and return the API response: 202 for a new job, 200 for a coalesced one."""
+    from app.jobs import enqueue_job, job_status
+    try:
+        job, created = enqueue_job(kind, params)
+    except ValueError as e:
+        api.abort(400, str(e))
+    return job_status(job), 202 if created else 200, {'Location': f'/api/jobs/{job.id}'}
+
+
+# Route to start an ingestion job
+@api.route('/api/jobs/ingest')
+class IngestJobResource(Resource):
+    def post(self):
+        """
+        Queue an ingestion job and return its ID right away.
+
+        JSON body (all optional):
+        - `file`: Weather file or archive to ingest, relative to the data directory.
+        - `data_dir`: Directory of weather files, relative to the data directory (default: all of it).
+        - `full`: Re-ingest every file, ignoring the ingestion manifest.
+
+        A job for the same files that is still queued or running is returned instead of
+        starting another one (status 200 rather than 202).
+        """
+        body = request.get_json(silent=True) or {}
+        params = {name: body[name] for name in ('file', 'data_dir', 'full') if body.get(name) is not None}
+        return _submit_job('ingest', params)
+
+
+# Route to start a statistics job
+@api.route('/api/jobs/stats')
+class StatsJobResource(Resource):
+    def post(self):
+        """
+        Queue a weather statistics job and return its ID right away.
+
+        JSON body (optional):
+        - `full`: Rebuild statistics for every station and year instead of the dirty ones.
+        """
+        body = request.get_json(silent=True) or {}
+        return _submit_job('stats', {'full': bool(body.get('full'))})
+
+
+# Route to follow a job
+@api.route('/api/jobs/<string:job_id>')
+class JobResource(Resource):
+    # Polled right after the job is queued, so never read from a lagging replica
+    method_decorators = [read_from_primary]
+
+    def get(self, job_id):
+        """
+        Retrieve a job's status and progress.
+
+        Progress has the files done out of the total, rows written, rows per second and
+        the estimated seconds remaining; finished jobs also have their final counts.
+        """
+        from app.jobs import job_status
+        job = db.session.get(Job, job_id)
+        if job is None:
+            api.abort(404, f"Job {job_id} not found")
+        return job_status(job)
@@ -0,0 +1,149 @@
+import logging
+from sqlalchemy import inspect, select, insert, delete, cast, text, Integer
+from sqlalchemy.sql import table, column, func
+from app import db
+from app.models import Station, WeatherData, WeatherStats
+
+# Layout of `weather_data` before the station dimension table: one row per
+# (station_id, date) with the code repeated and Float measurements
+_legacy_weather_data = table(
+    'weather_data_legacy',
+    column('station_id'),
+    column('date'),
+    column('max_temp'),
+    column('min_temp'),
+    column('precipitation')
+)
+
+
+def has_legacy_weather_table(connection):
+    """
+    Tell whether `weather_data` still has the pre-normalization layout.
+
+    Args:
+        connection (Connection): Database connection.
+
+    Returns:
+        bool: True if `weather_data` has a `station_id` column.
+    """
+    inspector = inspect(connection)
+    if not inspector.has_table('weather_data'):
+        return False
+    return 'station_id' in {col['name'] for col in inspector.get_columns('weather_data')}
+
+
+def create_weather_indexes():
+    """
+    Create the `weather_data` indexes missing from tables created before they were added.
+
+    `create_all` leaves existing tables alone, indexes included. SQLite partition files
+    get the indexes of the main table too; PostgreSQL adds the indexes of a partitioned
+    `weather_data` to every partition itself.
+
+    Returns:
+        list: Names of the indexes created, qualified with the partition schema if any.
+    """
+    from app.partitioning import partition_scopes
+
+    created = []
+    with db.engine.begin() as connection:
+        if has_legacy_weather_table(connection):
+            # `upgrade_weather_schema` creates the new table with its indexes
+            return created
+        tables = {WeatherData.__table__} | {weather_table for weather_table, _ in partition_scopes()}
+        for weather_table in sorted(tables, key=lambda t: t.schema or ''):
+            existing = {index['name'] for index in inspect(connection).get_indexes('weather_data', schema=weather_table.schema)}
+            for index in weather_table.indexes:
+                if index.name not in existing:
+                    index.create(connection)
+                    created.append(f'{weather_table.schema}.{index.name}' if weather_table.schema else index.name)
+
+    for name in created:
+        logging.info(f"Created index {name}")
+    return created
+
+
+def create_stats_key():
+    """
+    Add the (station_id, year) unique key to a `weather_stats` table created without it.
+
+    `calculate_weather_stats` upserts with `ON CONFLICT (station_id, year)`, which needs
+    the key. Tables from before it was added may hold several rows per station-year;
+    all but the last written of each are deleted first. The key is added as the unique
+    index `uix_station_year`, which the conflict target uses like the constraint.
+
+    Returns:
+        bool: True if the key was added.
+    """
+    key = ['station_id', 'year']
+    with db.engine.begin() as connection:
+        inspector = inspect(connection)
+        if not inspector.has_table('weather_stats'):
+            return False
+        keys = [constraint['column_names'] for constraint in inspector.get_unique_constraints('weather_stats')]
+        keys += [index['column_names'] for index in inspector.get_indexes('weather_stats') if index['unique']]
+        if any(sorted(columns) == key for columns in keys):
+            return False
+
+        latest = select(func.max(WeatherStats.id)).group_by(WeatherStats.station_id, WeatherStats.year)
+        removed = connection.execute(delete(WeatherStats).where(WeatherStats.id.not_in(latest))).rowcount
+        connection.execute(text('CREATE UNIQUE INDEX uix_station_year ON weather_stats (station_id, year)'))
+
+    logging.info(f"Added the uix_station_year key to weather_stats, removing {removed} duplicate rows")
+    return True
+
+
+def upgrade_weather_schema():
+    """
+    Convert a legacy `weather_data` table to the normalized layout.
+
+    In one transaction, the old table is renamed, the distinct station codes are
+    copied to `stations` in code order, every row is copied as (station key, date,
+    integer tenths), and the old table is dropped. On SQLite the file is vacuumed
+    afterwards to return the freed pages.
+
+    Returns:
+        int: Rows converted, or None if the table already has the new layout.
+    """
+    engine = db.engine
+    with engine.begin() as connection:
+        if not has_legacy_weather_table(connection):
+            return None
+
+        connection.execute(text('ALTER TABLE weather_data RENAME TO weather_data_legacy'))
+        if engine.dialect.name == 'postgresql':
+            # Constraint and index names stay with the renamed table; free them for the new one
+            connection.execute(text('ALTER INDEX IF EXISTS weather_data_pkey RENAME TO weather_data_legacy_pkey'))
+            connection.execute(text('ALTER TABLE weather_data_legacy DROP CONSTRAINT IF EXISTS uix_station_date'))
+        elif engine.dialect.name == 'sqlite':
+            connection.execute(text('DROP INDEX IF EXISTS uix_station_date'))
+
+        Station.__table__.create(connection, checkfirst=True)
+        WeatherData.__table__.create(connection)
+
+        legacy = _legacy_weather_data
+        known = select(Station.code)
+        connection.execute(insert(Station).from_select(
+            ['code'],
+            select(legacy.c.station_id).where(legacy.c.station_id.not_in(known))
+            .group_by(legacy.c.station_id).order_by(legacy.c.station_id)
+        ))
+
+        def tenths(value):
+            return cast(func.round(value * 10), Integer)
+
+        converted = connection.execute(insert(WeatherData).from_select(
+            ['station_key', 'date', 'max_temp_tenths', 'min_temp_tenths', 'precipitation_tenths'],
+            select(Station.id, legacy.c.date, tenths(legacy.c.max_temp), tenths(legacy.c.min_temp),
+                   tenths(legacy.c.precipitation))
+            .join(Station, Station.code == legacy.c.station_id)
+        )).rowcount
+
+        connection.execute(text('DROP TABLE weather_data_legacy'))
+
+    if engine.dialect.name == 'sqlite':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text('VACUUM'))
+
+    logging.info(f"Converted {converted} weather rows to the normalized schema")
+    return converted
@@ -0,0 +1,147 @@
+from datetime import date, timedelta
+import numpy as np
+from app.colstore import columnar_enabled, get_store, read_station_columns
+from app.parser import MISSING_MAX_TEMP, MISSING_MIN_TEMP, MISSING_PRECIPITATION
+
+METHODS = ('lttb', 'minmax')
+
+# Column of `StationColumns` and missing bit of each measure
+MEASURES = {
+    'max_temp': MISSING_MAX_TEMP,
+    'min_temp': MISSING_MIN_TEMP,
+    'precipitation': MISSING_PRECIPITATION,
+}
+
+
+def station_columns(station_id, start=None, end=None):
+    """
+    Return a station's columns between two dates, from the columnar store if it is the
+    read engine and has the station, otherwise from `weather_data`.
+
+    Args:
+        station_id (str): Identifier for the weather station.
+        start (date, optional): First date, inclusive. Defaults to the first row.
+        end (date, optional): Last date, inclusive. Defaults to the last row.
+
+    Returns:
+        StationColumns: Columns sorted by date.
+    """
+    if columnar_enabled():
+        store = get_store()
+        station = store.station(station_id)
+        if station is not None:
+            first, stop = store.date_range(station, start, end)
+            return type(station)(*(column[first:stop] for column in station))
+    return read_station_columns(station_id, start - timedelta(days=1) if start else None, end)
+
+
+def lttb(x, y, points):
+    """
+    Select the points of a series to keep with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept; the others are split into `points - 2` buckets
+    of equal size, and each bucket keeps the point forming the largest triangle with the
+    point kept from the previous bucket and the average of the next bucket. Bucket
+    averages are computed for all buckets at once; only the selection walks the buckets.
+
+    Args:
+        x (ndarray): Ascending x values (date ordinals).
+        y (ndarray): Values, without NaN.
+        points (int): Number of points to keep, at least 3.
+
+    Returns:
+        ndarray: Indexes of the kept points, ascending.
+    """
+    size = len(x)
+    if points >= size:
+        return np.arange(size)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    every = (size - 2) / (points - 2)
+    starts = (np.arange(points - 2) * every).astype(np.int64) + 1
+    ends = np.append(starts[1:], size - 1)
+    lengths = ends - starts
+    averages_x = np.add.reduceat(x[:size - 1], starts) / lengths
+    averages_y = np.add.reduceat(y[:size - 1], starts) / lengths
+    # Each bucket looks ahead to the next bucket's average, the last one to the last point
+    next_x = np.append(averages_x[1:], x[-1])
+    next_y = np.append(averages_y[1:], y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = starts[bucket], ends[bucket]
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - next_x[bucket]) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y[bucket] - ay))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax(x, y, points):
+    """
+    Select the points of a series to keep with min/max bucketing.
+
+    The series is split into `points // 2` buckets of equal size and each bucket keeps
+    its lowest and highest point, so peaks are never smoothed away. The first and last
+    points are kept too, so the chart spans the whole range.
+
+    Args:
+        x (ndarray): Ascending x values (date ordinals).
+        y (ndarray): Values, without NaN.
+        points (int): Number of points to keep, at least 2.
+
+    Returns:
+        ndarray: Indexes of the kept points, ascending.
+    """
+    size = len(x)
+    if points >= size:
+        return np.arange(size)
+
+    buckets = np.arange(size) * (points // 2) // size
+    # Sorted by bucket then value, each bucket's run starts with its min and ends with its max
+    order = np.lexsort((y, buckets))
+    firsts = np.flatnonzero(np.diff(buckets[order], prepend=-1))
+    lasts = np.append(firsts[1:], size) - 1
+    return np.unique(np.concatenate([order[firsts], order[lasts], [0, size - 1]]))
+
+
+def downsample(columns, measure, points, method='lttb'):
+    """
+    Downsample one measure of a station's columns to about `points` points.
+
+    Missing values are left out before the points are selected, so they are never
+    plotted as zeros. Where the series has a gap wider than a bucket, the points either
+    side of it are kept and a point with a null value is inserted after the first, so
+    charts break the line instead of drawing across the gap.
+
+    Args:
+        columns (StationColumns): Columns sorted by date.
+        measure (str): 'max_temp', 'min_temp' or 'precipitation'.
+        points (int): Number of points wanted, at least 3.
+        method (str, optional): 'lttb' or 'minmax'. Defaults to 'lttb'.
+
+    Returns:
+        dict: `data` as a list of {date, value}, and the number of `source_points`
+              (non-missing values) and `missing` values in the range.
+    """
+    valid = (columns.missing & MEASURES[measure]) == 0
+    x = np.asarray(columns.dates)[valid]
+    y = np.asarray(getattr(columns, measure))[valid]
+
+    keep = (lttb if method == 'lttb' else minmax)(x, y, points)
+    gaps = np.zeros(0, dtype=np.int64)
+    if len(x) > 1:
+        width = max(1.0, (x[-1] - x[0]) / points)
+        gaps = np.flatnonzero(np.diff(x) > width)
+        keep = np.union1d(keep, np.concatenate([gaps, gaps + 1]))
+
+    data = [{'date': date.fromordinal(int(x[index])).isoformat(), 'value': int(y[index]) / 10} for index in keep]
+    # Null markers, from the last gap so earlier positions stay valid
+    positions = np.searchsorted(keep, gaps)
+    for gap, position in zip(gaps[::-1], positions[::-1]):
+        data.insert(int(position) + 1, {'date': date.fromordinal(int(x[gap]) + 1).isoformat(), 'value': None})
+
+    return {'data': data, 'source_points': int(valid.sum()), 'missing': int(len(valid) - valid.sum())}
@@ -0,0 +1,251 @@
+import operator
+import numpy as np
+from flask import current_app
+from sqlalchemy import Integer, cast, delete, func, insert, select, tuple_
+from app import db
+from app.models import Station, StatsDirtyPartition, WeatherStatsSketch
+from app.partitioning import partition_scopes
+
+MEASURES = ('max_temp', 'min_temp', 'precipitation')
+
+DEFAULT_PERCENTILES = (5, 50, 95)
+
+_OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+# Stored values are int16 tenths; merging counts them in one bin per possible value
+_OFFSET = 32768
+
+
+class ValueHistogram:
+    """
+    Mergeable sketch of a distribution of daily values: the count of each distinct value.
+
+    Values are integer tenths in a small range, so unlike a t-digest or KLL sketch
+    nothing is approximated: percentiles, extremes and threshold counts are exact, while
+    the size is bounded by the number of distinct values (a few hundred per
+    station-year, and at most a few thousand however many sketches are merged).
+
+    Attributes:
+        values (ndarray): Distinct values in tenths, ascending (int16).
+        counts (ndarray): Occurrences of each value (int64).
+    """
+
+    def __init__(self, values=None, counts=None):
+        self.values = np.zeros(0, dtype=np.int16) if values is None else values
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else counts
+
+    @classmethod
+    def of(cls, tenths):
+        """Build the sketch of an array of values in tenths."""
+        values, counts = np.unique(np.asarray(tenths, dtype=np.int16), return_counts=True)
+        return cls(values, counts.astype(np.int64))
+
+    @classmethod
+    def merge(cls, sketches):
+        """Combine sketches, as if built from all of their values at once."""
+        sketches = [sketch for sketch in sketches if sketch is not None and len(sketch.values)]
+        if not sketches:
+            return cls()
+        bins = np.bincount(
+            np.concatenate([sketch.values for sketch in sketches]).astype(np.int64) + _OFFSET,
+            weights=np.concatenate([sketch.counts for sketch in sketches]),
+            minlength=2 * _OFFSET
+        )
+        values = np.nonzero(bins)[0]
+        return cls((values - _OFFSET).astype(np.int16), bins[values].astype(np.int64))
+
+    def to_bytes(self):
+        """Serialize as the int16 values followed by their uint32 counts, little-endian."""
+        return self.values.astype('<i2').tobytes() + self.counts.astype('<u4').tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load a sketch serialized by `to_bytes`; None for a missing sketch."""
+        if data is None:
+            return None
+        size = len(data) // 6
+        return cls(np.frombuffer(data, '<i2', size).astype(np.int16),
+                   np.frombuffer(data, '<u4', size, offset=2 * size).astype(np.int64))
+
+    @property
+    def count(self):
+        """Number of values sketched."""
+        return int(self.counts.sum())
+
+    def quantile(self, q):
+        """
+        Return a quantile, interpolated like `numpy.percentile`.
+
+        Args:
+            q (float): Quantile between 0 and 1.
+
+        Returns:
+            float: The quantile in tenths, or None for an empty sketch.
+        """
+        total = self.count
+        if not total:
+            return None
+        cumulative = np.cumsum(self.counts)
+        position = q * (total - 1)
+        lower, upper = (self.values[np.searchsorted(cumulative, rank, side='right')]
+                        for rank in (np.floor(position), np.ceil(position)))
+        return float(lower) + (float(upper) - float(lower)) * (position - np.floor(position))
+
+    def count_where(self, op, threshold):
+        """
+        Count the values satisfying a comparison.
+
+        Args:
+            op (str): '<', '<=', '>' or '>='.
+            threshold (float): Value compared against, in tenths.
+
+        Returns:
+            int: Number of values `value <op> threshold`.
+        """
+        return int(self.counts[_OPERATORS[op](self.values, threshold)].sum())
+
+
+def _sketch_row(codes, data):
+    """Build the `WeatherStatsSketch` row of one station-year's (station_key, year, *measures) rows."""
+    sketch = {'station_id': codes[int(data[0, 0])], 'year': int(data[0, 1])}
+    for index, measure in enumerate(MEASURES):
+        values = data[:, 2 + index]
+        values = values[~np.isnan(values)]
+        sketch[f'{measure}_sketch'] = ValueHistogram.of(values).to_bytes() if len(values) else None
+    return sketch
+
+
+def update_sketches(partitions=None):
+    """
+    Rebuild the value sketches of station-years from `weather_data`.
+
+    Rows are read in primary key order, so each station-year is sketched as soon as its
+    rows have been read and memory stays bounded by one station-year. The caller commits.
+
+    Args:
+        partitions (list, optional): (station_id, year) pairs marked dirty, still present
+                                     in `weather_stats_dirty`. Defaults to every station-year.
+    """
+    years = None if partitions is None else {year for _, year in partitions}
+    codes = dict(db.session.execute(select(Station.id, Station.code)).all())
+
+    sketches = []
+    for table, partition in partition_scopes(years):
+        year = cast(func.extract('year', table.c.date), Integer)
+        query = select(table.c.station_key, year, *(table.c[f'{measure}_tenths'] for measure in MEASURES))
+        if partition is not None:
+            query = query.where(table.c.date >= partition.start, table.c.date < partition.end)
+        if partitions is not None:
+            # Seek each dirty station-year like `calculate_weather_stats`
+            query = query.join(Station, Station.id == table.c.station_key).join(
+                StatsDirtyPartition,
+                (StatsDirtyPartition.station_id == Station.code)
+                & (table.c.date >= StatsDirtyPartition.start_date)
+                & (table.c.date < StatsDirtyPartition.end_date)
+            )
+        result = db.session.execute(query.order_by(table.c.station_key, table.c.date))
+
+        pending = np.zeros((0, 2 + len(MEASURES)))
+        for chunk in result.partitions(50000):
+            # Missing values are NULL, read as NaN and left out
+            data = np.concatenate([pending, np.array([tuple(row) for row in chunk], dtype=np.float64)])
+            starts = np.flatnonzero(np.any(np.diff(data[:, :2], axis=0) != 0, axis=1)) + 1
+            bounds = [0, *starts, len(data)]
+            # The last station-year may continue in the next chunk
+            for start, end in zip(bounds[:-2], bounds[1:-1]):
+                sketches.append(_sketch_row(codes, data[start:end]))
+            pending = data[bounds[-2]:]
+        if len(pending):
+            sketches.append(_sketch_row(codes, pending))
+
+    stmt = delete(WeatherStatsSketch)
+    if partitions is not None:
+        # A subquery rather than a literal pair per partition, which could exceed the bound
+        # parameter limit after a large ingest
+        dirty = select(StatsDirtyPartition.station_id, StatsDirtyPartition.year)
+        stmt = stmt.where(tuple_(WeatherStatsSketch.station_id, WeatherStatsSketch.year).in_(dirty))
+    db.session.execute(stmt)
+    if sketches:
+        db.session.execute(insert(WeatherStatsSketch.__table__), sketches)
+
+
+def load_sketches(station_years):
+    """
+    Load the sketches of station-years.
+
+    Args:
+        station_years (iterable): (station_id, year) pairs.
+
+    Returns:
+        dict: `WeatherStatsSketch` rows by (station_id, year), for the pairs that have one.
+    """
+    wanted = set(station_years)
+    if not wanted:
+        return {}
+    # Separate IN lists on both key columns are primary key seeks (a row-value IN is not)
+    query = select(WeatherStatsSketch).where(
+        WeatherStatsSketch.station_id.in_(sorted({station_id for station_id, _ in wanted})),
+        WeatherStatsSketch.year.in_(sorted({year for _, year in wanted}))
+    )
+    return {(row.station_id, row.year): row for row in db.session.scalars(query)
+            if (row.station_id, row.year) in wanted}
+
+
+def describe(rows, percentiles=DEFAULT_PERCENTILES):
+    """
+    Summarize the merged distribution of one or more station-years.
+
+    Args:
+        rows (iterable): `WeatherStatsSketch` rows to merge.
+        percentiles (iterable, optional): Percentiles to report, 0 to 100.
+                                          Defaults to 5, 50 and 95.
+
+    Returns:
+        dict: For max_temp, min_temp and precipitation the count, min, max and
+              percentiles (keyed `p<percentile>`) in degrees Celsius and mm, and
+              `threshold_days`: days meeting each of `STATS_THRESHOLD_DAYS`.
+    """
+    rows = list(rows)
+    merged = {
+        measure: ValueHistogram.merge(ValueHistogram.from_bytes(getattr(row, f'{measure}_sketch')) for row in rows)
+        for measure in MEASURES
+    }
+
+    def scaled(value):
+        return None if value is None else round(value / 10, 2)
+
+    summary = {}
+    for measure, sketch in merged.items():
+        empty = not len(sketch.values)
+        summary[measure] = {
+            'count': sketch.count,
+            'min': None if empty else scaled(float(sketch.values[0])),
+            'max': None if empty else scaled(float(sketch.values[-1])),
+            'percentiles': {f'p{p:g}': scaled(sketch.quantile(p / 100)) for p in percentiles}
+        }
+    summary['threshold_days'] = {
+        name: merged[measure].count_where(op, round(threshold * 10, 6))
+        for name, (measure, op, threshold) in current_app.config.get('STATS_THRESHOLD_DAYS', {}).items()
+    }
+    return summary
+
+
+def parse_percentiles(value):
+    """
+    Parse a comma-separated list of percentiles.
+
+    Args:
+        value (str): e.g. "5,50,95"; empty for the defaults.
+
+    Returns:
+        tuple: Percentiles as floats.
+
+    Raises:
+        ValueError: If a percentile is not a number between 0 and 100.
+    """
+    if not value:
+        return DEFAULT_PERCENTILES
+    percentiles = tuple(float(p) for p in value.split(','))
+    if any(not 0 <= p <= 100 for p in percentiles):
+        raise ValueError("percentiles must be between 0 and 100")
+    return percentiles
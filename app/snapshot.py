@@ -0,0 +1,89 @@
+from datetime import timedelta
+from sqlalchemy import select
+from app import db
+from app.models import Station
+from app.partitioning import source_scopes
+
+MEASURES = ('max_temp', 'min_temp', 'precipitation')
+
+
+def snapshot_rows(start, end):
+    """
+    Read every station's weather for each day of a date range.
+
+    The date bounds are a seek on `ix_weather_data_date` (one per partition with date
+    partitioning), so the cost follows the number of rows returned, not the table size.
+
+    Args:
+        start (date): First day, inclusive.
+        end (date): Last day, inclusive.
+
+    Returns:
+        dict: Records of each day by date, each a dict with `station_id` and the measures
+              (None where missing), ordered by station.
+    """
+    days = {}
+    for source, first, last in source_scopes(start, end):
+        query = (
+            select(source.date, Station.code, source.max_temp_tenths, source.min_temp_tenths,
+                   source.precipitation_tenths)
+            .join(Station, Station.id == source.station_key)
+            .where(source.date >= first, source.date <= last)
+            .order_by(source.date, Station.code)
+        )
+        for day, code, *values in db.session.execute(query):
+            record = {'station_id': code}
+            for measure, value in zip(MEASURES, values):
+                # Stored tenths back to degrees Celsius and mm
+                record[measure] = None if value is None else value / 10
+            days.setdefault(day, []).append(record)
+    return days
+
+
+def summarize(records):
+    """
+    Compute the cross-station mean, min and max of a day's records.
+
+    Args:
+        records (list): Records returned by `snapshot_rows` for one day.
+
+    Returns:
+        dict: For each measure the `count` of stations with a value and their `mean`,
+              `min` and `max` (None without values).
+    """
+    summary = {}
+    for measure in MEASURES:
+        values = [record[measure] for record in records if record[measure] is not None]
+        summary[measure] = {
+            'count': len(values),
+            'mean': round(sum(values) / len(values), 2) if values else None,
+            'min': min(values) if values else None,
+            'max': max(values) if values else None,
+        }
+    return summary
+
+
+def snapshot(start, end, summary=False):
+    """
+    Build the snapshots of every day of a date range.
+
+    Args:
+        start (date): First day, inclusive.
+        end (date): Last day, inclusive.
+        summary (bool, optional): Add each day's `summarize` result. Defaults to False.
+
+    Returns:
+        list: One dict per day, in date order and including days without data, with the
+              `date`, the `stations` records and optionally the `summary`.
+    """
+    rows = snapshot_rows(start, end)
+    days = []
+    day = start
+    while day <= end:
+        records = rows.get(day, [])
+        snapshot_day = {'date': day.isoformat(), 'stations': records}
+        if summary:
+            snapshot_day['summary'] = summarize(records)
+        days.append(snapshot_day)
+        day += timedelta(days=1)
+    return days
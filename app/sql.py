@@ -0,0 +1,54 @@
+import json
+from sqlalchemy import cast, func, literal, select, values
+
+
+def dialect_insert(table, dialect_name):
+    """
+    Return a dialect-specific INSERT construct that supports `ON CONFLICT` clauses.
+
+    Args:
+        table (Table): The table to insert into.
+        dialect_name (str): SQLAlchemy dialect name, e.g. `db.engine.dialect.name`.
+
+    Returns:
+        Insert: A SQLite or PostgreSQL insert, or None if the dialect has no native upsert.
+    """
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(table)
+
+
+def json_rows(rows, columns, name, dialect_name):
+    """
+    Return a CTE of literal rows that are sent to the database as a single JSON parameter.
+
+    Unlike a VALUES list with one bound parameter per value, the statement is the same
+    whatever the number of rows, so it is compiled once and cached, and large row sets
+    stay under the database's bound parameter limit.
+
+    Args:
+        rows (list): Rows of values: numbers, strings, None or dates (sent as ISO strings).
+        columns (list): `column()` objects naming and typing the values of each row.
+        name (str): Name of the CTE.
+        dialect_name (str): SQLAlchemy dialect name, e.g. `db.engine.dialect.name`.
+
+    Returns:
+        CTE: The rows, with one column per entry of `columns`.
+    """
+    if dialect_name == 'sqlite':
+        elements = func.json_each(literal(json.dumps(rows, default=str))).table_valued('value')
+        fields = [func.json_extract(elements.c.value, f'$[{i}]', type_=column.type).label(column.name)
+                  for i, column in enumerate(columns)]
+    elif dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import JSONB
+        elements = func.jsonb_array_elements(cast(literal(json.dumps(rows, default=str)), JSONB)).table_valued('value')
+        fields = [cast(elements.c.value.op('->>')(i), column.type).label(column.name)
+                  for i, column in enumerate(columns)]
+    else:
+        # Portable, but compiled anew for every statement
+        return values(*columns, name=name).data([tuple(row) for row in rows]).cte()
+    return select(*fields).cte(name)
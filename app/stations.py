@@ -0,0 +1,124 @@
+import os
+import re
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Station, WeatherData
+from app.sql import dialect_insert
+
+# Station identifiers that can name a file of the on-disk views
+_FILE_SAFE_CODE = re.compile(r'[A-Za-z0-9_-]+')
+
+
+def station_key(code, create=True):
+    """
+    Return the surrogate key of a station, creating the station if needed.
+
+    Used by the bulk write paths, which address `weather_data` by key directly.
+
+    Args:
+        code (str): Station identifier (e.g. `USC00110072`).
+        create (bool, optional): Insert the station if it does not exist. Defaults to True.
+
+    Returns:
+        int: The station key, or None if the station does not exist and `create` is False.
+    """
+    query = select(Station.id).where(Station.code == code)
+    key = db.session.execute(query).scalar()
+    if key is not None or not create:
+        return key
+
+    stmt = dialect_insert(Station.__table__, db.engine.dialect.name)
+    if stmt is None:
+        db.session.execute(Station.__table__.insert(), {'code': code})
+    else:
+        # Another writer may have added the station since the lookup
+        db.session.execute(stmt.on_conflict_do_nothing(), {'code': code})
+    return db.session.execute(query).scalar()
+
+
+def station_codes():
+    """
+    Return the codes of every known station.
+
+    Returns:
+        list: Station identifiers sorted by code.
+    """
+    return list(db.session.execute(select(Station.code).order_by(Station.code)).scalars())
+
+
+def station_keys(codes, chunk_size=1000):
+    """
+    Look up the surrogate keys of many stations at once.
+
+    Args:
+        codes (iterable): Station identifiers.
+        chunk_size (int, optional): Codes per `IN` list, below the database's bound
+                                    parameter limit. Defaults to 1000.
+
+    Returns:
+        dict: Key of each station that exists, by code.
+    """
+    codes = sorted(set(codes))
+    keys = {}
+    for start in range(0, len(codes), chunk_size):
+        query = select(Station.code, Station.id).where(Station.code.in_(codes[start:start + chunk_size]))
+        keys.update((code, key) for code, key in db.session.execute(query))
+    return keys
+
+
+def station_file(directory, code, extension):
+    """
+    Return the path of a station's file in one of the on-disk views.
+
+    Codes come from query arguments, so only letters, digits, '_' and '-' may name a
+    file; anything else (path separators, dots) could reach outside `directory`.
+
+    Args:
+        directory (str): Directory of the view.
+        code (str): Station identifier.
+        extension (str): File extension, including the dot.
+
+    Returns:
+        str: The path, or None if the code cannot name a file.
+    """
+    if not isinstance(code, str) or not _FILE_SAFE_CODE.fullmatch(code):
+        return None
+    return os.path.join(directory, code + extension)
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_files_stale_on_flush(session, flush_context):
+    """Note stations whose on-disk view files ORM writes to `WeatherData` leave stale."""
+    codes = {
+        obj.station_id
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        if isinstance(obj, WeatherData) and obj.station_id is not None
+    }
+    if codes:
+        session.info.setdefault('stale_station_files', set()).update(codes)
+
+
+@event.listens_for(Session, 'after_commit')
+def _discard_stale_files_on_commit(session):
+    """
+    Remove the view files of stations written through the ORM, which only ingestion
+    rebuilds (see `app.ingestion.refresh_station_views`); until then they are read from SQL.
+    """
+    codes = session.info.pop('stale_station_files', None)
+    if not codes:
+        return
+    # Loaded here rather than at startup, as they bring in numpy
+    from app.colstore import discard_station
+    from app.prefix_index import discard_station as discard_prefix_sums
+    from app.cache import bump_generation
+    for code in sorted(codes):
+        discard_station(code)
+        discard_prefix_sums(code)
+    # Responses cached from the old files before they were removed are stale
+    bump_generation()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_stale_files_on_rollback(session):
+    session.info.pop('stale_station_files', None)
@@ -0,0 +1,125 @@
+import os
+import weakref
+from functools import partial, wraps
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+
+# Engines whose pools are dropped in forked children, see `_dispose_after_fork`
+_engines = weakref.WeakSet()
+
+
+def _dispose_after_fork():
+    """
+    Drop the connection pools inherited by a forked process (e.g. a gunicorn worker of a
+    preloaded app), so the child opens its own connections instead of sharing sockets
+    and SQLite file handles with its parent.
+    """
+    for engine in list(_engines):
+        engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+def storage_profile(app=None):
+    """
+    Return the configured storage profile.
+
+    Args:
+        app (Flask, optional): Application to read the config from. Defaults to the current app.
+
+    Returns:
+        dict: The `STORAGE_PROFILES` entry named by `STORAGE_PROFILE`, or an empty dict
+              if no profile is set.
+
+    Raises:
+        ValueError: If `STORAGE_PROFILE` is not a key of `STORAGE_PROFILES`.
+    """
+    config = (app or current_app).config
+    name = config.get('STORAGE_PROFILE')
+    if name is None:
+        return {}
+    profiles = config.get('STORAGE_PROFILES', {})
+    if name not in profiles:
+        raise ValueError(f"STORAGE_PROFILE must be one of {tuple(profiles)} or None, not {name!r}")
+    return profiles[name]
+
+
+def configure_engines(app):
+    """
+    Apply the storage profile's engine options to the config.
+
+    Must run before `db.init_app`, which creates the engine. Options set directly in
+    `SQLALCHEMY_ENGINE_OPTIONS` take precedence over the profile's.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    options = dict(storage_profile(app).get('engine_options', {}))
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def _set_pragmas(pragmas, dbapi_connection, connection_record):
+    """Run the profile's PRAGMA statements on a new SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+def init_storage(app):
+    """
+    Set up the app's engines for the storage profile, and the read replica engine if
+    `READ_REPLICA_URI` is set.
+
+    The replica is not a Flask-SQLAlchemy bind, as no table belongs to it alone; it is
+    created with the same engine options and kept in `app.extensions['read_replica']`.
+    The profile's `sqlite_pragmas` run once on each new SQLite connection, in order, so
+    pooled connections pay for them only when opened. Every engine's pool is also
+    dropped in forked children.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    pragmas = storage_profile(app).get('sqlite_pragmas')
+    with app.app_context():
+        engines = list(app.extensions['sqlalchemy'].engines.values())
+    if app.config.get('READ_REPLICA_URI'):
+        replica = create_engine(app.config['READ_REPLICA_URI'], **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        app.extensions['read_replica'] = replica
+        engines.append(replica)
+    for engine in engines:
+        if pragmas and engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', partial(_set_pragmas, pragmas))
+        _engines.add(engine)
+
+
+def read_from_primary(f):
+    """Resource method decorator keeping a GET on the primary, for data that must not lag."""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        g.read_from_primary = True
+        return f(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """
+    Session sending the queries of GET requests to the read replica, if one is configured.
+
+    Flushes, requests with other methods, code outside requests (CLI, background jobs)
+    and resources decorated with `read_from_primary` use the primary database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and has_request_context()
+                and request.method in ('GET', 'HEAD') and not g.get('read_from_primary')):
+            replica = current_app.extensions.get('read_replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
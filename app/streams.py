@@ -0,0 +1,121 @@
+import io
+import os
+import gzip
+import logging
+import tarfile
+import zipfile
+from app.parser import parse_weather_bytes
+
+# Extensions of sources that are streamed by `app.ingestion.ingest_stream` rather than read as plain files
+ARCHIVE_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.zip', '.gz')
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZIP_MAGIC = b'PK\x03\x04'
+_TAR_MAGIC_OFFSET = 257
+
+
+def is_archive(path):
+    """True if `path` names an archive or compressed file rather than a plain station file."""
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def iter_members(fileobj, name, file_extension='.txt'):
+    """
+    Yield the station files contained in a byte stream, without extracting anything to disk.
+
+    The format is detected from the content: a zip archive, a tar archive (optionally
+    gzip-compressed) or a single gzip-compressed or plain station file. Tar streams are
+    read sequentially, so they also work from a pipe; zip archives need a seekable file.
+
+    Args:
+        fileobj (file): Binary stream to read.
+        name (str): Name of the stream (file path, or the station file name for stdin).
+        file_extension (str, optional): Archive members not ending with this are skipped.
+                                        Defaults to ".txt".
+
+    Yields:
+        tuple: (member name, binary stream of the member's content). Each stream is only
+               valid until the next member is requested.
+
+    Raises:
+        ValueError: If a zip archive is given as a non-seekable stream.
+    """
+    stream = fileobj if hasattr(fileobj, 'peek') else io.BufferedReader(fileobj)
+    head = stream.peek(4)[:4]
+
+    if head.startswith(_ZIP_MAGIC):
+        if not fileobj.seekable():
+            raise ValueError(f"{name}: zip archives must be read from a file, not a pipe")
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.endswith(file_extension):
+                    with archive.open(info) as member:
+                        yield info.filename, member
+        return
+
+    if head.startswith(_GZIP_MAGIC):
+        stream = io.BufferedReader(gzip.GzipFile(fileobj=stream))
+        if name.endswith('.gz'):
+            name = name[:-3]
+
+    header = stream.peek(_TAR_MAGIC_OFFSET + 5)
+    if header[_TAR_MAGIC_OFFSET:_TAR_MAGIC_OFFSET + 5] == b'ustar':
+        with tarfile.open(fileobj=stream, mode='r|') as archive:
+            for member in archive:
+                if member.isfile() and member.name.endswith(file_extension):
+                    yield member.name, archive.extractfile(member)
+        return
+
+    yield name, stream
+
+
+def iter_parsed_blocks(stream, block_size, name=None):
+    """
+    Parse a station file in blocks of about `block_size` bytes.
+
+    Each block ends on a line boundary, so memory stays bounded by the block size
+    whatever the size of the file. Line numbers continue across blocks.
+
+    Args:
+        stream (file): Binary stream of one station file.
+        block_size (int): Bytes to read per block.
+        name (str, optional): Name used when logging rejected lines.
+
+    Yields:
+        ParsedWeatherFile: The rows of each block.
+    """
+    first_line = 1
+    carry = b''
+    while True:
+        chunk = stream.read(block_size)
+        data = carry + chunk
+        if chunk:
+            cut = data.rfind(b'\n') + 1
+            if not cut:
+                # No complete line yet, keep reading
+                carry = data
+                continue
+            data, carry = data[:cut], data[cut:]
+        elif not data:
+            return
+
+        parsed = parse_weather_bytes(data, first_line)
+        for line_number, line, reason in parsed.rejects:
+            logging.warning(f"Skipping invalid line {line_number} in file {name}: {line} - {reason}")
+        first_line += data.count(b'\n') + (0 if data.endswith(b'\n') else 1)
+        yield parsed
+        if not chunk:
+            return
+
+
+def station_id_from_member(member_name):
+    """
+    Derive the station ID from a member name, like `station_id_from_path` does for files.
+
+    Args:
+        member_name (str): Path of the member inside the archive (e.g. `wx_data/USC00110072.txt`).
+
+    Returns:
+        str: The station ID.
+    """
+    return os.path.basename(member_name).split('.')[0]
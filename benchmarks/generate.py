@@ -0,0 +1,130 @@
+import os
+import argparse
+from datetime import date
+import numpy as np
+
+# Station file names follow wx_data (e.g. USC00110072.txt)
+STATION_PREFIX = 'USC'
+
+
+def station_ids(stations):
+    """
+    Return the synthetic station IDs for an archive of `stations` stations.
+
+    Args:
+        stations (int): Number of stations.
+
+    Returns:
+        list: Station IDs in file order.
+    """
+    return [f'{STATION_PREFIX}{index:08d}' for index in range(stations)]
+
+
+def station_lines(rng, first_year, years, missing_ratio, start=None):
+    """
+    Generate the lines of one station file.
+
+    Temperatures follow a seasonal cycle with noise and precipitation is zero on most
+    days; each value is independently replaced by -9999 with probability `missing_ratio`.
+
+    Args:
+        rng (Generator): Seeded NumPy random generator.
+        first_year (int): First year of the series.
+        years (int): Number of years.
+        missing_ratio (float): Probability of a value being missing.
+        start (date, optional): First day, for appending to an existing file.
+                                Defaults to January 1 of `first_year`.
+
+    Returns:
+        str: Tab separated lines in the wx_data format, newline terminated.
+    """
+    start = start or date(first_year, 1, 1)
+    end = date(first_year + years, 1, 1)
+    days = np.arange(np.datetime64(start), np.datetime64(end), dtype='datetime64[D]')
+    if not len(days):
+        return ''
+
+    day_of_year = (days - days.astype('datetime64[Y]')).astype(np.int64)
+    season = np.sin(2 * np.pi * (day_of_year - 105) / 365.25)
+    max_temp = np.round(150 + 150 * season + rng.normal(0, 40, len(days))).astype(np.int64)
+    min_temp = max_temp - np.round(np.abs(rng.normal(100, 30, len(days)))).astype(np.int64)
+    precipitation = np.where(rng.random(len(days)) < 0.3, np.round(rng.exponential(60, len(days))), 0).astype(np.int64)
+
+    columns = [max_temp, min_temp, precipitation]
+    for column in columns:
+        column[rng.random(len(days)) < missing_ratio] = -9999
+
+    yyyymmdd = np.char.replace(np.datetime_as_string(days, unit='D'), '-', '')
+    return ''.join(
+        f'{day}\t{high}\t{low}\t{rain}\n'
+        for day, high, low, rain in zip(yyyymmdd.tolist(), *(column.tolist() for column in columns))
+    )
+
+
+def generate_archive(directory, stations, years, missing_ratio=0.01, first_year=1985, seed=0):
+    """
+    Write a wx_data-style archive of synthetic station files.
+
+    The output is fully determined by the arguments, so benchmark runs are reproducible.
+
+    Args:
+        directory (str): Output directory, created if needed.
+        stations (int): Number of station files.
+        years (int): Years of daily data per station.
+        missing_ratio (float, optional): Probability of each value being missing. Defaults to 0.01.
+        first_year (int, optional): First year of every series. Defaults to 1985.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: Paths of the written files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index, station_id in enumerate(station_ids(stations)):
+        rng = np.random.default_rng([seed, index])
+        path = os.path.join(directory, f'{station_id}.txt')
+        with open(path, 'w') as file:
+            file.write(station_lines(rng, first_year, years, missing_ratio))
+        paths.append(path)
+    return paths
+
+
+def append_days(path, days, missing_ratio=0.01, seed=0):
+    """
+    Append the days following the last line of a station file.
+
+    Args:
+        path (str): Station file to extend.
+        days (int): Number of days to append.
+        missing_ratio (float, optional): Probability of each value being missing. Defaults to 0.01.
+        seed (int, optional): Random seed. Defaults to 0.
+    """
+    with open(path, 'rb') as file:
+        file.seek(max(0, os.path.getsize(path) - 64))
+        last = file.read().splitlines()[-1].split(b'\t')[0].decode()
+
+    start = date(int(last[:4]), int(last[4:6]), int(last[6:])).toordinal() + 1
+    first = date.fromordinal(start)
+    end = date.fromordinal(start + days)
+    lines = station_lines(np.random.default_rng([seed, start]), first.year, end.year - first.year + 1,
+                          missing_ratio, start=first)
+    with open(path, 'a') as file:
+        file.write(''.join(lines.splitlines(keepends=True)[:days]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic wx_data-style station archive.')
+    parser.add_argument('directory', help='Output directory')
+    parser.add_argument('--stations', type=int, default=167, help='Number of station files (default 167)')
+    parser.add_argument('--years', type=int, default=30, help='Years of daily data per station (default 30)')
+    parser.add_argument('--missing', type=float, default=0.01, help='Probability of a missing value (default 0.01)')
+    parser.add_argument('--first-year', type=int, default=1985, help='First year of every series (default 1985)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default 0)')
+    args = parser.parse_args(argv)
+
+    paths = generate_archive(args.directory, args.stations, args.years, args.missing, args.first_year, args.seed)
+    print(f"Wrote {len(paths)} station files to {args.directory}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+import gc
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import tempfile
+from datetime import datetime, timezone
+import numpy as np
+from app import create_app, db
+from app.ingestion import ingest_weather_data
+from app.analysis import calculate_weather_stats
+from benchmarks.generate import generate_archive, append_days
+
+# Pages of the API scenarios; each is timed at these cursor depths
+DEFAULT_DEPTHS = (1, 10, 100)
+DEFAULT_PAGE_SIZE = 100
+
+# Storage profile the scenarios run under, pinned so a change of the production default
+# does not silently move every metric; results are only compared at the same profile
+DEFAULT_STORAGE_PROFILE = 'sqlite-wal'
+
+# Run settings a baseline must share with the results to be compared
+_COMPARABLE = ('stations', 'years', 'missing_ratio', 'seed', 'storage_profile')
+
+
+def _timed(function, *args, **kwargs):
+    """Call `function` and return (result, elapsed seconds)."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _latency(client, url, requests, warmup=5):
+    """Return p50 and p99 latency in milliseconds of `requests` GETs of `url`."""
+    for _ in range(warmup):
+        client.get(url)
+
+    # Collector pauses would dominate the tail of such short requests
+    gc.collect()
+    gc.disable()
+    samples = []
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = client.get(url)
+            samples.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {url} returned {response.status_code}")
+    finally:
+        gc.enable()
+    p50, p99 = np.percentile(samples, [50, 99])
+    return round(float(p50), 4), round(float(p99), 4)
+
+
+def _cursor_at_depth(client, endpoint, depth, page_size):
+    """Follow `X-Next-Cursor` to the page at `depth`, returning its URL or None if there are fewer pages."""
+    url = f'{endpoint}?limit={page_size}'
+    for _ in range(depth - 1):
+        cursor = client.get(url).headers.get('X-Next-Cursor')
+        if cursor is None:
+            return None
+        url = f'{endpoint}?limit={page_size}&cursor={cursor}'
+    return url
+
+
+def run_benchmarks(workdir, stations, years, missing_ratio=0.01, seed=0, requests=200,
+                   depths=DEFAULT_DEPTHS, page_size=DEFAULT_PAGE_SIZE, append=30,
+                   storage_profile=DEFAULT_STORAGE_PROFILE):
+    """
+    Run the benchmark scenarios against a synthetic archive in `workdir`.
+
+    Scenarios, in order: full ingest, full stats rebuild, re-ingest of unchanged files,
+    append to one file, incremental stats, and API latency at several cursor depths and
+    the equivalent page numbers. The response cache is disabled so every request runs
+    its queries.
+
+    Args:
+        workdir (str): Directory for the archive, database and derived files.
+        stations (int): Number of synthetic stations.
+        years (int): Years of daily data per station.
+        missing_ratio (float, optional): Probability of each value being missing. Defaults to 0.01.
+        seed (int, optional): Random seed of the generator. Defaults to 0.
+        requests (int, optional): Requests per latency measurement. Defaults to 200.
+        depths (tuple, optional): Page depths to measure. Defaults to (1, 10, 100).
+        page_size (int, optional): `limit` of the API requests. Defaults to 100.
+        append (int, optional): Days appended in the append scenario. Defaults to 30.
+        storage_profile (str, optional): `STORAGE_PROFILE` of the app, or None for the
+                                         driver defaults. Defaults to 'sqlite-wal'.
+
+    Returns:
+        dict: `meta` describing the run, `metrics` (durations, lower is better) and
+              `info` (counts and throughput, not compared).
+    """
+    archive = os.path.join(workdir, 'wx_data')
+    paths, generate_seconds = _timed(generate_archive, archive, stations, years, missing_ratio, seed=seed)
+
+    app = create_app('production', config_overrides={
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'benchmark.db')}",
+        'STORAGE_PROFILE': storage_profile,
+        'RESPONSE_CACHE_ENABLED': False,
+        'DATA_GENERATION_FILE': None,
+        'COLUMNAR_STORE_DIR': os.path.join(workdir, 'colstore'),
+        'PREFIX_INDEX_DIR': os.path.join(workdir, 'prefix')
+    })
+
+    metrics = {}
+    info = {'generate_s': round(generate_seconds, 4)}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        summary, seconds = _timed(ingest_weather_data, data_dir=archive)
+        metrics['ingest_full_s'] = seconds
+        info['rows'] = summary['inserted']
+        info['ingest_rows_per_s'] = round(summary['inserted'] / seconds)
+
+        _, metrics['stats_full_s'] = _timed(calculate_weather_stats, full=True)
+        _, metrics['ingest_unchanged_s'] = _timed(ingest_weather_data, data_dir=archive)
+
+        append_days(paths[0], append, missing_ratio, seed)
+        _, metrics['ingest_append_s'] = _timed(ingest_weather_data, filename=paths[0])
+        _, metrics['stats_incremental_s'] = _timed(calculate_weather_stats)
+
+    client = app.test_client()
+    for name, endpoint in (('weather', '/api/weather'), ('stats', '/api/weather/stats')):
+        for depth in depths:
+            url = _cursor_at_depth(client, endpoint, depth, page_size)
+            if url is None:
+                continue
+            for mode, page_url in (('cursor', url), ('page', f'{endpoint}?limit={page_size}&page={depth}')):
+                p50, p99 = _latency(client, page_url, requests)
+                metrics[f'api_{name}_{mode}_depth{depth}_p50_ms'] = p50
+                metrics[f'api_{name}_{mode}_depth{depth}_p99_ms'] = p99
+
+    return {
+        'meta': {
+            'stations': stations,
+            'years': years,
+            'missing_ratio': missing_ratio,
+            'seed': seed,
+            'requests': requests,
+            'page_size': page_size,
+            'storage_profile': storage_profile,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds')
+        },
+        'metrics': {name: round(value, 4) for name, value in metrics.items()},
+        'info': info
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_ms=1.0):
+    """
+    Compare benchmark metrics against a baseline.
+
+    A metric regresses when it is both `tolerance` slower and `min_delta_ms` slower in
+    absolute terms, so timer noise on sub-millisecond metrics does not fail the run.
+
+    Args:
+        results (dict): Output of `run_benchmarks`.
+        baseline (dict): A previous output of `run_benchmarks`.
+        tolerance (float): Allowed slowdown as a fraction (0.5 allows 50% slower).
+        min_delta_ms (float, optional): Smallest slowdown reported. Defaults to 1.0.
+
+    Returns:
+        list: (metric, baseline value, current value) for every metric over tolerance.
+    """
+    regressions = []
+    for name, expected in baseline['metrics'].items():
+        current = results['metrics'].get(name)
+        if current is None:
+            continue
+        min_delta = min_delta_ms if name.endswith('_ms') else min_delta_ms / 1000
+        if current > expected * (1 + tolerance) and current - expected > min_delta:
+            regressions.append((name, expected, current))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark ingestion, stats and API latency on a synthetic archive.')
+    parser.add_argument('--stations', type=int, default=20, help='Number of synthetic stations (default 20)')
+    parser.add_argument('--years', type=int, default=10, help='Years of daily data per station (default 10)')
+    parser.add_argument('--missing', type=float, default=0.01, help='Probability of a missing value (default 0.01)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default 0)')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per latency measurement (default 200)')
+    parser.add_argument('--workdir', help='Keep the archive and database here instead of a temporary directory')
+    parser.add_argument('--output', default='benchmark-results.json', help='Results file (default benchmark-results.json)')
+    parser.add_argument('--baseline', default=os.path.join(os.path.dirname(__file__), 'baseline.json'),
+                        help='Baseline to compare against (default benchmarks/baseline.json)')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed slowdown before failing (default 0.5)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Ignore slowdowns smaller than this (default 1.0)')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    # Per-file ingestion logs would dominate the output
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run_benchmarks(args.workdir or tmp, args.stations, args.years, args.missing, args.seed, args.requests)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(json.dumps(results['metrics'], indent=2))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if {key: baseline['meta'].get(key) for key in _COMPARABLE} != {key: results['meta'][key] for key in _COMPARABLE}:
+        print("Baseline was recorded at a different scale or storage profile; not comparing")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    for name, expected, current in regressions:
+        print(f"REGRESSION {name}: {expected} -> {current} ({current / expected:.2f}x)", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,12 +6,171 @@ class Config:
     SECRET_KEY = os.urandom(24)
     DEBUG = False
 
+    # Startup: create missing tables and run the connection and layout checks on every
+    # start. Without them (production) the schema is set up by `flask init-db` or migrations.
+    SCHEMA_AUTO_CREATE = True
+    STARTUP_CHECKS = True
+
+    # Storage profile applied to the engines: a key of STORAGE_PROFILES, or None for the
+    # driver defaults. `engine_options` are create_engine() arguments (SQLALCHEMY_ENGINE_OPTIONS
+    # takes precedence); `sqlite_pragmas` run on each new SQLite connection, in order.
+    STORAGE_PROFILE = None
+    STORAGE_PROFILES = {
+        # One SQLite file shared by the API and ingestion: readers do not block the writer
+        'sqlite-wal': {
+            'sqlite_pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'busy_timeout': 5000,
+                'cache_size': -65536,  # KiB, i.e. 64 MiB per connection
+                'mmap_size': 268435456,
+                'temp_store': 'MEMORY',
+            },
+        },
+        # API-only processes serving a SQLite file built elsewhere; writes fail
+        'sqlite-readonly': {
+            'sqlite_pragmas': {
+                'cache_size': -65536,
+                'mmap_size': 268435456,
+                'query_only': 'ON',
+            },
+        },
+        # PostgreSQL: a small per-worker pool of checked, recycled connections, with idle
+        # ones left to expire (LIFO), and a larger compiled statement cache
+        'postgresql': {
+            'engine_options': {
+                'pool_size': 5,
+                'max_overflow': 10,
+                'pool_pre_ping': True,
+                'pool_recycle': 1800,
+                'pool_use_lifo': True,
+                'query_cache_size': 1200,
+            },
+        },
+    }
+    # Database URL of a read replica; GET requests read from it, except job status
+    READ_REPLICA_URI = None
+
+    # Ingestion: batched upserts committed every INGEST_BATCH_SIZE rows
+    INGEST_BULK = True
+    INGEST_BATCH_SIZE = 5000
+    # Skip unchanged files and ingest only appended rows, tracked in `ingest_manifest`
+    INGEST_INCREMENTAL = True
+    # Parallel ingestion: parser processes and max parsed files awaiting the writer
+    INGEST_WORKERS = 1
+    INGEST_QUEUE_SIZE = 4
+    # Bytes parsed at a time when streaming station files out of archives or stdin
+    INGEST_STREAM_BLOCK_SIZE = 1024 * 1024
+
+    # API pagination: default and maximum `limit` per page
+    API_DEFAULT_PAGE_SIZE = 10
+    API_MAX_PAGE_SIZE = 1000
+    # POST /api/weather/batch: maximum items, and maximum days requested over all items
+    API_BATCH_MAX_ITEMS = 10000
+    API_BATCH_MAX_ROWS = 100000
+    # Points returned by /api/weather/series by default and at most
+    API_SERIES_DEFAULT_POINTS = 1000
+    API_SERIES_MAX_POINTS = 10000
+    # Days of /api/weather/snapshot per request at most (every station for each day)
+    API_SNAPSHOT_MAX_DAYS = 31
+    # Rows fetched from the server-side cursor per chunk of /api/weather/export
+    EXPORT_CHUNK_SIZE = 5000
+
+    # Read engine for /api/weather station queries: 'sql' or 'columnar' (memory-mapped
+    # per-station files under COLUMNAR_STORE_DIR, relative to the instance path, written
+    # by ingestion; ORM writes remove a station's file and it is read from SQL until then)
+    WEATHER_READ_ENGINE = 'sql'
+    COLUMNAR_STORE_DIR = 'colstore'
+    COLUMNAR_RECHECK_SECONDS = 1.0
+
+    # Per-station prefix sums under PREFIX_INDEX_DIR (relative to the instance path),
+    # maintained by ingestion and serving /api/weather/aggregate in constant time; ORM
+    # writes remove a station's file and its windows are summed in SQL until then
+    PREFIX_INDEX_ENABLED = True
+    PREFIX_INDEX_DIR = 'prefix'
+    PREFIX_INDEX_RECHECK_SECONDS = 1.0
+
+    # Station catalog (/api/stations): first/last date, rows and missing values per
+    # station and year, maintained by ingestion and ORM writes. Once every station is
+    # cataloged, exports and full stats rebuilds skip the partitions without data.
+    STATION_CATALOG_ENABLED = True
+
+    # GET responses are cached per normalized query and data generation, with ETags.
+    # The generation is bumped on every commit that changes weather data or stats; with
+    # DATA_GENERATION_FILE (relative to the instance path) it is shared by all processes.
+    # RESPONSE_CACHE_DIR optionally adds an on-disk cache shared by worker processes.
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    RESPONSE_CACHE_DIR = None
+    RESPONSE_CACHE_DISK_MAX_BYTES = 512 * 1024 * 1024
+    DATA_GENERATION_FILE = 'data_generation'
+
+    # gzip (or brotli, if installed) compression of responses of at least
+    # RESPONSE_COMPRESSION_MIN_BYTES for clients sending Accept-Encoding. Cached responses
+    # are stored compressed, so each is compressed once per encoding.
+    RESPONSE_COMPRESSION_ENABLED = True
+    RESPONSE_COMPRESSION_MIN_BYTES = 1024
+    RESPONSE_COMPRESSION_LEVEL = 5
+
+    # Prometheus-style instrumentation on /metrics, and a warning log for SQL statements
+    # slower than SLOW_QUERY_THRESHOLD_MS (None disables the slow-query log)
+    METRICS_ENABLED = True
+    SLOW_QUERY_THRESHOLD_MS = 500
+
+    # Background ingestion and stats jobs (/api/jobs): worker threads per process, and the
+    # directory ingestion jobs may read from (None for wx_data)
+    JOBS_MAX_WORKERS = 2
+    JOBS_DATA_ROOT = None
+
+    # Days counted by the threshold_days of /api/weather/stats distributions:
+    # name -> (measure, comparison, value in degrees Celsius or mm)
+    STATS_THRESHOLD_DAYS = {
+        'frost_days': ('min_temp', '<', 0.0),
+        'ice_days': ('max_temp', '<', 0.0),
+        'summer_days': ('max_temp', '>', 25.0),
+        'tropical_nights': ('min_temp', '>', 20.0),
+        'wet_days': ('precipitation', '>=', 1.0),
+    }
+
+    # Daily climatology normals (/api/weather/normals and anomaly=true on /api/weather),
+    # rebuilt with the stats for stations with new data. NORMALS_BASE_PERIOD is the
+    # (first, last) years averaged, inclusive, or None for every year; each day also
+    # averages the NORMALS_SMOOTHING_DAYS days either side of it.
+    NORMALS_ENABLED = True
+    NORMALS_BASE_PERIOD = None
+    NORMALS_SMOOTHING_DAYS = 0
+
+    # Extreme events (/api/weather/events), detected with the stats for the stations with
+    # new data: name -> (measure, comparison, threshold in degrees Celsius or mm, minimum
+    # days). A missing day (no row, or a -9999 value) ends an event, unless it is in a gap
+    # of at most WEATHER_EVENTS_MAX_GAP_DAYS missing days; bridged days do not count
+    # towards the minimum. Run `flask build-events` after changing these.
+    WEATHER_EVENTS_ENABLED = True
+    WEATHER_EVENTS = {
+        'heat_wave': ('max_temp', '>=', 35.0, 3),
+        'cold_snap': ('min_temp', '<=', -20.0, 3),
+        'dry_spell': ('precipitation', '<=', 0.0, 20),
+    }
+    WEATHER_EVENTS_MAX_GAP_DAYS = 0
+
+    # Date partitioning of weather_data: None, 'year' or 'decade'. PostgreSQL uses
+    # declarative range partitions; SQLite keeps each decade in its own database file
+    # under WEATHER_PARTITION_DIR (relative to the instance path), attached on checkout.
+    # Must be set before the tables are created; see `flask partition-data` otherwise.
+    WEATHER_PARTITIONING = None
+    WEATHER_PARTITION_DIR = 'partitions'
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
 class ProductionConfig(Config):
     DEBUG = False
+    SCHEMA_AUTO_CREATE = False
+    STARTUP_CHECKS = False
+    STORAGE_PROFILE = 'sqlite-wal'  # 'postgresql' with a PostgreSQL SQLALCHEMY_DATABASE_URI
 
 class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # Use in-memory database for testing
-    TESTING = True
\ No newline at end of file
+    TESTING = True
+    DATA_GENERATION_FILE = None  # Process-local generation, nothing written to the instance path
+    PREFIX_INDEX_ENABLED = False  # Enabled with a temporary directory by the tests that need it
\ No newline at end of file
@@ -0,0 +1,21 @@
+import pytest
+from app import create_app, db
+
+@pytest.fixture
+def app_config():
+    """Config overrides of the test app; modules override this fixture to change them."""
+    return {}
+
+@pytest.fixture(scope='function')
+def app(app_config):
+    """Fixture to create and configure the Flask application for testing."""
+    app = create_app('testing', app_config)
+    with app.app_context():
+        db.drop_all()  # Drop all tables before each test
+        db.create_all()  # Recreate tables before each test
+    yield app
+
+@pytest.fixture
+def client(app):
+    """Fixture to create a test client for the app."""
+    return app.test_client()
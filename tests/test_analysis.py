@@ -1,3 +1,4 @@
+import sqlite3
 import pytest
 from app import create_app, db
 from app.models import WeatherData, WeatherStats
@@ -44,3 +45,70 @@ def test_weather_stats_calculation(client, app):
         assert stats.avg_max_temp == 25.0  # Ignoring the None value
         assert stats.avg_min_temp == 19.0  # (20 + 18) / 2
         assert stats.total_precipitation == 100.0
+
+def test_weather_stats_rerun_updates_in_place(client, app):
+    with app.app_context():
+        db.session.add(WeatherData(station_id="test_station", date=datetime(2022, 11, 1).date(), max_temp=25.0))
+        db.session.commit()
+        calculate_weather_stats()
+
+        db.session.add(WeatherData(station_id="test_station", date=datetime(2022, 11, 2).date(), max_temp=15.0))
+        db.session.commit()
+        calculate_weather_stats()
+        calculate_weather_stats()
+
+        stats = WeatherStats.query.filter_by(station_id="test_station", year=2022).all()
+        assert len(stats) == 1
+        assert stats[0].avg_max_temp == 20.0
+
+def test_weather_stats_only_recompute_dirty_partitions(client, app):
+    from app.ingestion import upsert_weather_rows
+    from app.models import StatsDirtyPartition
+    with app.app_context():
+        # A stale row for a partition nobody touched must survive an incremental run
+        db.session.add(WeatherStats(station_id="other_station", year=1999, avg_max_temp=-1.0))
+        db.session.commit()
+
+        upsert_weather_rows("test_station", [
+            (datetime(2021, 12, 31).date(), 10.0, 0.0, 1.5),
+            (datetime(2022, 1, 1).date(), 20.0, 10.0, 2.5),
+        ])
+        db.session.commit()
+        assert StatsDirtyPartition.query.count() == 2
+
+        calculate_weather_stats()
+        assert StatsDirtyPartition.query.count() == 0
+        assert WeatherStats.query.filter_by(station_id="test_station").count() == 2
+        assert WeatherStats.query.filter_by(station_id="other_station").first().avg_max_temp == -1.0
+
+        # A full rebuild recomputes everything from weather_data
+        calculate_weather_stats(full=True)
+        assert WeatherStats.query.filter_by(station_id="other_station").first() is None
+        assert WeatherStats.query.filter_by(station_id="test_station", year=2022).first().total_precipitation == 2.5
+
+def test_weather_stats_of_many_dirty_partitions(app):
+    from app.analysis import mark_dirty_partitions
+    from app.models import StatsDirtyPartition
+    with app.app_context():
+        # More (station_id, year) pairs than the connection allows bound parameters in one
+        # statement; 999 was SQLite's default limit before 3.32
+        db.session.connection().connection.dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        mark_dirty_partitions(db.session.connection(),
+                              [(f'USC{station:08d}', year) for station in range(100) for year in range(1990, 2020)])
+        db.session.commit()
+
+        calculate_weather_stats()
+        assert StatsDirtyPartition.query.count() == 0
+
+def test_weather_stats_of_emptied_partition_are_removed(app):
+    with app.app_context():
+        record = WeatherData(station_id="test_station", date=datetime(1990, 6, 1).date(), max_temp=20.0)
+        db.session.add(record)
+        db.session.commit()
+        calculate_weather_stats()
+        assert WeatherStats.query.filter_by(station_id="test_station", year=1990).count() == 1
+
+        db.session.delete(record)
+        db.session.commit()
+        calculate_weather_stats()
+        assert WeatherStats.query.filter_by(station_id="test_station", year=1990).count() == 0
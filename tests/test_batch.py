@@ -0,0 +1,76 @@
+import pytest
+from app import create_app, db
+from app.ingestion import bulk_process_file
+
+@pytest.fixture
+def app_config():
+    return {'API_BATCH_MAX_ITEMS': 5, 'API_BATCH_MAX_ROWS': 40}
+
+@pytest.fixture
+def app(app, tmp_path):
+    """The test app with a station ingested."""
+    with app.app_context():
+        data_file = tmp_path / 'USC00000009.txt'
+        data_file.write_text(
+            "19991231\t100\t10\t5\n"
+            "20000101\t-9999\t20\t0\n"
+            "20000102\t200\t30\t12\n"
+        )
+        bulk_process_file(str(data_file))
+    return app
+
+def test_batch_lookup_in_request_order(client):
+    response = client.post('/api/weather/batch', json={'items': [
+        {'station_id': 'USC00000009', 'date': '2000-01-02'},
+        {'station_id': 'USC00000009', 'date': '2000-01-05'},
+        {'station_id': 'USC99999999', 'date': '2000-01-02'},
+        {'station_id': 'USC00000009', 'start_date': '1999-12-31', 'end_date': '2000-01-01'},
+        {'station_id': 'USC00000009', 'date': '2000-01-01'},
+    ]})
+    assert response.status_code == 200
+    assert response.get_json()['results'] == [
+        {'station_id': 'USC00000009', 'date': '2000-01-02', 'found': True,
+         'max_temp': 20.0, 'min_temp': 3.0, 'precipitation': 1.2},
+        {'station_id': 'USC00000009', 'date': '2000-01-05', 'found': False},
+        {'station_id': 'USC99999999', 'date': '2000-01-02', 'found': False},
+        {'station_id': 'USC00000009', 'start_date': '1999-12-31', 'end_date': '2000-01-01', 'found': True, 'data': [
+            {'date': '1999-12-31', 'max_temp': 10.0, 'min_temp': 1.0, 'precipitation': 0.5},
+            {'date': '2000-01-01', 'max_temp': None, 'min_temp': 2.0, 'precipitation': 0.0},
+        ]},
+        # A stored missing value is found, with a null measurement
+        {'station_id': 'USC00000009', 'date': '2000-01-01', 'found': True,
+         'max_temp': None, 'min_temp': 2.0, 'precipitation': 0.0},
+    ]
+
+def test_batch_spans_partitions(tmp_path):
+    app = create_app('testing', {
+        'WEATHER_PARTITIONING': 'decade',
+        'WEATHER_PARTITION_DIR': str(tmp_path / 'partitions'),
+    })
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        data_file = tmp_path / 'USC00000009.txt'
+        data_file.write_text("19991231\t100\t10\t5\n20000101\t-9999\t20\t0\n")
+        bulk_process_file(str(data_file))
+
+    results = app.test_client().post('/api/weather/batch', json={'items': [
+        {'station_id': 'USC00000009', 'start_date': '1999-01-01', 'end_date': '2000-12-31'},
+        {'station_id': 'USC00000009', 'date': '2000-01-01'},
+    ]}).get_json()['results']
+    assert [row['date'] for row in results[0]['data']] == ['1999-12-31', '2000-01-01']
+    assert results[1]['found'] is True
+
+@pytest.mark.parametrize('body, message', [
+    ({}, 'items'),
+    ({'items': [{'date': '2000-01-01'}]}, 'items[0]'),
+    ({'items': [{'station_id': 'USC00000009', 'date': '01/01/2000'}]}, 'items[0]'),
+    ({'items': [{'station_id': 'USC00000009', 'date': '2000-01-01'},
+                {'station_id': 'USC00000009', 'start_date': '2000-01-02', 'end_date': '2000-01-01'}]}, 'items[1]'),
+    ({'items': [{'station_id': 'USC00000009', 'date': '2000-01-01'}] * 6}, 'At most 5 items'),
+    ({'items': [{'station_id': 'USC00000009', 'start_date': '2000-01-01', 'end_date': '2000-03-01'}]}, 'items[0]'),
+])
+def test_batch_rejects_invalid_requests(client, body, message):
+    response = client.post('/api/weather/batch', json=body)
+    assert response.status_code == 400
+    assert message in response.get_json()['message']
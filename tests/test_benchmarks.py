@@ -0,0 +1,35 @@
+from datetime import date
+from app.parser import parse_weather_file, MISSING_MAX_TEMP
+from benchmarks.generate import generate_archive, append_days
+from benchmarks.run import run_benchmarks, compare
+
+def test_archive_is_reproducible_and_parsable(tmp_path):
+    first = generate_archive(str(tmp_path / 'a'), stations=2, years=2, missing_ratio=0.1, seed=7)
+    second = generate_archive(str(tmp_path / 'b'), stations=2, years=2, missing_ratio=0.1, seed=7)
+    assert [open(path).read() for path in first] == [open(path).read() for path in second]
+
+    parsed = parse_weather_file(first[0])
+    assert parsed.rejects == []
+    assert len(parsed.dates) == 365 + 365
+    assert 0.05 < ((parsed.missing & MISSING_MAX_TEMP) > 0).mean() < 0.15
+
+def test_append_continues_after_last_day(tmp_path):
+    path, = generate_archive(str(tmp_path), stations=1, years=1, first_year=2020)
+    append_days(path, 40)
+    parsed = parse_weather_file(path)
+    assert parsed.rejects == []
+    assert date.fromordinal(int(parsed.dates[-1])) == date(2021, 2, 9)
+    assert len(set(parsed.dates.tolist())) == len(parsed.dates)
+
+def test_run_reports_every_scenario(tmp_path):
+    results = run_benchmarks(str(tmp_path), stations=2, years=1, requests=3, depths=(1, 2), page_size=50)
+    assert results['info']['rows'] == 2 * 365
+    for name in ('ingest_full_s', 'ingest_unchanged_s', 'ingest_append_s', 'stats_full_s', 'stats_incremental_s',
+                 'api_weather_cursor_depth2_p50_ms', 'api_weather_page_depth2_p99_ms', 'api_stats_cursor_depth1_p50_ms'):
+        assert name in results['metrics']
+
+def test_compare_flags_only_real_slowdowns():
+    baseline = {'metrics': {'ingest_full_s': 1.0, 'api_weather_cursor_depth1_p50_ms': 0.2, 'stats_full_s': 0.5}}
+    results = {'metrics': {'ingest_full_s': 2.0, 'api_weather_cursor_depth1_p50_ms': 0.6, 'stats_full_s': 0.55}}
+    # The API metric tripled but by less than the 1ms noise floor
+    assert compare(results, baseline, tolerance=0.5) == [('ingest_full_s', 1.0, 2.0)]
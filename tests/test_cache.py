@@ -0,0 +1,76 @@
+import pytest
+from datetime import date
+from app import db
+from app.models import WeatherData
+from app.analysis import calculate_weather_stats
+from app.cache import DataGeneration, ResponseCache
+
+@pytest.fixture
+def app(app):
+    """The test app with one weather row."""
+    with app.app_context():
+        db.session.add(WeatherData(station_id='S1', date=date(2020, 1, 1), max_temp=1.0, min_temp=0.0, precipitation=2.0))
+        db.session.commit()
+    return app
+
+def test_second_request_is_a_hit(client):
+    first = client.get('/api/weather?station_id=S1&limit=5')
+    second = client.get('/api/weather?limit=5&station_id=S1')  # Same query, other order
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.get_json() == first.get_json()
+    assert second.headers['ETag'] == first.headers['ETag']
+
+def test_matching_etag_returns_304(client):
+    etag = client.get('/api/weather/stats').headers['ETag']
+    response = client.get('/api/weather/stats', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_commit_invalidates_cached_responses(client, app):
+    first = client.get('/api/weather?station_id=S1')
+    with app.app_context():
+        db.session.add(WeatherData(station_id='S1', date=date(2020, 1, 2), max_temp=3.0, min_temp=1.0, precipitation=0.0))
+        db.session.commit()
+
+    second = client.get('/api/weather?station_id=S1', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers['X-Cache'] == 'MISS'
+    assert len(second.get_json()) == 2
+
+def test_stats_run_invalidates_cached_responses(client, app):
+    assert client.get('/api/weather/stats').get_json() == []
+    with app.app_context():
+        calculate_weather_stats()
+    assert len(client.get('/api/weather/stats').get_json()) == 1
+
+def test_cache_stats_counters(client):
+    client.get('/api/weather')
+    client.get('/api/weather')
+    stats = client.get('/api/cache/stats').get_json()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['entries'] == 1
+
+def test_lru_evicts_by_size():
+    cache = ResponseCache(max_bytes=10)
+    cache.set('a', b'12345', {})
+    cache.set('b', b'12345', {})
+    cache.get('a')  # 'b' is now least recently used
+    cache.set('c', b'12345', {})
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.stats()['evictions'] == 1
+
+def test_disk_backend_is_shared(tmp_path):
+    ResponseCache(1024, str(tmp_path)).set('key', b'[1]', {'X-Next-Cursor': 'abc'})
+    other = ResponseCache(1024, str(tmp_path))
+    assert other.get('key') == (b'[1]', {'X-Next-Cursor': 'abc'})
+    assert other.stats()['disk_hits'] == 1
+
+def test_file_generation_is_shared(tmp_path):
+    path = str(tmp_path / 'generation')
+    reader, writer = DataGeneration(path), DataGeneration(path)
+    before = reader.current()
+    writer.bump()
+    assert reader.current() > before
@@ -0,0 +1,121 @@
+import pytest
+from datetime import date
+from sqlalchemy import delete, select
+from app import db
+from app.catalog import build_catalog, data_range, years_with_data
+from app.ingestion import bulk_process_file
+from app.models import StationYear, WeatherData
+
+def ingest(app, path, content):
+    path.write_text(content)
+    with app.app_context():
+        bulk_process_file(str(path))
+
+@pytest.fixture
+def stations(app, tmp_path):
+    # USC00000050 has every day of 1998 and misses precipitation on 20 of them
+    lines = []
+    day = date(1998, 1, 1).toordinal()
+    for offset in range(365):
+        precipitation = -9999 if offset < 20 else 0
+        lines.append(f"{date.fromordinal(day + offset):%Y%m%d}\t250\t100\t{precipitation}\n")
+    ingest(app, tmp_path / 'USC00000050.txt', ''.join(lines))
+    ingest(app, tmp_path / 'USC00000051.txt',
+           "19980703\t300\t200\t0\n19980704\t-9999\t-9999\t-9999\n19990101\t10\t-20\t5\n")
+    return tmp_path
+
+def catalog_rows(app):
+    with app.app_context():
+        return db.session.execute(select(StationYear.__table__).order_by('station_key', 'year')).all()
+
+def test_catalog_maintained_by_ingestion(app, client, stations):
+    body = client.get('/api/stations?years=true').get_json()
+    assert [record['station_id'] for record in body] == ['USC00000050', 'USC00000051']
+    assert body[0]['first_date'] == '1998-01-01' and body[0]['last_date'] == '1998-12-31'
+    assert body[0]['days'] == 365 and body[0]['coverage'] == 1.0
+    assert body[0]['missing'] == {'max_temp': 0, 'min_temp': 0, 'precipitation': 20}
+    assert body[0]['missing_fraction']['precipitation'] == round(20 / 365, 4)
+    assert body[1]['missing'] == {'max_temp': 1, 'min_temp': 1, 'precipitation': 1}
+    assert [(year['year'], year['days']) for year in body[1]['years']] == [(1998, 2), (1999, 1)]
+
+    # Appended rows recompute only the years from the first new date
+    ingest(app, stations / 'USC00000051.txt',
+           "19980703\t300\t200\t0\n19980704\t-9999\t-9999\t-9999\n19990101\t10\t-20\t5\n"
+           "19990102\t-9999\t0\t0\n20000101\t0\t0\t0\n")
+    body = client.get('/api/stations?station_id=USC00000051&years=true').get_json()
+    assert body[0]['last_date'] == '2000-01-01' and body[0]['days'] == 5
+    assert [(year['year'], year['days'], year['missing']['max_temp']) for year in body[0]['years']] == \
+        [(1998, 2, 1), (1999, 2, 1), (2000, 1, 0)]
+
+    incremental = catalog_rows(app)
+    with app.app_context():
+        assert build_catalog() == 4
+        db.session.commit()
+        assert years_with_data() == {1998, 1999, 2000}
+    assert catalog_rows(app) == incremental
+
+def test_station_filters(client, stations):
+    def codes(query):
+        return [record['station_id'] for record in client.get(f'/api/stations?{query}').get_json()]
+
+    assert codes('start_year=1999&end_year=1999') == ['USC00000051']
+    assert codes('start_year=1998&end_year=1998&min_coverage=0.9') == ['USC00000050']
+    assert codes('max_missing_precipitation=0.1') == ['USC00000050']
+    assert codes('max_missing_max_temp=0.5') == ['USC00000050', 'USC00000051']
+    assert codes('max_missing_max_temp=0.1') == ['USC00000050']
+
+    body = client.get('/api/stations?start_year=1998&end_year=1998').get_json()
+    assert body[1]['coverage'] == round(2 / 365, 4)
+    assert body[1]['last_date'] == '1998-07-04'
+
+    response = client.get('/api/stations?limit=1&count=true')
+    assert response.headers['X-Total-Count'] == '2'
+    assert codes(f"limit=1&cursor={response.headers['X-Next-Cursor']}") == ['USC00000051']
+
+    assert client.get('/api/stations?min_coverage=0.5').status_code == 400
+    assert client.get('/api/stations?start_year=1998&end_year=1998&min_coverage=2').status_code == 400
+    assert client.get('/api/stations?max_missing_precipitation=abc').status_code == 400
+    assert client.get('/api/stations?start_year=x').status_code == 400
+
+def test_export_skips_dates_without_data(app, client, stations):
+    with app.app_context():
+        assert data_range(date(1990, 1, 1), date(1998, 7, 3), 'USC00000051') == (date(1998, 7, 3), date(1998, 7, 3))
+        assert data_range(date(1990, 1, 1), date(1995, 12, 31), 'USC00000051') is None
+        assert data_range(None, None, 'USC99999999') is None
+        assert data_range(date(1990, 1, 1), None) == (date(1998, 1, 1), date(1999, 1, 1))
+
+        # An uncataloged station could have any dates, so the range is left alone
+        db.session.execute(delete(StationYear).where(StationYear.year == 1999))
+        db.session.execute(delete(StationYear).where(StationYear.first_date == date(1998, 7, 3)))
+        db.session.commit()
+        assert data_range(date(1990, 1, 1), None, 'USC00000051') == (date(1990, 1, 1), None)
+        assert data_range(date(1990, 1, 1), None) == (date(1990, 1, 1), None)
+        assert years_with_data() is None
+        assert build_catalog(['USC00000051']) == 2
+        db.session.commit()
+
+    response = client.get('/api/weather/export?station_id=USC00000051&end_date=1995-12-31')
+    assert response.get_data(as_text=True) == 'station_id,date,max_temp,min_temp,precipitation\n'
+    response = client.get('/api/weather/export?station_id=USC00000051&start_date=1998-07-04')
+    assert response.get_data(as_text=True).splitlines()[1:] == [
+        'USC00000051,1998-07-04,,,', 'USC00000051,1999-01-01,1.0,-2.0,0.5'
+    ]
+
+def test_catalog_follows_orm_writes(app, client, stations):
+    with app.app_context():
+        db.session.add(WeatherData(station_id='USC00000051', date=date(2005, 6, 1), max_temp=1.0, min_temp=0.0, precipitation=0.0))
+        db.session.commit()
+        assert years_with_data() == {1998, 1999, 2005}
+
+    response = client.get('/api/weather/export?station_id=USC00000051&start_date=1999-01-01')
+    assert response.get_data(as_text=True).splitlines()[1:] == [
+        'USC00000051,1999-01-01,1.0,-2.0,0.5', 'USC00000051,2005-06-01,1.0,0.0,0.0'
+    ]
+
+    with app.app_context():
+        db.session.delete(db.session.get(WeatherData, (2, date(2005, 6, 1))))
+        db.session.commit()
+        assert years_with_data() == {1998, 1999}
+        incremental = db.session.execute(select(StationYear.__table__).order_by('station_key', 'year')).all()
+        build_catalog()
+        assert db.session.execute(select(StationYear.__table__).order_by('station_key', 'year')).all() == incremental
@@ -0,0 +1,83 @@
+import pytest
+from datetime import date
+from app import db
+from app.analysis import calculate_weather_stats
+from app.climatology import day_of_year, month_day
+from app.ingestion import bulk_process_file
+from app.models import WeatherNormal
+
+@pytest.fixture
+def app_config():
+    return {'NORMALS_BASE_PERIOD': (2000, 2002)}
+
+@pytest.fixture
+def station_file(tmp_path):
+    # March 1 over three base years, a missing value and one year outside the base period
+    data_file = tmp_path / 'USC00000010.txt'
+    data_file.write_text(
+        "20000301\t100\t10\t5\n"
+        "20010301\t200\t-9999\t0\n"
+        "20020301\t300\t30\t7\n"
+        "20020302\t50\t0\t0\n"
+        "20100301\t900\t90\t9\n"
+    )
+    return data_file
+
+def test_day_of_year_is_leap_calendar():
+    assert day_of_year(date(2001, 3, 1)) == day_of_year(date(2000, 3, 1)) == 61
+    assert day_of_year(date(2000, 2, 29)) == 60
+    assert day_of_year(date(2001, 12, 31)) == 366
+    assert month_day(61) == '03-01'
+
+def test_normals_built_with_stats(app, client, station_file):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+        calculate_weather_stats()
+        assert WeatherNormal.query.count() == 2
+
+    normal = client.get('/api/weather/normals?station_id=USC00000010&date=2011-03-01').get_json()
+    assert len(normal) == 1
+    normal = normal[0]
+    assert (normal['day'], normal['day_of_year']) == ('03-01', 61)
+    assert (normal['max_temp_mean'], normal['max_temp_count']) == (20.0, 3)
+    assert normal['max_temp_std'] == pytest.approx(10.0)
+    assert (normal['min_temp_mean'], normal['min_temp_count'], normal['min_temp_std']) == (2.0, 2, pytest.approx(1.4142, 1e-3))
+    assert normal['precipitation_mean'] == 0.4
+
+    assert [n['day'] for n in client.get('/api/weather/normals?station_id=USC00000010').get_json()] == ['03-01', '03-02']
+    assert client.get('/api/weather/normals').status_code == 400
+
+    rows = client.get('/api/weather?station_id=USC00000010&anomaly=true&limit=100').get_json()
+    assert rows[0]['anomaly'] == {'max_temp': -10.0, 'min_temp': -1.0, 'precipitation': 0.1}
+    assert rows[1]['anomaly']['min_temp'] is None  # Missing value
+    assert rows[4]['anomaly'] == {'max_temp': 70.0, 'min_temp': 7.0, 'precipitation': 0.5}
+    assert 'anomaly' not in client.get('/api/weather?station_id=USC00000010').get_json()[0]
+
+def test_normals_rebuilt_for_new_base_years(app, station_file, tmp_path):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+        calculate_weather_stats()
+
+        # A year outside the base period leaves the normals alone
+        later = tmp_path / 'later' / 'USC00000010.txt'
+        later.parent.mkdir()
+        later.write_text("20110301\t0\t0\t0\n")
+        bulk_process_file(str(later))
+        calculate_weather_stats()
+        assert db.session.get(WeatherNormal, (1, 61)).max_temp_count == 3
+
+        later.write_text("20010302\t150\t0\t0\n")
+        bulk_process_file(str(later))
+        calculate_weather_stats()
+        assert db.session.get(WeatherNormal, (1, 62)).max_temp_mean == 10.0
+        assert db.session.get(WeatherNormal, (1, 61)).max_temp_mean == 20.0
+
+def test_smoothing_includes_neighbouring_days(app, station_file):
+    app.config['NORMALS_SMOOTHING_DAYS'] = 1
+    with app.app_context():
+        bulk_process_file(str(station_file))
+        calculate_weather_stats(full=True)
+        # Feb 29 (no data), March 1 and March 2 all see the four values of March 1-2
+        assert db.session.get(WeatherNormal, (1, 60)).max_temp_count == 3
+        assert db.session.get(WeatherNormal, (1, 61)).max_temp_mean == 16.25
+        assert db.session.get(WeatherNormal, (1, 63)).max_temp_count == 1
@@ -0,0 +1,101 @@
+import os
+from datetime import date
+import pytest
+from app import db
+from app.colstore import get_store
+from app.ingestion import bulk_process_file
+from app.models import WeatherData
+
+@pytest.fixture
+def app_config(tmp_path):
+    """An app that reads station queries from a columnar store in tmp_path."""
+    return {'WEATHER_READ_ENGINE': 'columnar', 'COLUMNAR_STORE_DIR': str(tmp_path / 'colstore'),
+            'RESPONSE_CACHE_ENABLED': False}  # Compare engines, not cached responses
+
+@pytest.fixture
+def station_file(tmp_path):
+    data_file = tmp_path / 'USC00000001.txt'
+    data_file.write_text(''.join(
+        f"202211{day:02d}\t{200 + day}\t{-9999 if day % 3 == 0 else 100 + day}\t{day * 7}\n" for day in range(1, 21)
+    ))
+    return data_file
+
+def test_store_is_materialized_on_ingest(app, station_file):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+        assert os.path.exists(os.path.join(app.config['COLUMNAR_STORE_DIR'], 'USC00000001.wxc'))
+
+        store = get_store()
+        assert store.lookup('USC00000001', date(2022, 11, 3)) == (date(2022, 11, 3), 20.3, None, 2.1)
+        assert store.lookup('USC00000001', date(2022, 12, 1)) is None
+
+        # A re-ingest replaces the file and the store picks up the new version
+        station_file.write_text("20221103\t999\t1\t1\n")
+        bulk_process_file(str(station_file))
+        assert store.lookup('USC00000001', date(2022, 11, 3)) == (date(2022, 11, 3), 99.9, 0.1, 0.1)
+
+@pytest.mark.parametrize('query', [
+    'station_id=USC00000001',
+    'station_id=USC00000001&limit=7&count=true',
+    'station_id=USC00000001&date=2022-11-06',
+    'station_id=USC00000001&start_date=2022-11-04&end_date=2022-11-12&limit=3',
+    'station_id=USC00000001&page=2&limit=6',
+])
+def test_columnar_engine_matches_sql(app, client, station_file, query):
+    """Both read engines return the same rows and pagination headers."""
+    with app.app_context():
+        bulk_process_file(str(station_file))
+
+    def fetch(engine):
+        app.config['WEATHER_READ_ENGINE'] = engine
+        pages = []
+        response = client.get(f'/api/weather?{query}')
+        while True:
+            pages.append((response.get_json(), response.headers.get('X-Total-Count')))
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                return pages
+            response = client.get(f'/api/weather?{query}&cursor={cursor}')
+
+    assert fetch('columnar') == fetch('sql')
+
+def test_station_files_stay_in_the_store(app, client, station_file, tmp_path):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+    store_dir = tmp_path / 'colstore'
+    (tmp_path / 'other').mkdir()
+    (tmp_path / 'other' / 'evil.wxc').write_bytes(b'not a station file')
+
+    for station_id in ('../other/evil', '..', 'USC00000001/../USC00000001'):
+        response = client.get(f'/api/weather?station_id={station_id}&date=2022-11-03')
+        assert response.status_code == 200 and response.get_json() == []
+    assert client.get('/api/weather/series?station_id=../other/evil').status_code in (200, 404)
+
+    # A corrupt file is ignored and the station read from SQL
+    expected = client.get('/api/weather?station_id=USC00000001&date=2022-11-03').get_json()
+    for content in (b'', b'WXC1', b'XXXX' + bytes(12), (store_dir / 'USC00000001.wxc').read_bytes()[:40]):
+        (store_dir / 'USC00000001.wxc').write_bytes(content)
+        with app.app_context():
+            get_store().invalidate('USC00000001')
+            assert get_store().station('USC00000001') is None
+        assert client.get('/api/weather?station_id=USC00000001&date=2022-11-03').get_json() == expected
+
+def test_orm_writes_discard_station_files(app, client, station_file):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+        path = os.path.join(app.config['COLUMNAR_STORE_DIR'], 'USC00000001.wxc')
+
+        # A rolled back write leaves the file alone
+        WeatherData.query.filter_by(station_id='USC00000001', date=date(2022, 11, 3)).one().max_temp = 10.0
+        db.session.flush()
+        db.session.rollback()
+        assert os.path.exists(path)
+
+        # A committed one removes it, and the station is read from SQL until the next ingest
+        WeatherData.query.filter_by(station_id='USC00000001', date=date(2022, 11, 3)).one().max_temp = 10.0
+        db.session.commit()
+        assert not os.path.exists(path)
+        assert get_store().station('USC00000001') is None
+
+    response = client.get('/api/weather?station_id=USC00000001&date=2022-11-03')
+    assert response.get_json()[0]['max_temp'] == 10.0
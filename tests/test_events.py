@@ -0,0 +1,91 @@
+import pytest
+import numpy as np
+from datetime import date
+from sqlalchemy import select
+from app import db
+from app.analysis import calculate_weather_stats
+from app.events import detect_runs, update_events
+from app.ingestion import bulk_process_file, incremental_process_file
+from app.models import StatsDirtyPartition, WeatherEvent
+
+@pytest.fixture
+def app_config():
+    return {'RESPONSE_CACHE_ENABLED': False}
+
+def lines(start, max_temps):
+    """Weather file lines of consecutive days from `start`, None for a day without a row."""
+    return ''.join(
+        f"{date.fromordinal(start.toordinal() + offset):%Y%m%d}\t{max_temp}\t0\t10\n"
+        for offset, max_temp in enumerate(max_temps) if max_temp is not None
+    )
+
+def test_detect_runs():
+    dates = np.array([1, 2, 3, 4, 6, 7, 8, 9, 10, 11, 12])
+    values = np.array([36, 37, 35, 0, 36, 40, 39, 20, 36, 36, 36])
+    valid = np.ones(len(dates), dtype=bool)
+    valid[8] = False  # Day 10 is missing too
+
+    runs = detect_runs(dates, values, valid, '>=', 35, 3)
+    assert runs.starts.tolist() == [1, 6] and runs.ends.tolist() == [3, 8]
+    assert runs.days.tolist() == [3, 3] and runs.missing_days.tolist() == [0, 0]
+    assert runs.peaks.tolist() == [37, 40]
+
+    # Only missing days are bridged: day 4 is below the threshold and still ends the first run
+    runs = detect_runs(dates, values, valid, '>=', 35, 3, max_gap=1)
+    assert list(zip(runs.starts.tolist(), runs.ends.tolist())) == [(1, 3), (6, 8)]
+    runs = detect_runs(dates, values, valid, '>=', 35, 2, max_gap=1)
+    assert list(zip(runs.starts.tolist(), runs.ends.tolist(), runs.missing_days.tolist())) == \
+        [(1, 3, 0), (6, 8, 0), (11, 12, 0)]
+    runs = detect_runs(dates, values, valid, '<=', 20, 1)
+    assert list(zip(runs.starts.tolist(), runs.peaks.tolist())) == [(4, 0), (9, 20)]
+    assert len(detect_runs(dates, values, valid, '>', 50, 1).starts) == 0
+
+def test_events_are_detected_with_the_stats(app, client, tmp_path):
+    path = tmp_path / 'USC00000060.txt'
+    # A heat wave, a hot spell broken by a missing day and two hot days at the end of the year
+    path.write_text(lines(date(1998, 7, 1), [350, 361, 352, 300, 360, 370, None, 380, 390])
+                    + lines(date(1998, 12, 30), [355, 356]))
+    with app.app_context():
+        incremental_process_file(str(path))
+        calculate_weather_stats()
+
+    body = client.get('/api/weather/events?station_id=USC00000060').get_json()
+    assert body == [{'station_id': 'USC00000060', 'type': 'heat_wave', 'measure': 'max_temp',
+                     'start_date': '1998-07-01', 'end_date': '1998-07-03', 'days': 3, 'missing_days': 0,
+                     'peak': 36.1}]
+
+    # Appended data only marks 1999 dirty; the run it continues is found from the stored days
+    path.write_text(path.read_text() + lines(date(1999, 1, 1), [357, 200]))
+    with app.app_context():
+        incremental_process_file(str(path))
+        assert db.session.execute(select(StatsDirtyPartition.year)).scalars().all() == [1999]
+        calculate_weather_stats()
+        incremental = db.session.execute(select(WeatherEvent.__table__)).all()
+
+    body = client.get('/api/weather/events?type=heat_wave&start=1998-12-01').get_json()
+    assert [(event['start_date'], event['end_date'], event['days']) for event in body] == \
+        [('1998-12-30', '1999-01-01', 3)]
+    assert len(client.get('/api/weather/events?end=1998-07-01').get_json()) == 1
+    assert client.get('/api/weather/events?station_id=USC00000061').get_json() == []
+
+    with app.app_context():
+        assert update_events() == 2
+        db.session.commit()
+        assert db.session.execute(select(WeatherEvent.__table__)).all() == incremental
+
+def test_missing_days_policy(app, client, tmp_path):
+    app.config['WEATHER_EVENTS_MAX_GAP_DAYS'] = 1
+    path = tmp_path / 'USC00000060.txt'
+    path.write_text(lines(date(1998, 7, 1), [360, 370, None, 380, None, None, 390]))
+    with app.app_context():
+        bulk_process_file(str(path))
+        calculate_weather_stats()
+
+    response = client.get('/api/weather/events?station_id=USC00000060&type=heat_wave&count=true')
+    assert response.headers['X-Total-Count'] == '1'
+    event = response.get_json()[0]
+    assert (event['start_date'], event['end_date'], event['days'], event['missing_days']) == \
+        ('1998-07-01', '1998-07-04', 3, 1)
+
+    assert client.get('/api/weather/events?type=tornado').status_code == 400
+    assert client.get('/api/weather/events?start=07/01/1998').status_code == 400
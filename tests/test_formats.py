@@ -0,0 +1,108 @@
+import gzip
+import json
+from datetime import date
+import pytest
+from app import formats
+from app.colstore import materialize_station
+from app.formats import packb
+from app.ingestion import bulk_process_file
+
+@pytest.fixture
+def app_config(tmp_path):
+    """An app with a columnar store in tmp_path, read with the SQL engine by default."""
+    return {'COLUMNAR_STORE_DIR': str(tmp_path / 'colstore')}
+
+@pytest.fixture
+def stations(app, tmp_path):
+    for station_id in ('USC00000040', 'USC00000041'):
+        data_file = tmp_path / f'{station_id}.txt'
+        data_file.write_text(''.join(
+            f"200001{day:02d}\t{100 + day}\t{-9999 if day % 4 == 0 else day}\t{day * 3}\n" for day in range(1, 31)
+        ))
+        with app.app_context():
+            bulk_process_file(str(data_file))
+
+def _transpose(rows):
+    return {
+        'dates': [row['date'] for row in rows],
+        'max_temp': [row['max_temp'] for row in rows],
+        'min_temp': [row['min_temp'] for row in rows],
+        'precipitation': [row['precipitation'] for row in rows],
+    }
+
+@pytest.mark.parametrize('engine', ['sql', 'columnar'])
+def test_columnar_matches_rows(app, client, stations, engine):
+    app.config['WEATHER_READ_ENGINE'] = engine
+    if engine == 'columnar':
+        with app.app_context():
+            materialize_station('USC00000040')
+    query = '/api/weather?station_id=USC00000040&start_date=2000-01-03&limit=10&anomaly=true'
+    rows = client.get(query)
+    columns = client.get(query + '&format=columnar')
+
+    body = columns.get_json()
+    assert body == dict(_transpose(rows.get_json()), station_id='USC00000040', anomaly=[None] * 10)
+    assert body['min_temp'][1] is None  # Missing value
+    assert columns.headers['X-Next-Cursor'] == rows.headers['X-Next-Cursor']
+
+def test_columnar_without_station_filter(client, stations):
+    body = client.get('/api/weather?limit=40&format=columnar').get_json()
+    assert body['station_id'] == ['USC00000040'] * 30 + ['USC00000041'] * 10
+    assert len(body['dates']) == 40
+
+def test_binary_formats(client, stations):
+    query = '/api/weather?station_id=USC00000041&limit=2'
+    columns = client.get(query + '&format=columnar').get_json()
+    response = client.get(query + '&format=msgpack')
+    try:
+        import msgpack
+    except ImportError:
+        assert response.status_code == 406
+    else:
+        assert response.mimetype == 'application/msgpack'
+        assert msgpack.unpackb(response.data) == columns
+
+    response = client.get(query + '&format=arrow')
+    try:
+        import pyarrow as pa
+    except ImportError:
+        assert response.status_code == 406
+    else:
+        table = pa.ipc.open_stream(response.data).read_all()
+        assert table.column('max_temp').to_pylist() == columns['max_temp']
+
+    assert client.get(query + '&format=xml').status_code == 400
+
+def test_packb_writes_dates_as_strings():
+    msgpack = pytest.importorskip('msgpack')
+    assert msgpack.unpackb(packb({'dates': [date(2000, 1, 2)], 'max_temp': [None, 2.5]})) == {
+        'dates': ['2000-01-02'], 'max_temp': [None, 2.5]
+    }
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_dumps_json_writes_non_finite_floats_as_null(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(formats, 'orjson', None)
+    elif formats.orjson is None:
+        pytest.skip('orjson is not installed')
+    data = {'a': [1.5, float('nan')], 'b': (float('inf'), -float('inf')), 'c': date(2022, 1, 2)}
+    assert json.loads(formats.dumps_json(data)) == {'a': [1.5, None], 'b': [None, None], 'c': '2022-01-02'}
+
+def test_gzip_negotiated_and_cached(client, stations):
+    query = '/api/weather?limit=60'
+    plain = client.get(query)
+    assert 'Content-Encoding' not in plain.headers
+
+    for expected_cache in ('MISS', 'HIT'):
+        response = client.get(query, headers={'Accept-Encoding': 'gzip, deflate'})
+        assert response.headers['X-Cache'] == expected_cache
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert gzip.decompress(response.data) == plain.data
+    assert response.headers['ETag'] != plain.headers['ETag']
+
+    # Small responses, and uncached endpoints below the threshold, are sent as they are
+    small = client.get('/api/weather?limit=1', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+    aggregate = client.get('/api/weather/aggregate?station_id=USC00000040', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in aggregate.headers
@@ -41,3 +41,32 @@ def test_duplicate_data(client, app):
         # Count how many records exist for the same date and station
         data_count = WeatherData.query.filter_by(station_id="test_data", date="2022-11-01").count()
         assert data_count == 1  # Ensure only one record exists
+
+def test_bulk_ingestion_counts(client, app, tmp_path):
+    # Re-ingesting the same file should update rows in place rather than duplicate them
+    from app.ingestion import bulk_process_file
+    data_file = tmp_path / 'USC00000001.txt'
+    data_file.write_text("20221101\t250\t220\t150\n20221102\t-9999\t180\t0\nnot a line\n20221103\t240\t200\t-9999\n")
+    with app.app_context():
+        assert bulk_process_file(str(data_file), batch_size=2) == (3, 0, 1)
+        assert bulk_process_file(str(data_file), batch_size=2) == (0, 3, 1)
+
+        assert WeatherData.query.filter_by(station_id="USC00000001").count() == 3
+        data = WeatherData.query.filter_by(station_id="USC00000001", date="2022-11-02").first()
+        assert data.max_temp is None
+        assert data.min_temp == 18.0
+
+def test_parallel_ingestion(client, app, tmp_path):
+    # Files are parsed in worker processes and written by one writer; a bad file is isolated
+    (tmp_path / 'USC00000001.txt').write_text("20221101\t250\t220\t150\n20221102\t240\t210\t0\n")
+    (tmp_path / 'USC00000002.txt').write_text("20221101\t100\t50\t-9999\nbad line\n")
+    with app.app_context():
+        from app.pipeline import ingest_parallel
+        paths = [str(tmp_path / 'USC00000001.txt'), str(tmp_path / 'USC00000002.txt'), str(tmp_path / 'missing.txt')]
+        summary = ingest_parallel(paths, workers=2, queue_size=1)
+
+        assert summary['files'] == 2
+        assert summary['inserted'] == 3
+        assert summary['skipped'] == 2
+        assert list(summary['errors']) == [str(tmp_path / 'missing.txt')]
+        assert WeatherData.query.count() == 3
@@ -0,0 +1,85 @@
+import threading
+import pytest
+from app.models import WeatherStats
+from app import jobs
+
+@pytest.fixture
+def app_config(tmp_path):
+    """An app on a file database, which job threads share with requests."""
+    data_dir = tmp_path / 'wx_data'
+    data_dir.mkdir()
+    (data_dir / 'USC00000007.txt').write_text("20220101\t10\t5\t0\n20220102\t20\t4\t12\n")
+    (data_dir / 'USC00000008.txt').write_text("20220101\t30\t5\t1\n")
+    return {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'weather.db'}",
+        'JOBS_DATA_ROOT': str(data_dir)
+    }
+
+def _wait(app, client, job_id):
+    app.extensions['job_runner'].wait(job_id, timeout=30)
+    return client.get(f'/api/jobs/{job_id}').get_json()
+
+def test_ingest_job(app, client):
+    response = client.post('/api/jobs/ingest', json={})
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+    assert response.headers['Location'] == f'/api/jobs/{job_id}'
+
+    job = _wait(app, client, job_id)
+    assert job['status'] == 'succeeded'
+    assert job['progress']['files_total'] == 2
+    assert job['progress']['files_done'] == 2
+    assert job['progress']['rows'] == 3
+    assert job['progress']['rows_per_second'] > 0
+    assert job['result']['inserted'] == 3
+
+    data = client.get('/api/weather?station_id=USC00000008').get_json()
+    assert data[0]['max_temp'] == 3.0
+
+def test_stats_job(app, client):
+    ingest = client.post('/api/jobs/ingest', json={'file': 'USC00000007.txt'}).get_json()
+    assert _wait(app, client, ingest['id'])['progress']['files_total'] == 1
+
+    job = _wait(app, client, client.post('/api/jobs/stats', json={}).get_json()['id'])
+    assert job['status'] == 'succeeded'
+    assert job['result']['full'] is False
+    with app.app_context():
+        assert WeatherStats.query.filter_by(station_id='USC00000007').one().avg_max_temp == 1.5
+
+def test_duplicate_jobs_coalesce(app, client, monkeypatch):
+    release = threading.Event()
+    started = threading.Event()
+    original = jobs._run_ingest
+
+    def blocked(job):
+        started.set()
+        release.wait(10)
+        return original(job)
+    monkeypatch.setattr(jobs, '_run_ingest', blocked)
+
+    first = client.post('/api/jobs/ingest', json={})
+    assert first.status_code == 202
+    assert started.wait(10)
+
+    # The same files named differently are the same work
+    second = client.post('/api/jobs/ingest', json={'data_dir': '.'})
+    assert second.status_code == 200
+    assert second.get_json()['id'] == first.get_json()['id']
+    assert second.get_json()['status'] == 'running'
+
+    # Different work is not coalesced, and requests are served while the job runs
+    other = client.post('/api/jobs/ingest', json={'file': 'USC00000008.txt'})
+    assert other.status_code == 202
+    assert client.get('/api/weather/stats').status_code == 200
+
+    release.set()
+    assert _wait(app, client, first.get_json()['id'])['status'] == 'succeeded'
+    assert _wait(app, client, other.get_json()['id'])['status'] == 'succeeded'
+
+    # Finished jobs no longer coalesce
+    assert client.post('/api/jobs/ingest', json={}).status_code == 202
+
+def test_invalid_jobs(client):
+    assert client.post('/api/jobs/ingest', json={'data_dir': '../..'}).status_code == 400
+    assert client.post('/api/jobs/ingest', json={'file': 'missing.txt'}).status_code == 400
+    assert client.get('/api/jobs/0123').status_code == 404
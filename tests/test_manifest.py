@@ -0,0 +1,55 @@
+import os
+from app import db
+from app.models import WeatherData, IngestManifest
+from app.ingestion import incremental_process_file
+
+LINES = [f"202211{day:02d}\t{200 + day}\t{100 + day}\t{day}\n" for day in range(1, 11)]
+
+def test_unchanged_file_is_skipped(app, tmp_path):
+    data_file = tmp_path / 'USC00000001.txt'
+    data_file.write_text(''.join(LINES))
+    with app.app_context():
+        assert incremental_process_file(str(data_file), batch_size=3) == (10, 0, 0)
+        assert incremental_process_file(str(data_file), batch_size=3) == (0, 0, 0)
+
+        entry = IngestManifest.query.filter_by(path=os.path.abspath(data_file)).first()
+        assert entry.byte_offset == os.path.getsize(data_file)
+        assert entry.last_date.isoformat() == '2022-11-10'
+
+def test_appended_rows_only_ingest_tail(app, tmp_path):
+    data_file = tmp_path / 'USC00000001.txt'
+    data_file.write_text(''.join(LINES[:6]))
+    with app.app_context():
+        assert incremental_process_file(str(data_file), batch_size=4) == (6, 0, 0)
+        with open(data_file, 'a') as file:
+            file.write(''.join(LINES[6:]))
+        assert incremental_process_file(str(data_file), batch_size=4) == (4, 0, 0)
+        assert WeatherData.query.count() == 10
+
+def test_changed_prefix_reingests_whole_file(app, tmp_path):
+    data_file = tmp_path / 'USC00000001.txt'
+    data_file.write_text(''.join(LINES))
+    with app.app_context():
+        incremental_process_file(str(data_file), batch_size=4)
+        data_file.write_text(LINES[0].replace('\t201\t', '\t301\t') + ''.join(LINES[1:]) + "20221111\t1\t1\t1\n")
+        assert incremental_process_file(str(data_file), batch_size=4) == (1, 10, 0)
+        assert WeatherData.query.filter_by(date='2022-11-01').first().max_temp == 30.1
+
+def test_crashed_run_resumes_from_checkpoint(app, tmp_path):
+    data_file = tmp_path / 'USC00000001.txt'
+    data_file.write_text(''.join(LINES))
+    with app.app_context():
+        incremental_process_file(str(data_file), batch_size=4)
+
+        # Rewind the manifest to the first batch checkpoint as a crash after it would leave it
+        import hashlib
+        prefix = ''.join(LINES[:4]).encode()
+        entry = IngestManifest.query.first()
+        entry.size = entry.mtime_ns = None
+        entry.byte_offset = len(prefix)
+        entry.content_hash = hashlib.sha256(prefix).hexdigest()
+        db.session.commit()
+
+        # Only the six rows after the checkpoint are written again
+        assert incremental_process_file(str(data_file), batch_size=4) == (0, 6, 0)
+        assert IngestManifest.query.first().size == os.path.getsize(data_file)
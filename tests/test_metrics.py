@@ -0,0 +1,78 @@
+import copy
+import logging
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app import db
+from app.analysis import calculate_weather_stats
+from app.ingestion import bulk_process_file
+from app.metrics import Histogram, REGISTRY
+
+def _sample(client, line_prefix):
+    """Return the value of the first /metrics sample starting with `line_prefix`, 0 if absent."""
+    for line in client.get('/metrics').get_data(as_text=True).splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0
+
+def test_metrics_endpoint_exposes_request_and_query_metrics(client):
+    before = _sample(client, 'http_request_queries_count{endpoint="/api/weather"}')
+    client.get('/api/weather')
+    client.get('/api/weather')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="/api/weather",status="200"}' in text
+    assert 'db_query_duration_seconds_bucket{operation="SELECT",le="+Inf"}' in text
+    assert _sample(client, 'http_request_queries_count{endpoint="/api/weather"}') == before + 2
+    assert _sample(client, 'http_request_queries_sum{endpoint="/api/weather"}') > 0
+
+def test_slow_query_log(app, client, caplog):
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = 0
+    with caplog.at_level(logging.WARNING):
+        client.get('/api/weather/stats')
+    assert any(record.getMessage().startswith('Slow query') for record in caplog.records)
+
+def test_failing_queries_leave_no_timer_state(app):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            info = copy.deepcopy(connection.info)
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    connection.execute(text('SELECT * FROM no_such_table'))
+                connection.rollback()
+            assert connection.execute(text('SELECT 1')).scalar() == 1
+            assert connection.info == info
+
+def test_ingest_and_stats_metrics(app, client, tmp_path):
+    data_file = tmp_path / 'USC00000003.txt'
+    data_file.write_text("20220101\t10\t5\t0\n20220102\t-9999\t4\t12\n")
+    rows_before = _sample(client, 'ingest_rows_total')
+    runs_before = _sample(client, 'stats_run_duration_seconds_count{mode="incremental"}')
+
+    with app.app_context():
+        bulk_process_file(str(data_file))
+        calculate_weather_stats()
+
+    assert _sample(client, 'ingest_rows_total') == rows_before + 2
+    assert _sample(client, 'ingest_batch_commit_seconds_count') > 0
+    assert _sample(client, 'stats_run_duration_seconds_count{mode="incremental"}') == runs_before + 1
+
+def test_histogram_exposition():
+    histogram = Histogram('test_latency_seconds', 'Test histogram.', ['path'], buckets=(0.1, 1.0))
+    REGISTRY.remove(histogram)
+    histogram.observe(0.05, path='/a')
+    histogram.observe(0.5, path='/a')
+    histogram.observe(5, path='/a')
+    assert histogram.render().splitlines() == [
+        '# HELP test_latency_seconds Test histogram.',
+        '# TYPE test_latency_seconds histogram',
+        'test_latency_seconds_bucket{path="/a",le="0.1"} 1',
+        'test_latency_seconds_bucket{path="/a",le="1.0"} 2',
+        'test_latency_seconds_bucket{path="/a",le="+Inf"} 3',
+        'test_latency_seconds_sum{path="/a"} 5.55',
+        'test_latency_seconds_count{path="/a"} 3',
+    ]
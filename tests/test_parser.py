@@ -0,0 +1,41 @@
+import glob
+import os
+from datetime import date
+import pytest
+from app.ingestion import parse_weather_line
+from app.parser import parse_weather_bytes, parse_weather_file, iter_row_batches
+
+WX_DATA = os.path.join(os.path.dirname(__file__), '..', 'wx_data')
+
+
+@pytest.mark.parametrize('filepath', sorted(glob.glob(os.path.join(WX_DATA, '*.txt'))), ids=os.path.basename)
+def test_parser_parity_with_parse_weather_line(filepath):
+    """The vectorized parser must produce exactly what parse_weather_line does for every row."""
+    with open(filepath, 'r') as file:
+        expected = [parse_weather_line(line) for line in file]
+
+    parsed = parse_weather_file(filepath)
+    rows = [row for batch in iter_row_batches(parsed, 4096) for row in batch]
+
+    assert parsed.rejects == []
+    assert rows == expected
+
+
+def test_parser_rejects_invalid_lines():
+    data = (b"20221101\t250\t220\t150\n"
+            b"\n"
+            b"20221301\t1\t2\t3\n"
+            b"20221102\t1 2\t\t3\n"
+            b"20221103\t2-2\t1\t1\n"
+            b"20240229\t-9999\t-128\t-9999\r\n")
+    parsed = parse_weather_bytes(data)
+
+    assert [date.fromordinal(int(d)) for d in parsed.dates] == [date(2022, 11, 1), date(2024, 2, 29)]
+    assert parsed.line_numbers.tolist() == [1, 6]
+    assert [(number, reason) for number, _, reason in parsed.rejects] == [
+        (2, 'expected 4 tab separated integers'),
+        (3, 'invalid date'),
+        (4, 'expected 4 tab separated integers'),
+        (5, 'invalid integer'),
+    ]
+    assert next(iter_row_batches(parsed, 10))[1] == (date(2024, 2, 29), None, -12.8, None)
@@ -0,0 +1,150 @@
+import os
+import pytest
+from datetime import date
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+from app import create_app, db
+from app.analysis import calculate_weather_stats
+from app.ingestion import bulk_process_file, incremental_process_file
+from app.models import WeatherData, WeatherStats
+from app.partitioning import (
+    _partitioned_dialects, existing_partitions, partition_existing_rows, partition_for, partition_named, rebuild_partition, weather_source
+)
+
+@pytest.fixture
+def app_config(tmp_path):
+    """An app that keeps each decade of weather data in its own SQLite file."""
+    return {
+        'WEATHER_PARTITIONING': 'decade',
+        'WEATHER_PARTITION_DIR': str(tmp_path / 'partitions'),
+        'RESPONSE_CACHE_ENABLED': False
+    }
+
+@pytest.fixture
+def station_file(tmp_path):
+    # Spans two decades, with a missing value in each
+    data_file = tmp_path / 'USC00000004.txt'
+    data_file.write_text(
+        "19981231\t100\t10\t5\n"
+        "19990101\t-9999\t20\t0\n"
+        "20000101\t200\t30\t12\n"
+        "20000102\t210\t-9999\t8\n"
+    )
+    return data_file
+
+def _rows(client, query=''):
+    response = client.get(f'/api/weather?station_id=USC00000004&limit=100{query}')
+    assert response.status_code == 200
+    return [(row['date'], row['max_temp']) for row in response.get_json()]
+
+def test_rows_are_routed_to_decade_files(app, client, station_file):
+    with app.app_context():
+        assert bulk_process_file(str(station_file)) == (4, 0, 0)
+        assert [partition.name for partition in existing_partitions()] == ['d1990', 'd2000']
+        assert db.session.query(WeatherData).count() == 0  # Nothing in the main database
+
+        # Re-ingesting updates the rows in their partitions
+        assert bulk_process_file(str(station_file)) == (0, 4, 0)
+
+    assert _rows(client) == [('1998-12-31', 10.0), ('1999-01-01', None), ('2000-01-01', 20.0), ('2000-01-02', 21.0)]
+    assert _rows(client, '&start_date=1999-01-01&end_date=2000-01-01') == [('1999-01-01', None), ('2000-01-01', 20.0)]
+    assert _rows(client, '&date=2000-01-02') == [('2000-01-02', 21.0)]
+
+    export = client.get('/api/weather/export?station_id=USC00000004').get_data(as_text=True)
+    assert export.splitlines()[1:] == [
+        'USC00000004,1998-12-31,10.0,1.0,0.5',
+        'USC00000004,1999-01-01,,2.0,0.0',
+        'USC00000004,2000-01-01,20.0,3.0,1.2',
+        'USC00000004,2000-01-02,21.0,,0.8',
+    ]
+    aggregate = client.get('/api/weather/aggregate?station_id=USC00000004&start=1999-01-01').get_json()
+    assert aggregate['count'] == 3
+    assert aggregate['precipitation']['sum'] == 2.0
+
+def test_range_reads_only_overlapping_partitions(app, station_file):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+        source = weather_source(date(2000, 1, 1), date(2000, 6, 30))
+        sql = str(db.session.query(source).filter(source.station_id == 'USC00000004'))
+        assert 'wx_d2000' in sql and 'wx_d1990' not in sql
+        assert [row.date for row in db.session.query(source)] == [date(2000, 1, 1), date(2000, 1, 2)]
+
+        sql = str(db.session.query(weather_source(date(1999, 1, 1), date(2000, 1, 1))))
+        assert 'wx_d2000' in sql and 'wx_d1990' in sql
+
+def test_stats_per_partition(app, station_file):
+    with app.app_context():
+        incremental_process_file(str(station_file))
+        calculate_weather_stats()
+        incremental = {(s.year, s.avg_max_temp, s.avg_min_temp, s.total_precipitation)
+                       for s in WeatherStats.query.all()}
+        calculate_weather_stats(full=True)
+        full = {(s.year, s.avg_max_temp, s.avg_min_temp, s.total_precipitation) for s in WeatherStats.query.all()}
+
+    assert incremental == full
+    assert {(year, avg_max) for year, avg_max, _, _ in full} == {(1998, 10.0), (1999, None), (2000, 20.5)}
+
+def test_rebuild_partition_swaps_file(app, client, station_file, tmp_path):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+        calculate_weather_stats()
+        path = os.path.join(app.config['WEATHER_PARTITION_DIR'], 'weather_d2000.db')
+        inode = os.stat(path).st_ino
+
+        station_file.write_text("19981231\t100\t10\t5\n20000101\t250\t30\t12\n")
+        assert rebuild_partition(partition_named('d2000'), [str(station_file)]) == 1
+        assert os.stat(path).st_ino != inode
+
+        calculate_weather_stats()
+        stats = WeatherStats.query.filter_by(station_id='USC00000004', year=2000).one()
+        assert stats.avg_max_temp == 25.0
+
+    # The 1990s are untouched; the 2000s only have the reloaded row
+    assert _rows(client) == [('1998-12-31', 10.0), ('1999-01-01', None), ('2000-01-01', 25.0)]
+    years = client.get('/api/stations?years=true').get_json()[0]['years']
+    assert [(year['year'], year['days']) for year in years] == [(1998, 1), (1999, 1), (2000, 1)]
+
+def test_partition_existing_rows(tmp_path, station_file):
+    database = tmp_path / 'weather.db'
+    plain = create_app('testing', {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}'})
+    with plain.app_context():
+        bulk_process_file(str(station_file))
+
+    app = create_app('testing', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}',
+        'WEATHER_PARTITIONING': 'decade',
+        'WEATHER_PARTITION_DIR': str(tmp_path / 'partitions')
+    })
+    with app.app_context():
+        assert partition_existing_rows() == 4
+        assert partition_existing_rows() == 0
+        assert db.session.query(WeatherData).count() == 0
+        source = weather_source()
+        assert db.session.query(source).count() == 4
+        assert partition_for(date(1999, 1, 1)) in existing_partitions()
+
+def test_sqlite_needs_decades(tmp_path):
+    with pytest.raises(ValueError):
+        create_app('testing', {'WEATHER_PARTITIONING': 'year', 'WEATHER_PARTITION_DIR': str(tmp_path)})
+
+def test_postgresql_partitioning_is_per_engine():
+    # Partitioning one engine's weather_data leaves the shared table definition alone
+    partitioned, plain = postgresql.dialect(), postgresql.dialect()
+    _partitioned_dialects.add(partitioned)
+    table = WeatherData.__table__
+    assert str(CreateTable(table).compile(dialect=partitioned)).rstrip().endswith(') PARTITION BY RANGE (date)')
+    assert 'PARTITION BY' not in str(CreateTable(table).compile(dialect=plain))
+    assert table.dialect_options['postgresql']['partition_by'] is None
+
+def test_snapshot_reads_partitions(app, client, station_file):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+        # Partition files carry the date index of the main table
+        plan = db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM wx_d1990.weather_data WHERE date = '1999-01-01'"
+        )).all()
+        assert 'ix_weather_data_date' in ' '.join(row[-1] for row in plan)
+
+    body = client.get('/api/weather/snapshot?start_date=1999-12-31&end_date=2000-01-01').get_json()
+    assert [[station['max_temp'] for station in day['stations']] for day in body['days']] == [[], [20.0]]
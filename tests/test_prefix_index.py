@@ -0,0 +1,124 @@
+import os
+from datetime import date
+import pytest
+from app import db
+from app.analysis import calculate_weather_stats
+from app.ingestion import bulk_process_file, incremental_process_file
+from app.models import WeatherData, WeatherStats
+
+@pytest.fixture
+def app_config(tmp_path):
+    """An app that maintains a prefix-sum index in tmp_path."""
+    return {'PREFIX_INDEX_ENABLED': True, 'PREFIX_INDEX_DIR': str(tmp_path / 'prefix')}
+
+@pytest.fixture
+def station_file(tmp_path):
+    # Two years with a gap in the dates and missing values in every column
+    lines = [
+        f"{year}{month:02d}{day:02d}\t{month * 10 + day}\t{-9999 if day % 4 == 0 else -day}\t{-9999 if day % 5 == 0 else day * 3}\n"
+        for year in (2021, 2022) for month in (1, 2, 7) for day in range(1, 29) if (month, day) != (2, 14)
+    ]
+    data_file = tmp_path / 'USC00000002.txt'
+    data_file.write_text(''.join(lines))
+    return data_file
+
+WINDOWS = [
+    '',
+    'start=2021-02-01&end=2021-02-28',
+    'start=2021-07-10',
+    'end=2021-01-15',
+    'start=2020-01-01&end=2030-01-01',
+    'start=2021-03-01&end=2021-06-30',  # No records in the window
+    'start=2023-01-01',                 # After the last record
+    'start=2021-02-10&end=2021-02-01',  # Reversed window
+]
+
+def _fetch(client, window):
+    response = client.get(f'/api/weather/aggregate?station_id=USC00000002&{window}')
+    assert response.status_code == 200
+    return response.get_json()
+
+@pytest.mark.parametrize('window', WINDOWS)
+def test_index_matches_sql(app, client, station_file, window):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+    indexed = _fetch(client, window)
+
+    # Stations without an index file are answered by an aggregate query
+    os.unlink(os.path.join(app.config['PREFIX_INDEX_DIR'], 'USC00000002.wxp'))
+    assert indexed == _fetch(client, window)
+
+def test_year_window_matches_stats(app, client, station_file):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+        calculate_weather_stats()
+        stats = WeatherStats.query.filter_by(station_id='USC00000002', year=2022).one()
+
+    result = _fetch(client, 'start=2022-01-01&end=2022-12-31')
+    assert result['max_temp']['avg'] == pytest.approx(stats.avg_max_temp)
+    assert result['min_temp']['avg'] == pytest.approx(stats.avg_min_temp)
+    assert result['precipitation']['sum'] == pytest.approx(stats.total_precipitation)
+
+def test_append_updates_index_in_place(app, client, station_file):
+    with app.app_context():
+        incremental_process_file(str(station_file))
+        path = os.path.join(app.config['PREFIX_INDEX_DIR'], 'USC00000002.wxp')
+        inode = os.stat(path).st_ino
+
+        with open(station_file, 'a') as file:
+            file.write("20220810\t300\t-9999\t50\n")
+        incremental_process_file(str(station_file))
+        assert os.stat(path).st_ino == inode  # Appended, not rewritten
+
+    result = _fetch(client, 'start=2022-07-28')
+    assert result['count'] == 2
+    assert result['max_temp'] == {'count': 2, 'sum': 39.8, 'avg': 19.9}
+    assert result['min_temp']['count'] == 0
+    assert result['min_temp']['avg'] is None
+
+def test_missing_station_id_is_rejected(client):
+    assert client.get('/api/weather/aggregate').status_code == 400
+    assert client.get('/api/weather/aggregate?station_id=X&start=bad').status_code == 400
+
+def test_index_files_stay_in_the_index(app, client, station_file, tmp_path):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+    (tmp_path / 'other').mkdir()
+    (tmp_path / 'other' / 'evil.wxp').write_bytes(b'not an index')
+    for station_id in ('../other/evil', '..', 'USC00000002/../USC00000002'):
+        response = client.get(f'/api/weather/aggregate?station_id={station_id}')
+        assert response.status_code == 200
+        assert response.get_json()['count'] == 0
+
+    # Corrupt or truncated files are ignored and the window is summed in SQL; like the
+    # writers, the test swaps files in rather than truncating a mapped one
+    path = os.path.join(app.config['PREFIX_INDEX_DIR'], 'USC00000002.wxp')
+    with open(path, 'rb') as file:
+        contents = file.read()
+    expected = _fetch(client, 'start=2021-02-01')
+    for corrupt in (b'', b'WXP1', b'XXXX' + contents[4:], contents[:-8]):
+        with open(path + '.tmp', 'wb') as file:
+            file.write(corrupt)
+        os.replace(path + '.tmp', path)
+        assert _fetch(client, 'start=2021-02-01') == expected
+
+    # An incremental load rebuilds an invalid file instead of appending to it
+    with app.app_context():
+        with open(station_file, 'a') as file:
+            file.write("20220810\t300\t-9999\t50\n")
+        incremental_process_file(str(station_file))
+        with open(path, 'rb') as file:
+            assert file.read(4) == b'WXP1'
+
+def test_orm_writes_discard_index_files(app, client, station_file):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+    before = _fetch(client, 'start=2022-07-01')
+
+    with app.app_context():
+        WeatherData.query.filter_by(station_id='USC00000002', date=date(2022, 7, 3)).one().max_temp = 0.0
+        db.session.commit()
+        assert not os.path.exists(os.path.join(app.config['PREFIX_INDEX_DIR'], 'USC00000002.wxp'))
+
+    after = _fetch(client, 'start=2022-07-01')
+    assert after['max_temp']['sum'] == pytest.approx(before['max_temp']['sum'] - 7.3)
@@ -1,3 +1,4 @@
+import json
 import pytest
 from datetime import datetime
 from app import create_app, db
@@ -64,4 +65,81 @@ def test_get_weather_stats(client, app):
     assert response_json[0]['station_id'] == 'test_station'
     assert response_json[0]['year'] == 2022
     assert response_json[0]['avg_max_temp'] == 25.0
-    assert response_json[0]['avg_min_temp'] == 20.0
\ No newline at end of file
+    assert response_json[0]['avg_min_temp'] == 20.0
+
+def test_weather_data_cursor_pagination(client, app):
+    """Cursor pages walk every row once, in (station_id, date) order."""
+    with app.app_context():
+        for station_id in ("station_b", "station_a"):
+            for day in range(1, 6):
+                db.session.add(WeatherData(station_id=station_id, date=datetime(2022, 11, day).date(), max_temp=float(day)))
+        db.session.commit()
+
+    seen = []
+    response = client.get('/api/weather?limit=3')
+    while True:
+        assert response.status_code == 200
+        seen += [(row['station_id'], row['date']) for row in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+        response = client.get(f'/api/weather?limit=3&cursor={cursor}')
+
+    assert seen == sorted(seen)
+    assert len(seen) == 10
+
+    # With a station filter the cursor only has to seek on date
+    response = client.get('/api/weather?station_id=station_b&limit=4')
+    cursor = response.headers['X-Next-Cursor']
+    response = client.get(f'/api/weather?station_id=station_b&limit=4&cursor={cursor}')
+    assert [row['date'] for row in response.get_json()] == ['2022-11-05']
+    assert 'X-Next-Cursor' not in response.headers
+
+def test_weather_data_page_mode_and_count(client, app):
+    with app.app_context():
+        for day in range(1, 6):
+            db.session.add(WeatherData(station_id="test_station", date=datetime(2022, 11, day).date()))
+        db.session.commit()
+
+    response = client.get('/api/weather?page=2&limit=2')
+    assert [row['date'] for row in response.get_json()] == ['2022-11-03', '2022-11-04']
+    assert 'X-Total-Count' not in response.headers
+
+    response = client.get('/api/weather?page=1&limit=2&count=true')
+    assert response.headers['X-Total-Count'] == '5'
+
+    assert client.get('/api/weather?cursor=not-a-cursor').status_code == 400
+
+def test_weather_data_date_range(client, app):
+    with app.app_context():
+        for day in range(1, 6):
+            db.session.add(WeatherData(station_id="test_station", date=datetime(2022, 11, day).date()))
+        db.session.commit()
+
+    response = client.get('/api/weather?station_id=test_station&start_date=2022-11-02&end_date=2022-11-04')
+    assert [row['date'] for row in response.get_json()] == ['2022-11-02', '2022-11-03', '2022-11-04']
+    assert client.get('/api/weather?start_date=2022-13-01').status_code == 400
+
+def test_weather_export(client, app):
+    """The export endpoint streams every matching row as CSV or NDJSON."""
+    with app.app_context():
+        db.session.add(WeatherData(station_id="test_station", date=datetime(2022, 11, 1).date(),
+                                   max_temp=25.0, min_temp=20.0, precipitation=None))
+        db.session.add(WeatherData(station_id="test_station", date=datetime(2022, 11, 2).date(),
+                                   max_temp=24.0, min_temp=19.5, precipitation=1.5))
+        db.session.commit()
+
+    response = client.get('/api/weather/export?station_id=test_station&end_date=2022-11-01')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert response.get_data(as_text=True) == (
+        "station_id,date,max_temp,min_temp,precipitation\n"
+        "test_station,2022-11-01,25.0,20.0,\n"
+    )
+
+    response = client.get('/api/weather/export?format=ndjson')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['date'] for line in lines] == ['2022-11-01', '2022-11-02']
+    assert lines[1]['precipitation'] == 1.5
+
+    assert client.get('/api/weather/export?format=xml').status_code == 400
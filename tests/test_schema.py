@@ -0,0 +1,84 @@
+from datetime import date
+from sqlalchemy import text
+from app import db
+from app.models import Station, WeatherData
+from app.analysis import calculate_weather_stats
+from app.models import WeatherStats
+from app.schema import create_stats_key, has_legacy_weather_table, upgrade_weather_schema
+
+def test_measurements_are_stored_as_exact_tenths(app):
+    with app.app_context():
+        db.session.add(WeatherData(station_id='S1', date=date(2022, 1, 1), max_temp=0.3, min_temp=-12.7, precipitation=None))
+        db.session.commit()
+
+        row = db.session.execute(text('SELECT max_temp_tenths, min_temp_tenths, precipitation_tenths FROM weather_data')).one()
+        assert tuple(row) == (3, -127, None)
+
+        data = WeatherData.query.filter_by(station_id='S1').one()
+        assert (data.max_temp, data.min_temp, data.precipitation) == (0.3, -12.7, None)
+        assert WeatherData.query.filter(WeatherData.max_temp > 0.2).count() == 1
+
+def test_station_codes_share_one_key(app):
+    with app.app_context():
+        db.session.add(WeatherData(station_id='S1', date=date(2022, 1, 1)))
+        db.session.add(WeatherData(station_id='S1', date=date(2022, 1, 2)))
+        db.session.add(WeatherData(station_id='S2', date=date(2022, 1, 1)))
+        db.session.commit()
+
+        assert Station.query.count() == 2
+        assert WeatherData.query.filter_by(station_id='S1').count() == 2
+        assert WeatherData.query.filter(WeatherData.station_id.in_(['S2', 'S3'])).count() == 1
+        assert WeatherData.query.filter_by(station_id='unknown').count() == 0
+
+def test_upgrade_converts_legacy_table(app):
+    with app.app_context():
+        db.session.execute(text('DROP TABLE weather_data'))
+        db.session.execute(text(
+            'CREATE TABLE weather_data (id INTEGER PRIMARY KEY, station_id VARCHAR NOT NULL, date DATE NOT NULL, '
+            'max_temp FLOAT, min_temp FLOAT, precipitation FLOAT, '
+            'CONSTRAINT uix_station_date UNIQUE (station_id, date))'
+        ))
+        db.session.execute(text(
+            "INSERT INTO weather_data (station_id, date, max_temp, min_temp, precipitation) VALUES "
+            "('USC2', '2022-01-01', 2.3, -0.1, NULL), ('USC1', '2022-01-01', NULL, 1.7, 10.2), "
+            "('USC1', '2022-01-02', 25.0, 20.0, 0.0)"
+        ))
+        db.session.commit()
+        with db.engine.connect() as connection:
+            assert has_legacy_weather_table(connection)
+
+        assert upgrade_weather_schema() == 3
+        assert upgrade_weather_schema() is None
+
+        # Station keys follow code order
+        assert [(station.id, station.code) for station in Station.query.order_by(Station.id)] == [(1, 'USC1'), (2, 'USC2')]
+        rows = [(data.station_id, data.date, data.max_temp, data.min_temp, data.precipitation)
+                for data in WeatherData.query.order_by(WeatherData.station_key, WeatherData.date)]
+        assert rows == [
+            ('USC1', date(2022, 1, 1), None, 1.7, 10.2),
+            ('USC1', date(2022, 1, 2), 25.0, 20.0, 0.0),
+            ('USC2', date(2022, 1, 1), 2.3, -0.1, None),
+        ]
+
+def test_stats_key_added_to_existing_table(app):
+    with app.app_context():
+        db.session.execute(text('DROP TABLE weather_stats'))
+        db.session.execute(text(
+            'CREATE TABLE weather_stats (id INTEGER PRIMARY KEY AUTOINCREMENT, station_id VARCHAR NOT NULL, '
+            'year INTEGER NOT NULL, avg_max_temp FLOAT, avg_min_temp FLOAT, total_precipitation FLOAT)'
+        ))
+        db.session.execute(text(
+            "INSERT INTO weather_stats (station_id, year, avg_max_temp) VALUES "
+            "('USC1', 2022, 1.0), ('USC1', 2022, 2.0), ('USC1', 2023, 3.0)"
+        ))
+        db.session.add(WeatherData(station_id='USC1', date=date(2022, 1, 1), max_temp=5.0, min_temp=1.0, precipitation=0.0))
+        db.session.commit()
+
+        assert create_stats_key()
+        assert not create_stats_key()
+        assert [(stats.year, stats.avg_max_temp) for stats in WeatherStats.query.order_by(WeatherStats.year)] == \
+            [(2022, 2.0), (2023, 3.0)]
+
+        # The upsert's conflict target now matches
+        calculate_weather_stats()
+        assert WeatherStats.query.filter_by(year=2022).one().avg_max_temp == 5.0
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from app.ingestion import bulk_process_file
+from app.series import lttb, minmax
+
+@pytest.fixture
+def station_file(tmp_path):
+    # 200 days of a sine wave from 2000-01-01, a missing max_temp and a 30-day gap after day 120
+    lines = []
+    for day in range(200):
+        if 120 <= day < 150:
+            continue
+        when = np.datetime64('2000-01-01') + day
+        tmax = -9999 if day == 10 else int(200 + 100 * np.sin(day / 10))
+        lines.append(f"{str(when).replace('-', '')}\t{tmax}\t0\t0\n")
+    data_file = tmp_path / 'USC00000020.txt'
+    data_file.write_text(''.join(lines))
+    return data_file
+
+def test_lttb_and_minmax_keep_shape():
+    x = np.arange(1000)
+    y = np.sin(x / 50) * 100
+    y[500] = 1000  # A spike both methods keep
+
+    kept = lttb(x, y, 50)
+    assert len(kept) == 50
+    assert (kept[0], kept[-1]) == (0, 999)
+    assert np.all(np.diff(kept) > 0)
+    assert 500 in kept
+
+    kept = minmax(x, y, 50)
+    assert len(kept) <= 52
+    assert (kept[0], kept[-1]) == (0, 999)
+    assert 500 in kept and int(np.argmin(y)) in kept
+
+    assert list(lttb(x[:5], y[:5], 10)) == [0, 1, 2, 3, 4]
+
+def test_series_endpoint(app, client, station_file):
+    with app.app_context():
+        bulk_process_file(str(station_file))
+
+    body = client.get('/api/weather/series?station_id=USC00000020&points=20').get_json()
+    assert (body['source_points'], body['missing']) == (169, 1)
+    values = [point['value'] for point in body['data']]
+    dates = [point['date'] for point in body['data']]
+    assert dates[0] == '2000-01-01' and dates[-1] == '2000-07-18'
+    # The gap is broken by a null point between the days either side of it
+    gap = values.index(None)
+    assert dates[gap - 1:gap + 2] == ['2000-04-29', '2000-04-30', '2000-05-30']
+    assert values.count(None) == 1
+    assert body['points'] == len(body['data'])
+
+    body = client.get('/api/weather/series?station_id=USC00000020&method=minmax&points=10'
+                      '&start_date=2000-01-05&end_date=2000-01-20').get_json()
+    dates = [point['date'] for point in body['data']]
+    assert dates[0] == '2000-01-05' and dates[-1] == '2000-01-20'
+    # The missing value is wider than a bucket here, so it is marked as a gap
+    assert {'date': '2000-01-11', 'value': None} in body['data']
+    assert body['source_points'] == 15
+
+    full = client.get('/api/weather/series?station_id=USC00000020&measure=min_temp&points=1000').get_json()
+    assert (full['source_points'], full['points']) == (170, 171)  # Every value and the gap marker
+
+def test_series_rejects_bad_arguments(client):
+    assert client.get('/api/weather/series').status_code == 400
+    assert client.get('/api/weather/series?station_id=X&measure=snow').status_code == 400
+    assert client.get('/api/weather/series?station_id=X&method=mean').status_code == 400
+    assert client.get('/api/weather/series?station_id=X&points=2').status_code == 400
+    assert client.get('/api/weather/series?station_id=X&points=100000').status_code == 400
@@ -0,0 +1,94 @@
+import sqlite3
+import numpy as np
+import pytest
+from app import db
+from app.analysis import calculate_weather_stats, mark_dirty_partitions
+from app.ingestion import bulk_process_file
+from app.models import WeatherStatsSketch
+from app.sketches import ValueHistogram, update_sketches
+
+def _write(path, rows):
+    path.write_text(''.join(f"{day}\t{tmax}\t{tmin}\t{prcp}\n" for day, tmax, tmin, prcp in rows))
+    return str(path)
+
+@pytest.fixture
+def stations(tmp_path):
+    first = _write(tmp_path / 'USC00000011.txt', [
+        ('20000101', -50, -100, 0),
+        ('20000102', 100, -20, 15),
+        ('20000103', 300, 210, -9999),
+        ('20010101', 260, 50, 10),
+    ])
+    second = _write(tmp_path / 'USC00000012.txt', [
+        ('20000101', 200, 10, 30),
+        ('20000102', -9999, -9999, 0),
+    ])
+    return first, second
+
+def test_histogram_matches_numpy():
+    rng = np.random.default_rng(7)
+    parts = [rng.integers(-300, 400, size) for size in (1, 50, 365)]
+    merged = ValueHistogram.merge(ValueHistogram.from_bytes(ValueHistogram.of(part).to_bytes()) for part in parts)
+    values = np.concatenate(parts)
+
+    assert merged.count == len(values)
+    for q in (0, 0.05, 0.5, 0.95, 0.999, 1):
+        assert merged.quantile(q) == pytest.approx(np.quantile(values, q))
+    assert merged.count_where('<', 0) == int((values < 0).sum())
+    assert merged.count_where('>=', 250) == int((values >= 250).sum())
+    assert ValueHistogram.merge([]).quantile(0.5) is None
+
+def test_stats_distribution(app, client, stations):
+    with app.app_context():
+        for path in stations:
+            bulk_process_file(path)
+        calculate_weather_stats()
+        assert WeatherStatsSketch.query.count() == 3
+
+    rows = client.get('/api/weather/stats?station_id=USC00000011&percentiles=50,100').get_json()
+    distribution = rows[0]['distribution']
+    assert distribution['max_temp'] == {'count': 3, 'min': -5.0, 'max': 30.0, 'percentiles': {'p50': 10.0, 'p100': 30.0}}
+    assert distribution['precipitation']['count'] == 2
+    assert distribution['threshold_days'] == {
+        'frost_days': 2, 'ice_days': 1, 'summer_days': 1, 'tropical_nights': 1, 'wet_days': 1
+    }
+    assert 'distribution' not in client.get('/api/weather/stats?station_id=USC00000011').get_json()[0]
+    assert client.get('/api/weather/stats?percentiles=101').status_code == 400
+
+    # Merged over both stations' year 2000
+    merged = client.get('/api/weather/stats/distribution?station_id=USC00000011,USC00000012&end_year=2000').get_json()
+    assert merged['station_years'] == 2
+    assert merged['max_temp']['count'] == 4
+    assert merged['max_temp']['percentiles']['p50'] == 15.0
+    assert merged['min_temp']['min'] == -10.0
+
+    everything = client.get('/api/weather/stats/distribution?percentiles=0').get_json()
+    assert everything['station_years'] == 3
+    assert everything['max_temp']['percentiles'] == {'p0': -5.0}
+
+def test_sketches_follow_updates(app, client, stations, tmp_path):
+    with app.app_context():
+        bulk_process_file(stations[0])
+        calculate_weather_stats()
+
+        # Rewriting a day updates only its station-year's sketch
+        bulk_process_file(_write(tmp_path / 'USC00000011.txt', [('20000103', 400, 210, 0)]))
+        calculate_weather_stats()
+
+    year_2000 = client.get('/api/weather/stats?station_id=USC00000011&year=2000&percentiles=').get_json()[0]
+    assert year_2000['distribution']['max_temp']['max'] == 40.0
+    assert year_2000['distribution']['precipitation']['count'] == 3
+    year_2001 = client.get('/api/weather/stats?station_id=USC00000011&year=2001&percentiles=').get_json()[0]
+    assert year_2001['distribution']['max_temp']['percentiles'] == {'p5': 26.0, 'p50': 26.0, 'p95': 26.0}
+
+def test_sketches_of_many_dirty_partitions(app):
+    with app.app_context():
+        # More (station_id, year) pairs than the connection allows bound parameters in one
+        # statement; 999 was SQLite's default limit before 3.32
+        db.session.connection().connection.dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        partitions = [(f'USC{station:08d}', year) for station in range(100) for year in range(1990, 2020)]
+        mark_dirty_partitions(db.session.connection(), partitions)
+        db.session.add(WeatherStatsSketch(station_id='USC00000001', year=1990))
+        db.session.add(WeatherStatsSketch(station_id='USC00000001', year=1980))
+        update_sketches(partitions)
+        assert [sketch.year for sketch in WeatherStatsSketch.query.all()] == [1980]
@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import inspect, text
+from app import db
+from app.ingestion import bulk_process_file
+from app.schema import create_weather_indexes
+
+@pytest.fixture
+def stations(app, tmp_path):
+    files = {
+        'USC00000051': "19980703\t300\t200\t0\n19980704\t320\t-9999\t15\n",
+        'USC00000050': "19980704\t280\t180\t5\n19980706\t100\t50\t0\n",
+    }
+    with app.app_context():
+        for station_id, content in files.items():
+            path = tmp_path / f'{station_id}.txt'
+            path.write_text(content)
+            bulk_process_file(str(path))
+
+def test_snapshot_of_a_day(client, stations):
+    body = client.get('/api/weather/snapshot?date=1998-07-04&summary=true').get_json()
+    assert body['date'] == '1998-07-04'
+    assert body['stations'] == [
+        {'station_id': 'USC00000050', 'max_temp': 28.0, 'min_temp': 18.0, 'precipitation': 0.5},
+        {'station_id': 'USC00000051', 'max_temp': 32.0, 'min_temp': None, 'precipitation': 1.5},
+    ]
+    assert body['summary']['max_temp'] == {'count': 2, 'mean': 30.0, 'min': 28.0, 'max': 32.0}
+    assert body['summary']['min_temp'] == {'count': 1, 'mean': 18.0, 'min': 18.0, 'max': 18.0}
+
+    assert 'summary' not in client.get('/api/weather/snapshot?date=1998-07-04').get_json()
+    assert client.get('/api/weather/snapshot?date=1998-07-10').get_json()['stations'] == []
+
+def test_snapshot_range(client, stations):
+    body = client.get('/api/weather/snapshot?start_date=1998-07-03&end_date=1998-07-06').get_json()
+    assert [day['date'] for day in body['days']] == ['1998-07-03', '1998-07-04', '1998-07-05', '1998-07-06']
+    assert [len(day['stations']) for day in body['days']] == [1, 2, 0, 1]
+
+    assert client.get('/api/weather/snapshot').status_code == 400
+    assert client.get('/api/weather/snapshot?date=04/07/1998').status_code == 400
+    assert client.get('/api/weather/snapshot?start_date=1998-07-06&end_date=1998-07-03').status_code == 400
+    assert client.get('/api/weather/snapshot?start_date=1998-01-01&end_date=1998-12-31').status_code == 400
+
+def test_snapshot_is_an_index_seek(app):
+    with app.app_context():
+        db.session.execute(text('DROP INDEX ix_weather_data_date'))
+        db.session.commit()
+        assert create_weather_indexes() == ['ix_weather_data_date']
+        assert create_weather_indexes() == []
+        assert 'ix_weather_data_date' in {index['name'] for index in inspect(db.engine).get_indexes('weather_data')}
+
+        plan = db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM weather_data WHERE date >= '1998-07-04' AND date <= '1998-07-04'"
+        )).all()
+        assert 'ix_weather_data_date' in ' '.join(row[-1] for row in plan)
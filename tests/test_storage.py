@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import inspect, text
+from app import create_app, db
+from app.ingestion import bulk_process_file
+from app.models import WeatherStats
+from app.partitioning import has_unpartitioned_rows
+
+def _sqlite(path):
+    return f'sqlite:///{path}'
+
+def test_lazy_startup_leaves_schema_to_init_db(tmp_path):
+    app = create_app('testing', {'SQLALCHEMY_DATABASE_URI': _sqlite(tmp_path / 'weather.db'),
+                                 'SCHEMA_AUTO_CREATE': False, 'STARTUP_CHECKS': False})
+    with app.app_context():
+        assert not inspect(db.engine).has_table('weather_data')
+
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert 'Database initialized' in result.output
+    with app.app_context():
+        assert inspect(db.engine).has_table('weather_data')
+
+def test_storage_profile_pragmas(tmp_path):
+    app = create_app('testing', {'SQLALCHEMY_DATABASE_URI': _sqlite(tmp_path / 'weather.db'),
+                                 'STORAGE_PROFILE': 'sqlite-wal'})
+    with app.app_context(), db.engine.connect() as connection:
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert connection.execute(text('PRAGMA synchronous')).scalar() == 1
+        assert connection.execute(text('PRAGMA cache_size')).scalar() == -65536
+
+    app = create_app('testing', {'SQLALCHEMY_DATABASE_URI': _sqlite(tmp_path / 'weather.db'),
+                                 'STORAGE_PROFILE': 'sqlite-readonly'})
+    with app.app_context():
+        with pytest.raises(Exception, match='readonly'):
+            db.session.execute(text('DELETE FROM weather_stats'))
+        db.session.rollback()
+
+    with pytest.raises(ValueError):
+        create_app('testing', {'STORAGE_PROFILE': 'oracle'})
+
+def test_get_requests_read_from_replica(tmp_path):
+    replica = _sqlite(tmp_path / 'replica.db')
+    seed = create_app('testing', {'SQLALCHEMY_DATABASE_URI': replica})
+    with seed.app_context():
+        db.session.add(WeatherStats(station_id='USC00000030', year=2000, avg_max_temp=1.0))
+        db.session.commit()
+
+    app = create_app('testing', {'SQLALCHEMY_DATABASE_URI': _sqlite(tmp_path / 'primary.db'),
+                                 'READ_REPLICA_URI': replica, 'RESPONSE_CACHE_ENABLED': False})
+    client = app.test_client()
+    assert [row['station_id'] for row in client.get('/api/weather/stats').get_json()] == ['USC00000030']
+    with app.app_context():
+        # Outside requests (CLI, jobs) everything goes to the primary
+        assert WeatherStats.query.count() == 0
+
+    # Jobs are written to the primary and their status read back from it
+    job = client.post('/api/jobs/stats', json={}).get_json()
+    assert client.get(f"/api/jobs/{job['id']}").status_code == 200
+
+def test_replica_attaches_partitions(tmp_path):
+    database = _sqlite(tmp_path / 'weather.db')
+    app = create_app('testing', {'SQLALCHEMY_DATABASE_URI': database, 'READ_REPLICA_URI': database,
+                                 'WEATHER_PARTITIONING': 'decade', 'WEATHER_PARTITION_DIR': str(tmp_path / 'partitions'),
+                                 'RESPONSE_CACHE_ENABLED': False})
+    station_file = tmp_path / 'USC00000031.txt'
+    station_file.write_text("19950101\t10\t0\t0\n")
+    with app.app_context():
+        bulk_process_file(str(station_file))
+        assert has_unpartitioned_rows(db.session.connection()) is False
+
+    body = app.test_client().get('/api/weather?station_id=USC00000031').get_json()
+    assert [record['date'] for record in body] == ['1995-01-01']
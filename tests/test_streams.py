@@ -0,0 +1,118 @@
+import io
+import gzip
+import tarfile
+import zipfile
+import pytest
+from app.ingestion import ingest_stream, ingest_weather_data
+from app.models import WeatherData
+from app.parser import parse_weather_bytes
+from app.streams import iter_members, iter_parsed_blocks
+
+STATIONS = {
+    'USC00000005': b"20220101\t10\t5\t0\n20220102\t-9999\t4\t12\nbad line\n20220103\t30\t2\t1\n",
+    'USC00000006': b"20220101\t-20\t-50\t3\n",
+}
+
+def _write_tar(path, mode):
+    with tarfile.open(path, mode) as archive:
+        for station_id, content in STATIONS.items():
+            info = tarfile.TarInfo(f'wx_data/{station_id}.txt')
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+        readme = tarfile.TarInfo('wx_data/README')
+        readme.size = 5
+        archive.addfile(readme, io.BytesIO(b'hello'))
+
+def _stored(app):
+    with app.app_context():
+        return sorted((row.station_id, row.date.isoformat(), row.max_temp) for row in WeatherData.query.all())
+
+EXPECTED = [
+    ('USC00000005', '2022-01-01', 1.0),
+    ('USC00000005', '2022-01-02', None),
+    ('USC00000005', '2022-01-03', 3.0),
+    ('USC00000006', '2022-01-01', -2.0),
+]
+
+@pytest.mark.parametrize('filename', ['drop.tar.gz', 'drop.tar', 'drop.zip'])
+def test_ingest_archive(app, tmp_path, filename):
+    path = tmp_path / filename
+    if filename.endswith('.zip'):
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for station_id, content in STATIONS.items():
+                archive.writestr(f'wx_data/{station_id}.txt', content)
+    else:
+        _write_tar(path, 'w:gz' if filename.endswith('.gz') else 'w')
+
+    with app.app_context():
+        summary = ingest_weather_data(str(path))
+    assert summary['files'] == 2
+    assert (summary['inserted'], summary['skipped']) == (4, 1)
+    assert _stored(app) == EXPECTED
+
+def test_ingest_gzip_file(app, tmp_path):
+    path = tmp_path / 'USC00000006.txt.gz'
+    path.write_bytes(gzip.compress(STATIONS['USC00000006']))
+    with app.app_context():
+        assert ingest_stream(str(path))['inserted'] == 1
+    assert _stored(app) == EXPECTED[3:]
+
+def test_ingest_stdin_tar_stream(app, tmp_path, monkeypatch):
+    path = tmp_path / 'drop.tar.gz'
+    _write_tar(path, 'w:gz')
+
+    class Pipe(io.RawIOBase):
+        """A non-seekable stream, like a shell pipe."""
+        def __init__(self, data):
+            self.data = io.BytesIO(data)
+        def readable(self):
+            return True
+        def readinto(self, buffer):
+            chunk = self.data.read(len(buffer))
+            buffer[:len(chunk)] = chunk
+            return len(chunk)
+
+    monkeypatch.setattr('sys.stdin', type('Stdin', (), {'buffer': Pipe(path.read_bytes())})())
+    with app.app_context():
+        assert ingest_stream('-')['files'] == 2
+    assert _stored(app) == EXPECTED
+
+def test_ingest_stdin_single_station(app, monkeypatch):
+    monkeypatch.setattr('sys.stdin', type('Stdin', (), {'buffer': io.BytesIO(STATIONS['USC00000006'])})())
+    with app.app_context():
+        assert ingest_stream('-', station_id='USC00000006')['inserted'] == 1
+    assert _stored(app) == EXPECTED[3:]
+
+    # Without a station there is nothing to store the rows under
+    monkeypatch.setattr('sys.stdin', type('Stdin', (), {'buffer': io.BytesIO(STATIONS['USC00000005'])})())
+    with app.app_context():
+        with pytest.raises(ValueError):
+            ingest_stream('-')
+    assert _stored(app) == EXPECTED[3:]
+
+def test_zip_needs_seekable_stream():
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as archive:
+        archive.writestr('USC00000005.txt', STATIONS['USC00000005'])
+    pipe = io.BufferedReader(io.BytesIO(data.getvalue()))
+    pipe.seekable = lambda: False
+    with pytest.raises(ValueError):
+        list(iter_members(pipe, '-'))
+
+@pytest.mark.parametrize('block_size', [1, 7, 20, 1024])
+def test_blocks_match_whole_parse(block_size):
+    content = STATIONS['USC00000005'] + b"20220104\t40\t1\t0"  # No trailing newline
+    whole = parse_weather_bytes(content)
+    blocks = list(iter_parsed_blocks(io.BytesIO(content), block_size))
+
+    assert [int(d) for block in blocks for d in block.dates] == whole.dates.tolist()
+    assert [int(n) for block in blocks for n in block.line_numbers] == whole.line_numbers.tolist()
+    assert [r for block in blocks for r in block.rejects] == whole.rejects
+
+def test_cli_ingest_from_archive(app, tmp_path):
+    path = tmp_path / 'drop.tgz'
+    _write_tar(path, 'w:gz')
+    result = app.test_cli_runner().invoke(args=['ingest', '--from', str(path)])
+    assert result.exit_code == 0, result.output
+    assert 'Inserted: 4' in result.output
+    assert _stored(app) == EXPECTED